@@ -0,0 +1,357 @@
+"""Online backups of the expense database, with rotation, verification and restore.
+
+A snapshot is copied from the live database with the SQLite backup API a
+few pages at a time (see database.ConnectionManager.backup()), so the app
+keeps writing while it runs. Each snapshot is a gzip file of the database
+(and of its archive database, if there is one) plus a JSON file with their
+checksums, row counts, the backup duration and the longest writer stall.
+"""
+import argparse
+import glob
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import database
+
+# Directory snapshots are written to
+BACKUP_DIR = 'backups'
+
+BACKUP_COMPRESSION_LEVEL = 6
+
+# Retention: the newest snapshots, plus the newest one of each recent day and month
+BACKUP_KEEP_LAST = 7
+BACKUP_KEEP_DAILY = 14
+BACKUP_KEEP_MONTHLY = 12
+
+# Attempts at a main/archive pair that was not split by archiving or clearing
+BACKUP_ATTEMPTS = 3
+
+def _stem(db_file: str) -> str:
+    return os.path.splitext(os.path.basename(db_file))[0]
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _check_copy(path: str) -> Dict:
+    """Integrity check a database copy and read its schema version and row counts"""
+    conn = sqlite3.connect(f'file:{os.path.abspath(path)}?mode=ro', uri=True)
+    try:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        info = {
+            'integrity': conn.execute('PRAGMA integrity_check').fetchone()[0],
+            'schema_version': conn.execute('PRAGMA user_version').fetchone()[0],
+            'rows': {
+                table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                for table in ('expenses', 'credits', 'blocks') if table in tables
+            },
+        }
+        if 'archive_state' in tables:
+            row = conn.execute('SELECT closed_through, version FROM archive_state WHERE id = 1').fetchone()
+            info['closed_through'], info['archive_version'] = row if row else (None, 0)
+        return info
+    finally:
+        conn.close()
+
+# ============================================================================
+# SNAPSHOTS
+# ============================================================================
+
+def _order(meta: Dict) -> Tuple[str, int]:
+    """Sort key of a snapshot: creation time, then the -N suffix naming snapshots of the same second"""
+    suffix = meta['name'][len(_stem(meta['db_file'])) + len('-YYYYmmdd-HHMMSS') + 1:]
+    return meta['created'], int(suffix) if suffix.isdigit() else 1
+
+def list_backups(backup_dir: str = BACKUP_DIR, db_file: Optional[str] = None) -> List[Dict]:
+    """Get the metadata of every snapshot of a database (default: the current one), newest first"""
+    stem = _stem(db_file or database.get_db_file())
+    backups = []
+    for path in glob.glob(os.path.join(backup_dir, f'{glob.escape(stem)}-*.json')):
+        with open(path, encoding='utf-8') as f:
+            meta = json.load(f)
+        if _stem(meta['db_file']) == stem:
+            backups.append(meta)
+    return sorted(backups, key=_order, reverse=True)
+
+def _find_backup(name: Optional[str], backup_dir: str) -> Dict:
+    backups = list_backups(backup_dir)
+    for meta in backups:
+        if name is None or meta['name'] == name:
+            return meta
+    raise ValueError(f"No backup named {name}" if name else f"No backups of {database.get_db_file()} in {backup_dir}")
+
+def create_backup(backup_dir: str = BACKUP_DIR, pages: int = database.BACKUP_STEP_PAGES,
+                  pause: float = database.BACKUP_STEP_PAUSE, prune: bool = True) -> Dict:
+    """Snapshot the current database (and its archive) while it stays in use.
+
+    The main database is copied before the archive: archiving only adds
+    rows to the archive before it deletes them from the main database, so
+    that order never loses rows. Clearing or archiving that commits between
+    the two copies bumps the archive version, and the pair is taken again.
+    """
+    db_file = database.get_db_file()
+    database.init_database()
+    manager = database.get_manager()
+    archived = os.path.exists(database.archive_file(db_file))
+    if archived:
+        manager.attach_archive()
+    schemas = ('main', 'archive') if archived else ('main',)
+
+    os.makedirs(backup_dir, exist_ok=True)
+    created = datetime.now()
+    name = f'{_stem(db_file)}-{created:%Y%m%d-%H%M%S}'
+    suffix = 1
+    while os.path.exists(os.path.join(backup_dir, f'{name}.json')):
+        suffix += 1
+        name = f'{_stem(db_file)}-{created:%Y%m%d-%H%M%S}-{suffix}'
+
+    started = time.perf_counter()
+    meta = {
+        'name': name,
+        'created': created.isoformat(timespec='microseconds'),
+        'db_file': db_file,
+        'files': {},
+        'steps': 0,
+        'longest_stall': 0.0,
+    }
+    with tempfile.TemporaryDirectory(dir=backup_dir) as tmp_dir:
+        for attempt in range(BACKUP_ATTEMPTS):
+            copies = {}
+            for schema in schemas:
+                copies[schema] = os.path.join(tmp_dir, f'{schema}.db')
+                if os.path.exists(copies[schema]):
+                    os.remove(copies[schema])
+                target = sqlite3.connect(copies[schema])
+                try:
+                    stats = manager.backup(target, schema, pages, pause)
+                    # Snapshots are single files, whatever the live journal mode
+                    target.execute('PRAGMA journal_mode = DELETE')
+                finally:
+                    target.close()
+                meta['steps'] += stats['steps']
+                meta['longest_stall'] = max(meta['longest_stall'], stats['longest_stall'])
+            info = _check_copy(copies['main'])
+            if not archived or info.get('archive_version') == database.read_archive_state()[1]:
+                break
+        else:
+            raise RuntimeError(f"The archive kept changing during {BACKUP_ATTEMPTS} backup attempts")
+
+        meta['schema_version'] = info['schema_version']
+        meta['closed_through'] = info.get('closed_through')
+        meta['rows'] = dict(info['rows'])
+        for schema, path in copies.items():
+            checked = info if schema == 'main' else _check_copy(path)
+            if checked['integrity'] != 'ok':
+                raise RuntimeError(f"Backup of {schema} failed its integrity check: {checked['integrity']}")
+            if schema == 'archive':
+                meta['rows'].update({f'archived_{table}': count for table, count in checked['rows'].items()})
+            file_name = f"{name}{'.archive' if schema == 'archive' else ''}.db.gz"
+            with open(path, 'rb') as src, gzip.open(os.path.join(tmp_dir, file_name), 'wb',
+                                                    compresslevel=BACKUP_COMPRESSION_LEVEL) as dst:
+                shutil.copyfileobj(src, dst, 1 << 20)
+            meta['files'][schema] = {
+                'file': file_name,
+                'bytes': os.path.getsize(path),
+                'compressed_bytes': os.path.getsize(os.path.join(tmp_dir, file_name)),
+                'sha256': _sha256(os.path.join(tmp_dir, file_name)),
+            }
+            os.replace(os.path.join(tmp_dir, file_name), os.path.join(backup_dir, file_name))
+        meta['seconds'] = time.perf_counter() - started
+
+        # The JSON file is written last and marks the snapshot complete
+        tmp_path = os.path.join(tmp_dir, f'{name}.json')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_path, os.path.join(backup_dir, f'{name}.json'))
+
+    if prune:
+        meta['pruned'] = prune_backups(backup_dir)
+    return meta
+
+def prune_backups(backup_dir: str = BACKUP_DIR, keep_last: int = BACKUP_KEEP_LAST,
+                  keep_daily: int = BACKUP_KEEP_DAILY, keep_monthly: int = BACKUP_KEEP_MONTHLY) -> List[str]:
+    """Delete snapshots of the current database outside the retention policy, returning their names.
+
+    Kept are the keep_last newest snapshots, the newest snapshot of each of
+    the keep_daily most recent days with one, and likewise for keep_monthly
+    months.
+    """
+    keep = set()
+    days, months = set(), set()
+    for index, meta in enumerate(list_backups(backup_dir)):
+        day, month = meta['created'][:10], meta['created'][:7]
+        if index < keep_last:
+            keep.add(meta['name'])
+        if day not in days and len(days) < keep_daily:
+            days.add(day)
+            keep.add(meta['name'])
+        if month not in months and len(months) < keep_monthly:
+            months.add(month)
+            keep.add(meta['name'])
+
+    pruned = []
+    for meta in list_backups(backup_dir):
+        if meta['name'] in keep:
+            continue
+        # Remove the JSON file first, so a half-deleted snapshot is never listed
+        os.remove(os.path.join(backup_dir, f"{meta['name']}.json"))
+        for entry in meta['files'].values():
+            path = os.path.join(backup_dir, entry['file'])
+            if os.path.exists(path):
+                os.remove(path)
+        pruned.append(meta['name'])
+    return pruned
+
+def _unpack(meta: Dict, backup_dir: str, db_file: str) -> List[str]:
+    """Decompress a snapshot to db_file (and its archive file), returning checksum problems"""
+    problems = []
+    targets = {'main': db_file, 'archive': database.archive_file(db_file)}
+    for schema, entry in meta['files'].items():
+        path = os.path.join(backup_dir, entry['file'])
+        if not os.path.exists(path):
+            problems.append(f"{entry['file']} is missing")
+            continue
+        if _sha256(path) != entry['sha256']:
+            problems.append(f"{entry['file']} does not match its checksum")
+            continue
+        with gzip.open(path, 'rb') as src, open(targets[schema], 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1 << 20)
+    return problems
+
+def verify_backup(name: Optional[str] = None, backup_dir: str = BACKUP_DIR) -> List[str]:
+    """Check a snapshot (the newest by default) and describe any problems.
+
+    The snapshot is restored to a scratch file, checked with PRAGMA
+    integrity_check, compared with the row counts recorded at backup time,
+    brought up to the current schema and checked with verify_rollups() and
+    verify_balances().
+    """
+    meta = _find_backup(name, backup_dir)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = os.path.join(tmp_dir, os.path.basename(meta['db_file']))
+        problems = _unpack(meta, backup_dir, db_file)
+        if problems:
+            return problems
+        rows = {}
+        for schema, path in (('main', db_file), ('archive', database.archive_file(db_file))):
+            if schema not in meta['files']:
+                continue
+            info = _check_copy(path)
+            if info['integrity'] != 'ok':
+                problems.append(f"{schema}: {info['integrity']}")
+            prefix = 'archived_' if schema == 'archive' else ''
+            rows.update({f'{prefix}{table}': count for table, count in info['rows'].items()})
+        if rows != meta['rows']:
+            problems.append(f"row counts {rows} differ from the recorded {meta['rows']}")
+        if problems:
+            return problems
+        try:
+            with database.use_db_file(db_file):
+                database.init_database()
+                problems.extend(database.verify_rollups())
+                problems.extend(database.verify_balances())
+        finally:
+            database.close_connections(db_file)
+    return problems
+
+def restore_backup(name: Optional[str] = None, backup_dir: str = BACKUP_DIR) -> Dict:
+    """Replace the current database (and archive) with a snapshot, the newest by default.
+
+    The snapshot is checked before anything is replaced. The files it
+    replaces are kept next to it with a .before-restore suffix. Stop other
+    processes using the database first; this process's connections are
+    closed and reopened on demand.
+    """
+    meta = _find_backup(name, backup_dir)
+    db_file = database.get_db_file()
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(db_file))) as tmp_dir:
+        restored = os.path.join(tmp_dir, os.path.basename(db_file))
+        problems = _unpack(meta, backup_dir, restored)
+        for schema, path in (('main', restored), ('archive', database.archive_file(restored))):
+            if schema in meta['files'] and not problems:
+                integrity = _check_copy(path)['integrity']
+                if integrity != 'ok':
+                    problems.append(f"{schema}: {integrity}")
+        if problems:
+            raise ValueError(f"Backup {meta['name']} is damaged: {'; '.join(problems)}")
+
+        database.close_connections(db_file)
+        for schema, path in (('main', db_file), ('archive', database.archive_file(db_file))):
+            # Move the current file aside with its WAL, so it stays readable
+            for ext in ('', '-wal', '-shm'):
+                if os.path.exists(f'{path}.before-restore{ext}'):
+                    os.remove(f'{path}.before-restore{ext}')
+                if os.path.exists(f'{path}{ext}'):
+                    os.replace(f'{path}{ext}', f'{path}.before-restore{ext}')
+            if schema in meta['files']:
+                os.replace(database.archive_file(restored) if schema == 'archive' else restored, path)
+    database.init_database()
+    return meta
+
+# ============================================================================
+# COMMAND LINE
+# ============================================================================
+
+def _size(num_bytes: int) -> str:
+    return f'{num_bytes / (1 << 20):.1f} MB'
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Back up, verify and restore the expense database while it is in use")
+    parser.add_argument('--dir', default=BACKUP_DIR, help=f"snapshot directory (default: {BACKUP_DIR})")
+    parser.add_argument('--db', default=database.DB_FILE, help="database file (e.g. a tenant shard)")
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument('--list', action='store_true', help="list snapshots, newest first")
+    action.add_argument('--verify', nargs='?', const='', metavar='NAME', help="check a snapshot (default: the newest)")
+    action.add_argument('--restore', nargs='?', const='', metavar='NAME',
+                        help="replace the database with a snapshot (default: the newest)")
+    action.add_argument('--prune', action='store_true', help="delete snapshots outside the retention policy")
+    parser.add_argument('--keep', action='store_true', help="do not prune old snapshots after backing up")
+    args = parser.parse_args(argv)
+
+    database.set_db_file(args.db)
+    try:
+        if args.list:
+            backups = list_backups(args.dir)
+            for meta in backups:
+                size = sum(entry['compressed_bytes'] for entry in meta['files'].values())
+                print(f"{meta['name']}  {meta['rows'].get('expenses', 0):>9,} expenses  {_size(size):>9}  "
+                      f"{meta['seconds']:.2f}s, longest writer stall {meta['longest_stall'] * 1000:.1f} ms")
+            print(f"📦 {len(backups)} backups of {args.db} in {args.dir}")
+        elif args.verify is not None:
+            problems = verify_backup(args.verify or None, args.dir)
+            for problem in problems:
+                print(f"  {problem}")
+            print(f"❌ {len(problems)} problems found" if problems else "✅ Backup is intact")
+            return 1 if problems else 0
+        elif args.restore is not None:
+            meta = restore_backup(args.restore or None, args.dir)
+            print(f"♻️ Restored {args.db} from {meta['name']} (previous files kept as *.before-restore)")
+        elif args.prune:
+            pruned = prune_backups(args.dir)
+            print(f"🗑️ Deleted {len(pruned)} backups: {', '.join(pruned)}" if pruned else "🗑️ Nothing to delete")
+        else:
+            meta = create_backup(args.dir, prune=not args.keep)
+            size = sum(entry['compressed_bytes'] for entry in meta['files'].values())
+            print(f"💾 Backed up {args.db} to {os.path.join(args.dir, meta['name'])} in {meta['seconds']:.2f}s "
+                  f"({meta['steps']} steps, longest writer stall {meta['longest_stall'] * 1000:.1f} ms, {_size(size)})")
+            if meta.get('pruned'):
+                print(f"🗑️ Deleted {len(meta['pruned'])} old backups")
+    except (ValueError, RuntimeError) as e:
+        print(f"❌ {e}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""Profile module import times with `python -X importtime`.
+
+Each profile runs in a fresh interpreter so nothing is already in
+sys.modules. The login profile also runs the page without a session and
+lists any heavy module it pulled in, which should be none.
+
+Usage:
+    python -m benchmarks.imports
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Set, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+APP_FILE = os.path.join(ROOT, 'expense_tracker.py')
+
+# Modules that must only load once a dashboard section renders
+HEAVY_MODULES = ('pandas', 'numpy', 'plotly.express', 'pyarrow')
+
+# Name -> statement timed in a fresh interpreter
+IMPORT_PROFILES = {
+    'database': 'import database',
+    'importer': 'import importer',
+    'login': 'import streamlit, database, importer',
+    'dashboard': 'import streamlit, database, importer, pandas, plotly.express',
+}
+
+# Profiles that must not import any of HEAVY_MODULES
+LIGHT_PROFILES = ('database', 'importer', 'login')
+
+LOGIN_PAGE_SCRIPT = f"""
+import json, sys
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({APP_FILE!r}, default_timeout=60)
+at.run()
+if at.exception:
+    raise SystemExit(at.exception[0].message)
+print(json.dumps([name for name in {HEAVY_MODULES!r} if name in sys.modules]))
+"""
+
+def profile_statement(statement: str) -> Tuple[float, Set[str]]:
+    """Run statement under -X importtime, returning total ms and the modules imported"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    total_us = 0
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        total_us += int(self_us)
+        modules.add(name.strip())
+    return total_us / 1000, modules
+
+def login_page_heavy_modules() -> List[str]:
+    """Render the login page headlessly and list the heavy modules it imported"""
+    with tempfile.TemporaryDirectory(prefix='expense_imports_') as workdir:
+        result = subprocess.run(
+            [sys.executable, '-c', LOGIN_PAGE_SCRIPT],
+            cwd=workdir, capture_output=True, text=True, check=True,
+            env={**os.environ, 'PYTHONPATH': ROOT}
+        )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def bench_imports(repeat: int = 5) -> Tuple[Dict, List[str]]:
+    """Time every import profile, returning timings and heavy-import violations"""
+    results = {}
+    violations = []
+    for name, statement in IMPORT_PROFILES.items():
+        timings = []
+        for _ in range(repeat):
+            elapsed_ms, modules = profile_statement(statement)
+            timings.append(elapsed_ms)
+        results[f'import[{name}]'] = {
+            'runs': repeat,
+            'min_ms': round(min(timings), 3),
+            'median_ms': round(statistics.median(timings), 3),
+            'mean_ms': round(statistics.fmean(timings), 3),
+            'max_ms': round(max(timings), 3),
+        }
+        if name in LIGHT_PROFILES:
+            violations += [f"import[{name}] loaded {module}" for module in HEAVY_MODULES if module in modules]
+    try:
+        violations += [f"login page loaded {module}" for module in login_page_heavy_modules()]
+    except (subprocess.CalledProcessError, ValueError, IndexError) as e:
+        violations.append(f"login page could not be rendered: {e}")
+    return results, violations
+
+def main() -> int:
+    results, violations = bench_imports()
+    for name, timing in results.items():
+        print(f"   {name:<34} median {timing['median_ms']:>10.3f} ms")
+    for violation in violations:
+        print(f"❌ {violation}")
+    return 1 if violations else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,284 @@
+"""Benchmark the database layer and dashboard page on synthetic ledgers.
+
+Usage:
+    python -m benchmarks.run --sizes 10000 100000 --output bench.json
+    python -m benchmarks.run --sizes 10000 --compare bench.json
+
+Import times (see benchmarks.imports) are recorded once per report under
+'imports' and compared the same way.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import database
+import instrumentation
+from benchmarks import imports, synthetic
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+# Default slowdown ratio (current / baseline median) reported as a regression
+DEFAULT_THRESHOLD = 1.25
+
+# Slowdowns smaller than this many milliseconds are treated as timer noise
+DEFAULT_MIN_DELTA_MS = 0.5
+
+APP_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'expense_tracker.py')
+
+def measure(func: Callable, repeat: int = 5, setup: Optional[Callable] = None) -> Dict:
+    """Time func over several runs and summarize in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {
+        'runs': repeat,
+        'min_ms': round(min(timings), 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'max_ms': round(max(timings), 3),
+    }
+
+@contextmanager
+def scratch_database():
+    """Point the database module at a fresh file in a temporary directory"""
+    previous_cwd, previous_db = os.getcwd(), database.DB_FILE
+    workdir = tempfile.mkdtemp(prefix='expense_bench_')
+    os.chdir(workdir)
+    database.close_connections()
+    database.clear_cache()
+    database.DB_FILE = os.path.join(workdir, 'bench.db')
+    try:
+        database.init_database()
+        yield workdir
+    finally:
+        database.close_connections()
+        database.DB_FILE = previous_db
+        os.chdir(previous_cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def bench_reads(month: str, repeat: int) -> Dict:
+    """Time every read function, uncached and through the read cache"""
+    first_day, last_day = database.get_expense_date_range()
+    reads = {
+        'get_credentials': lambda f: f(),
+        'get_all_expenses': lambda f: f(),
+        'get_all_credits': lambda f: f(),
+        'get_expense_months': lambda f: f(),
+        'get_month_summary': lambda f: f(month),
+        'get_daily_totals': lambda f: f(month),
+        'get_subcategory_totals': lambda f: f(month),
+        'get_category_stats': lambda f: f(month),
+        'get_monthly_totals': lambda f: f(),
+        'get_expense_trend': lambda f: f(first_day, last_day, 'day'),
+        'get_month_expenses': lambda f: f(month),
+        'get_expense_page': lambda f: f(month),
+        'count_expenses': lambda f: f(month),
+        'search_expenses': lambda f: f('diesel gen'),
+    }
+    results = {}
+    for name, call in reads.items():
+        func = getattr(database, name)
+        # Full-table reads are slow at 1M rows, a couple of runs is enough
+        runs = 2 if name.startswith('get_all_') else repeat
+        results[name] = measure(lambda: call(func.uncached), runs)
+        call(func)
+        results[f'{name}[cached]'] = measure(lambda: call(func), repeat)
+    
+    start, end = f"{month}-01", f"{month}-31"
+    results['query_expenses[page]'] = measure(lambda: database.query_expenses(start, end, limit=50), repeat)
+    results['iter_expenses[month]'] = measure(lambda: sum(1 for _ in database.iter_expenses(start, end)), repeat)
+    
+    # Same reads with function and statement timing switched on
+    instrumentation.enable()
+    try:
+        results['get_month_summary[instrumented]'] = measure(lambda: database.get_month_summary.uncached(month), repeat)
+        results['get_expense_page[instrumented]'] = measure(lambda: database.get_expense_page.uncached(month), repeat)
+    finally:
+        instrumentation.disable()
+        instrumentation.reset()
+    return results
+
+def bench_trend(repeat: int) -> Dict:
+    """Time LTTB downsampling of the full daily history"""
+    import numpy as np
+    import trends
+
+    first_day, last_day = database.get_expense_date_range()
+    rows = database.get_expense_trend(first_day, last_day, 'day')
+    x = np.array([period for period, _ in rows], dtype='datetime64[D]').astype(np.int64)
+    y = np.array([total for _, total in rows], dtype=np.float64)
+    return {
+        'lttb[full history]': measure(lambda: trends.lttb(x, y, trends.MAX_TREND_POINTS), repeat)
+    }
+
+def bench_writes(sample: List, repeat: int) -> Dict:
+    """Time single and bulk inserts and the delete paths"""
+    results = {}
+    rng = random.Random(1)
+    row = sample[0]
+    results['add_expense'] = measure(lambda: database.add_expense(*row), repeat * 4)
+    results['add_credit'] = measure(lambda: database.add_credit(row[0], 'bench credit', 100.0), repeat * 4)
+    bulk = list(synthetic.generate_expenses(1000, seed=99))
+    results['add_expenses_bulk[1000]'] = measure(lambda: database.add_expenses_bulk(bulk), repeat)
+    # After the bulk inserts every row is a duplicate: one hash index probe each
+    results['ingest_expenses[1000, duplicates]'] = measure(lambda: database.ingest_expenses(bulk), repeat)
+
+    with database.read_connection() as conn:
+        max_id = conn.execute('SELECT MAX(id) FROM expenses').fetchone()[0]
+    results['delete_expense'] = measure(lambda: database.delete_expense(rng.randint(1, max_id)), repeat * 4)
+
+    batches = [list(range(start, start + 100)) for start in range(1, max_id, max(100, max_id // (repeat + 1)))]
+    results['delete_expenses[100]'] = measure(lambda: database.delete_expenses(batches.pop()), min(repeat, len(batches)))
+
+    pending = list(bulk)
+    results['delete_expense_by_details'] = measure(lambda: database.delete_expense_by_details(*pending.pop()), repeat * 4)
+
+    results['add_expense[8 threads]'] = measure(lambda: concurrent_inserts(row), repeat)
+    database.enable_write_behind()
+    try:
+        results['add_expense[8 threads, queued]'] = measure(lambda: concurrent_inserts(row), repeat)
+    finally:
+        database.disable_write_behind()
+    return results
+
+def concurrent_inserts(row, threads: int = 8, per_thread: int = 25):
+    """Insert from several threads at once, like operators saving at month end"""
+    def insert():
+        for _ in range(per_thread):
+            database.add_expense(*row)
+    workers = [threading.Thread(target=insert) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+def bench_page(repeat: int) -> Dict:
+    """Time headless reruns of the dashboard through Streamlit's AppTest"""
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        return {}
+
+    at = AppTest.from_file(APP_FILE, default_timeout=600)
+    at.session_state['authenticated'] = True
+    at.session_state['userid'] = 'admin'
+    results = {'page_first_run': measure(at.run, 1)}
+    results['page_rerun'] = measure(at.run, repeat)
+    sample = next(synthetic.generate_expenses(1, seed=5))
+    results['page_rerun_after_write'] = measure(at.run, repeat, setup=lambda: database.add_expense(*sample))
+    if at.exception:
+        raise RuntimeError(f"Dashboard raised during benchmark: {at.exception[0].message}")
+    return results
+
+def run_size(size: int, repeat: int, page: bool) -> Dict:
+    """Run every benchmark against a ledger of the given size"""
+    with scratch_database():
+        started = time.perf_counter()
+        sample = synthetic.load_ledger(size, credits=max(1, size // 100))
+        load_seconds = time.perf_counter() - started
+        month = database.get_expense_months()[0]
+
+        results = {
+            'rows': size,
+            'load': {'seconds': round(load_seconds, 3), 'rows_per_second': round(size / load_seconds, 1)},
+            'benchmarks': {}
+        }
+        results['benchmarks']['init_database[first]'] = {
+            'runs': 1, **{key: round(database.last_init_stats['elapsed_ms'], 3) for key in ('min_ms', 'median_ms', 'mean_ms', 'max_ms')}
+        }
+        results['benchmarks']['init_database[steady]'] = measure(database.init_database, repeat)
+        results['benchmarks'].update(bench_reads(month, repeat))
+        results['benchmarks'].update(bench_trend(repeat))
+        if page:
+            results['benchmarks'].update(bench_page(repeat))
+        results['benchmarks'].update(bench_writes(sample, repeat))
+        results['benchmarks']['clear_all_expenses'] = measure(database.clear_all_expenses, 1)
+        return results
+
+def compare(current: Dict, baseline: Dict, threshold: float, min_delta_ms: float = DEFAULT_MIN_DELTA_MS) -> List[str]:
+    """List benchmarks whose median got slower than threshold x the baseline"""
+    groups = [(f"{size} rows", result['benchmarks'], baseline.get('sizes', {}).get(size, {}).get('benchmarks'))
+              for size, result in current['sizes'].items()]
+    groups.append(("imports", current.get('imports', {}), baseline.get('imports')))
+    regressions = []
+    for label, benchmarks, base in groups:
+        if not base:
+            continue
+        for name, timing in benchmarks.items():
+            before = base.get(name)
+            if not before or not before['median_ms']:
+                continue
+            ratio = timing['median_ms'] / before['median_ms']
+            if ratio > threshold and timing['median_ms'] - before['median_ms'] >= min_delta_ms:
+                regressions.append(
+                    f"{label} {name}: {before['median_ms']:.3f}ms -> {timing['median_ms']:.3f}ms ({ratio:.2f}x)"
+                )
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark database.py and the dashboard on synthetic ledgers")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="ledger sizes in rows")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per benchmark")
+    parser.add_argument('--no-page', action='store_true', help="skip the Streamlit AppTest page reruns")
+    parser.add_argument('--no-imports', action='store_true', help="skip the -X importtime profiles")
+    parser.add_argument('--output', help="write results as JSON to this file")
+    parser.add_argument('--compare', help="baseline JSON file to compare against")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help="slowdown ratio counted as a regression")
+    parser.add_argument('--min-delta-ms', type=float, default=DEFAULT_MIN_DELTA_MS, help="ignore slowdowns below this")
+    args = parser.parse_args(argv)
+
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'sizes': {}
+    }
+    failures = []
+    if not args.no_imports:
+        print("⏱️ Profiling imports...", flush=True)
+        report['imports'], failures = imports.bench_imports(args.repeat)
+        for name, timing in report['imports'].items():
+            print(f"   {name:<34} median {timing['median_ms']:>10.3f} ms")
+    for size in args.sizes:
+        print(f"⏱️ Benchmarking {size:,} rows...", flush=True)
+        report['sizes'][str(size)] = run_size(size, args.repeat, page=not args.no_page)
+        for name, timing in report['sizes'][str(size)]['benchmarks'].items():
+            print(f"   {name:<34} median {timing['median_ms']:>10.3f} ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Results written to {args.output}")
+
+    # Heavy modules on the login path fail the run like a regression
+    for failure in failures:
+        print(f"❌ {failure}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold, args.min_delta_ms)
+        for regression in regressions:
+            print(f"❌ {regression}")
+        if regressions:
+            return 1
+        print(f"✅ No benchmark slower than {args.threshold:.2f}x the baseline")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
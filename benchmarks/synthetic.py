@@ -0,0 +1,82 @@
+import random
+from datetime import date, timedelta
+from typing import Iterator, List, Tuple
+
+import database
+
+# Typical amount range (₹) per sub category prefix
+AMOUNT_RANGES = {
+    'MAINT': (200, 25000),
+    'SAL': (3000, 60000),
+    'PUR': (50, 15000),
+    'CASH': (500, 50000),
+    'CREDIT': (1000, 100000),
+}
+
+# Relative frequency of each account category in a real ledger
+CATEGORY_WEIGHTS = {
+    "🏗️ Maintenance Expenses": 4,
+    "👨‍🌾 Staff Payments": 2,
+    "🛒 Purchases": 5,
+    "💳 Cash Flow / Credit Transactions": 1,
+}
+
+DESCRIPTIONS = [
+    'MCB', 'Salary', 'bonus', 'Cement bags', 'Pump repair', 'Garden plants', 'Printer toner',
+    'Water tanker', 'Cleaning supplies', 'Conveyance', 'Wiring', 'Paint', 'Diesel for generator',
+    'Club house repair', 'Office stationery', 'STP chemicals', 'LED bulbs', 'Plumbing work',
+]
+
+def _amount(subcategory: str, rng: random.Random) -> float:
+    low, high = AMOUNT_RANGES[subcategory.split('-')[0]]
+    # Skew towards the low end like real spend
+    return round(low + (high - low) * rng.random() ** 3, 2)
+
+def generate_expenses(count: int, years: int = 3, seed: int = 42,
+                      end: date = date(2025, 12, 31)) -> Iterator[Tuple[str, str, str, str, float]]:
+    """Yield realistic (date, category, subcategory, description, amount) rows"""
+    rng = random.Random(seed)
+    categories = list(CATEGORY_WEIGHTS)
+    weights = [CATEGORY_WEIGHTS[category] for category in categories]
+    span_days = 365 * years
+    start = end - timedelta(days=span_days - 1)
+    for _ in range(count):
+        category = rng.choices(categories, weights)[0]
+        subcategory = rng.choice(database.CATEGORY_OPTIONS[category])
+        # Month-end salary runs make the last days busier
+        day = start + timedelta(days=int(span_days * rng.random() ** 0.9))
+        yield (
+            day.isoformat(),
+            category,
+            subcategory,
+            f"{rng.choice(DESCRIPTIONS)} #{rng.randint(1, 9999)}",
+            _amount(subcategory, rng)
+        )
+
+def generate_credits(count: int, years: int = 3, seed: int = 7,
+                     end: date = date(2025, 12, 31)) -> Iterator[Tuple[str, str, float]]:
+    """Yield (date, description, amount) credit rows"""
+    rng = random.Random(seed)
+    span_days = 365 * years
+    start = end - timedelta(days=span_days - 1)
+    for _ in range(count):
+        day = start + timedelta(days=rng.randrange(span_days))
+        yield day.isoformat(), rng.choice(['received amount', 'maintenance collection', 'interest']), _amount('CREDIT', rng)
+
+def load_ledger(expenses: int, credits: int = 0, batch_size: int = 10000, seed: int = 42) -> List[Tuple]:
+    """Bulk load a synthetic ledger into database.DB_FILE, returning a sample of the rows"""
+    sample = []
+    batch = []
+    for row in generate_expenses(expenses, seed=seed):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            database.add_expenses_bulk(batch)
+            sample.extend(batch[:10])
+            batch = []
+    if batch:
+        database.add_expenses_bulk(batch)
+        sample.extend(batch[:10])
+    credit_rows = list(generate_credits(credits, seed=seed))
+    if credit_rows:
+        database.add_credits_bulk(credit_rows)
+    return sample
@@ -0,0 +1,77 @@
+"""Month figures and tables shared by the dashboard and the report generator"""
+from typing import Dict, List, Tuple
+
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+import database
+
+def subcategory_pie(subcategory_totals: List[Tuple[str, float]], month: str) -> go.Figure:
+    """Pie chart of a month's expense distribution by subcategory"""
+    fig = px.pie(
+        values=[total for _, total in subcategory_totals],
+        names=[subcategory for subcategory, _ in subcategory_totals],
+        title=f"Expense Distribution - {month}",
+        color_discrete_sequence=px.colors.qualitative.Set3
+    )
+    fig.update_traces(textposition='inside', textinfo='percent+label')
+    return fig
+
+def daily_line(daily_totals: List[Tuple[int, float]], month: str) -> go.Figure:
+    """Line chart of a month's spending per day"""
+    fig = px.line(
+        x=[day for day, _ in daily_totals],
+        y=[total for _, total in daily_totals],
+        title=f"Daily Spending - {month}",
+        labels={'x': 'Day of Month', 'y': 'Amount (₹)'},
+        markers=True
+    )
+    fig.update_layout(
+        xaxis_title="Day of Month",
+        yaxis_title="Amount (₹)"
+    )
+    return fig
+
+def category_bar(subcategory_totals: List[Tuple[str, float]], month: str) -> go.Figure:
+    """Horizontal bar chart of a month's expenses by subcategory, largest on top"""
+    category_sum = list(reversed(subcategory_totals))
+    return px.bar(
+        x=[total for _, total in category_sum],
+        y=[subcategory for subcategory, _ in category_sum],
+        orientation='h',
+        title=f"Expenses by Category - {month}",
+        labels={'x': 'Amount (₹)', 'y': 'Category'},
+        color=[total for _, total in category_sum],
+        color_continuous_scale='Blues'
+    )
+
+def monthly_comparison(monthly_totals: List[Tuple[str, float]]) -> go.Figure:
+    """Bar chart of total expenses per month"""
+    return px.bar(
+        x=[month for month, _ in monthly_totals],
+        y=[total for _, total in monthly_totals],
+        title="Total Expenses by Month",
+        labels={'x': 'Month', 'y': 'Total Amount (₹)'},
+        color=[total for _, total in monthly_totals],
+        color_continuous_scale='Viridis'
+    )
+
+def balance_line(balance_history: List[Dict]) -> go.Figure:
+    """Line chart of the closing balance of every month in a balance history"""
+    return px.line(
+        x=[row['month'] for row in balance_history],
+        y=[row['closing_balance'] for row in balance_history],
+        title="Closing Balance by Month",
+        labels={'x': 'Month', 'y': 'Balance (₹)'},
+        markers=True
+    )
+
+def category_stats_frame(month: str) -> pd.DataFrame:
+    """Category breakdown (total, count, average per account category) of a month"""
+    stats = database.get_category_stats(month)
+    if not stats:
+        return pd.DataFrame(columns=['Total', 'Count', 'Average'], index=pd.Index([], name='category'))
+    category_stats = pd.DataFrame(stats).set_index('category').round(2)
+    category_stats.columns = ['Total', 'Count', 'Average']
+    return category_stats
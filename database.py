@@ -1,10 +1,24 @@
 import sqlite3
 import json
 import os
+import io
+import csv
+import queue
+import threading
+import atexit
+import functools
+import itertools
+import hashlib
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Iterator, Iterable, Callable, Any, BinaryIO
 
-# Database file path
+# Database file path (the default database; see set_db_file() for tenants)
 DB_FILE = 'expense_tracker.db'
 
 # JSON file paths for migration
@@ -12,16 +26,1132 @@ EXPENSE_FILE = 'expenses.json'
 CREDITS_FILE = 'credits.json'
 PASSWORD_FILE = 'credentials.json'
 
+# Category definitions (account category -> sub categories)
+CATEGORY_OPTIONS = {
+    "🏗️ Maintenance Expenses": [
+        "MAINT-CIV",
+        "MAINT-ELE",
+        "MAINT-STP",
+        "MAINT-GEN",
+        "MAINT-HK",
+        "MAINT-CLB",
+    ],
+    "👨‍🌾 Staff Payments": [
+        "SAL-INT",
+        "SAL-EXT",
+        "SAL-BONUS",
+        "SAL-CONV",
+    ],
+    "🛒 Purchases": [
+        "PUR-MTRL",
+        "PUR-ELEC",
+        "PUR-GARD",
+        "PUR-OFF",
+        "PUR-HK",
+        "PUR-WATER",
+        "PUR-PRINT",
+    ],
+    "💳 Cash Flow / Credit Transactions": [
+        "CASH-WD",
+        "CASH-CR",
+        "CREDIT",
+    ],
+}
+
+# PRAGMA profile applied to every connection (journal_mode is persistent and
+# only needs to be set by the writer)
+PRAGMA_PROFILE = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -20000,        # negative value = KiB, so ~20 MB page cache
+    'mmap_size': 268435456,      # 256 MB memory-mapped I/O
+    'busy_timeout': 5000,        # milliseconds to wait on a locked database
+}
+
+# Maximum number of pooled read-only connections per database file
+READ_POOL_SIZE = 8
+
+# Maximum number of cached read results shared across sessions
+READ_CACHE_SIZE = 256
+
+# IDs bound per DELETE ... WHERE id IN (...) statement
+DELETE_CHUNK_SIZE = 500
+
+# Rows fetched per fetchmany() call (and Parquet row group) when exporting
+EXPORT_CHUNK_SIZE = 10000
+
+# Route add_expense/add_credit through the group-commit write-behind queue
+WRITE_BEHIND = os.environ.get('EXPENSE_TRACKER_WRITE_BEHIND') == '1'
+
+# Extra time the write-behind thread waits for more writes before committing
+# (seconds). 0 commits whatever queued up during the previous commit; raise it
+# with synchronous=FULL, where each commit is an fsync.
+WRITE_BEHIND_MAX_LATENCY = 0.0
+
+# Most writes committed in one write-behind transaction
+WRITE_BEHIND_MAX_BATCH = 500
+
+# Pages copied per online backup step (the write lock is held for one step)
+# and seconds writers get between steps
+BACKUP_STEP_PAGES = 256
+BACKUP_STEP_PAUSE = 0.005
+
+# sqlite3.Connection subclass used for new connections (instrumentation swaps it)
+CONNECTION_FACTORY = sqlite3.Connection
+
+# ============================================================================
+# CONNECTION MANAGEMENT
+# ============================================================================
+
+# Data generations come from one process-wide counter, so a reopened database
+# never gets a number that older read cache entries were stored under
+_generations = itertools.count(1)
+
+class ConnectionManager:
+    """Reusable connections for one database file.
+
+    Reads go through a pool of read-only connections (a thread keeps the
+    connection it checked out for nested reads), writes go through a single
+    writer connection guarded by a lock so writers queue up in-process
+    instead of fighting over the SQLite file lock.
+    """
+
+    def __init__(self, db_file: str, pragmas: Optional[Dict] = None, pool_size: int = READ_POOL_SIZE):
+        self.db_file = db_file
+        self.pragmas = dict(PRAGMA_PROFILE if pragmas is None else pragmas)
+        self.pool_size = pool_size
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._opened_readers = 0
+        self._writer = None
+        self._write_lock = threading.RLock()
+        # Guards opening the writer, which readers may trigger without the write lock
+        self._writer_init_lock = threading.Lock()
+        self._write_depth = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Data generation, moved on whenever PRAGMA data_version shows a commit
+        # from any connection, in this process or another (see refresh_generation())
+        self.generation = next(_generations)
+        self._watcher = None
+        self._watcher_lock = threading.Lock()
+        self._data_version = None
+
+    def _apply_pragmas(self, conn: sqlite3.Connection, writer: bool):
+        for name in ('busy_timeout', 'synchronous', 'cache_size', 'mmap_size'):
+            if self.pragmas.get(name) is not None:
+                conn.execute(f'PRAGMA {name} = {self.pragmas[name]}')
+        if writer and self.pragmas.get('journal_mode'):
+            conn.execute(f"PRAGMA journal_mode = {self.pragmas['journal_mode']}")
+
+    def _open(self, read_only: bool) -> sqlite3.Connection:
+        if read_only:
+            uri = f'file:{os.path.abspath(self.db_file)}?mode=ro'
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False, isolation_level=None,
+                                   factory=CONNECTION_FACTORY)
+        else:
+            conn = sqlite3.connect(self.db_file, check_same_thread=False, isolation_level=None,
+                                   factory=CONNECTION_FACTORY)
+        conn.row_factory = sqlite3.Row  # Enable column access by name
+        self._apply_pragmas(conn, writer=not read_only)
+        if os.path.exists(archive_file(self.db_file)):
+            _attach_archive(conn, self.db_file, read_only)
+        if read_only:
+            conn.execute('PRAGMA query_only = ON')
+        return conn
+
+    def _get_writer(self) -> sqlite3.Connection:
+        if self._writer is None:
+            with self._writer_init_lock:
+                if self._writer is None:
+                    self._writer = self._open(read_only=False)
+        return self._writer
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a read-only connection from the pool"""
+        conn = getattr(self._local, 'reader', None)
+        if conn is not None:
+            # Nested read on the same thread, reuse the checked-out connection
+            yield conn
+            return
+
+        # Make sure the file exists (and is in WAL mode) before opening it read-only.
+        # Only the first read opens the writer, so reads never wait on the write lock.
+        if self._writer is None:
+            self._get_writer()
+
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened_readers < self.pool_size
+                if can_open:
+                    self._opened_readers += 1
+            conn = self._open(read_only=True) if can_open else self._pool.get()
+        if type(conn) is not CONNECTION_FACTORY:
+            # Opened before CONNECTION_FACTORY changed (instrumentation toggled); only this
+            # idle reader is replaced, the writer keeps its temp tables until the next close
+            conn.close()
+            conn = self._open(read_only=True)
+
+        self._local.reader = conn
+        try:
+            yield conn
+        finally:
+            self._local.reader = None
+            self._pool.put(conn)
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """Run a block on the single writer connection inside one transaction"""
+        with self._write_lock:
+            conn = self._get_writer()
+            outermost = self._write_depth == 0
+            if outermost:
+                conn.execute('BEGIN IMMEDIATE')
+                changes_before = conn.total_changes
+            self._write_depth += 1
+            try:
+                yield conn
+            except BaseException:
+                self._write_depth -= 1
+                if outermost and conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                raise
+            self._write_depth -= 1
+            if outermost:
+                conn.execute('COMMIT')
+                if conn.total_changes != changes_before:
+                    self.refresh_generation()
+
+    def refresh_generation(self) -> int:
+        """Move to a new data generation if anything committed since the last check.
+
+        PRAGMA data_version on a dedicated read-only connection changes with
+        every commit made through another connection, which covers this
+        process's writer as well as importers, maintenance commands, restores
+        and other app workers writing to the same file.
+        """
+        with self._watcher_lock:
+            if self._watcher is None:
+                if self._writer is None:
+                    self._get_writer()
+                self._watcher = sqlite3.connect(f'file:{os.path.abspath(self.db_file)}?mode=ro', uri=True,
+                                                check_same_thread=False, isolation_level=None)
+            data_version = self._watcher.execute('PRAGMA data_version').fetchone()[0]
+            if data_version != self._data_version:
+                if self._data_version is not None:
+                    self.generation = next(_generations)
+                    _read_cache.invalidate(self.db_file)
+                self._data_version = data_version
+        return self.generation
+
+    def attach_archive(self):
+        """Attach the archive database to the writer, creating the file if needed.
+
+        Must be called outside a write transaction; readers attach it
+        themselves when a read first needs it (see _archive_source()).
+        """
+        with self._write_lock:
+            conn = self._get_writer()
+            if not _archive_attached(conn):
+                _attach_archive(conn, self.db_file, read_only=False)
+                if self.pragmas.get('journal_mode'):
+                    conn.execute(f"PRAGMA archive.journal_mode = {self.pragmas['journal_mode']}")
+
+    def backup(self, target: sqlite3.Connection, name: str = 'main', pages: int = BACKUP_STEP_PAGES,
+               pause: float = BACKUP_STEP_PAUSE) -> Dict:
+        """Copy one schema of the live database into target, a few pages at a time.
+
+        The copy runs on the writer connection, holding the write lock for
+        one step of `pages` pages and releasing it for `pause` seconds in
+        between, so queued writes commit between steps and SQLite applies
+        them to the copy too. Writes from other processes restart the copy.
+        Returns the step count, total seconds and longest write lock hold.
+        """
+        stats = {'steps': 0, 'pages': 0, 'seconds': 0.0, 'longest_stall': 0.0}
+        started = time.perf_counter()
+        with self._write_lock:
+            if self._write_depth:
+                raise RuntimeError("Cannot back up from inside a write transaction")
+            conn = self._get_writer()
+            step_started = time.perf_counter()
+
+            def step_done(status, remaining, total):
+                nonlocal step_started
+                stats['steps'] += 1
+                stats['pages'] = total
+                stats['longest_stall'] = max(stats['longest_stall'], time.perf_counter() - step_started)
+                if remaining:
+                    self._write_lock.release()
+                    try:
+                        time.sleep(pause)
+                    finally:
+                        self._write_lock.acquire()
+                step_started = time.perf_counter()
+
+            conn.backup(target, pages=pages, progress=step_done, name=name)
+        stats['seconds'] = time.perf_counter() - started
+        return stats
+
+    def close(self):
+        """Close every connection owned by this manager"""
+        with self._write_lock, self._writer_init_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        with self._watcher_lock:
+            if self._watcher is not None:
+                self._watcher.close()
+                self._watcher = None
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._opened_readers = 0
+
+
+# ============================================================================
+# READ CACHE
+# ============================================================================
+
+class ReadCache:
+    """Process-wide LRU cache for read results, keyed on the data generation.
+
+    Entries are only ever looked up under the current generation of their
+    database, so a commit from any connection or process makes every older
+    entry unreachable.
+    Cached values are shared between sessions and must not be mutated.
+    """
+
+    def __init__(self, max_entries: int = READ_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: Tuple, compute: Callable[[], Any]) -> Any:
+        """Return the cached value for key, computing and storing it on a miss"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        
+        value = compute()
+        
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def invalidate(self, db_file: str):
+        """Drop entries belonging to an older generation of db_file"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == db_file]:
+                del self._entries[key]
+
+    def clear(self):
+        """Drop every entry and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict:
+        """Get hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+_read_cache = ReadCache()
+
+def get_data_generation() -> int:
+    """Get the current data generation of the current database (changes on every commit, from anywhere)"""
+    return get_manager().refresh_generation()
+
+def cached(key: Tuple, compute: Callable[[], Any]) -> Any:
+    """Cache a derived value (e.g. a DataFrame) until the next write to the current database"""
+    manager = get_manager()
+    return _read_cache.get_or_compute((manager.db_file, manager.refresh_generation()) + tuple(key), compute)
+
+def cached_read(func: Callable) -> Callable:
+    """Decorator caching a read function's result until the next write"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (func.__name__, args, tuple(sorted(kwargs.items())))
+        return cached(key, lambda: func(*args, **kwargs))
+    wrapper.uncached = func
+    return wrapper
+
+def cache_stats() -> Dict:
+    """Get read cache hit/miss counters"""
+    return _read_cache.stats()
+
+def clear_cache():
+    """Empty the read cache"""
+    _read_cache.clear()
+
+
+# Database file the current thread (or context) works on; None means DB_FILE.
+# Each Streamlit session runs in its own thread, so one session can work on
+# its tenant's shard while another works on a different one.
+_current_db_file: ContextVar[Optional[str]] = ContextVar('current_db_file', default=None)
+
+def get_db_file() -> str:
+    """Get the database file used by this thread (DB_FILE unless set_db_file() chose another)"""
+    return _current_db_file.get() or DB_FILE
+
+def set_db_file(db_file: Optional[str]):
+    """Make every following call on this thread use db_file (None goes back to DB_FILE)"""
+    _current_db_file.set(db_file)
+
+@contextmanager
+def use_db_file(db_file: Optional[str]) -> Iterator[str]:
+    """Run a block against db_file, restoring the previous database afterwards"""
+    token = _current_db_file.set(db_file)
+    try:
+        yield get_db_file()
+    finally:
+        _current_db_file.reset(token)
+
+
+_managers: Dict[str, ConnectionManager] = {}
+_managers_lock = threading.Lock()
+
+def get_manager(db_file: Optional[str] = None) -> ConnectionManager:
+    """Get the shared connection manager for a database file (the current database by default)"""
+    db_file = db_file or get_db_file()
+    manager = _managers.get(db_file)
+    if manager is None:
+        with _managers_lock:
+            manager = _managers.get(db_file)
+            if manager is None:
+                manager = ConnectionManager(db_file)
+                _managers[db_file] = manager
+    return manager
+
+def configure_pragmas(**pragmas):
+    """Override PRAGMA profile values (e.g. synchronous='FULL') for new connections"""
+    PRAGMA_PROFILE.update(pragmas)
+    close_connections()
+
+def close_connections(db_file: Optional[str] = None):
+    """Flush queued writes and close the pooled connections of db_file, or of every database.
+
+    They are reopened on demand. The file may be replaced while closed (see
+    backups.restore_backup()), so init_database() checks its schema again.
+    """
+    close_write_queues()
+    with _managers_lock:
+        if db_file is None:
+            managers = list(_managers.values())
+            _managers.clear()
+        else:
+            managers = [_managers.pop(db_file)] if db_file in _managers else []
+    for manager in managers:
+        manager.close()
+        # Entries of the closed manager's generations can never be looked up again
+        _read_cache.invalidate(manager.db_file)
+        _initialized_files.discard(manager.db_file)
+    _initialized_files.discard(db_file)
+
+atexit.register(close_connections)
+
+def read_connection():
+    """Context manager yielding a pooled read-only connection"""
+    return get_manager().reader()
+
+def write_connection():
+    """Context manager yielding the writer connection inside a transaction"""
+    return get_manager().writer()
+
 def get_connection():
-    """Get a database connection"""
-    conn = sqlite3.connect(DB_FILE)
+    """Get a standalone database connection with the PRAGMA profile applied"""
+    conn = sqlite3.connect(get_db_file(), factory=CONNECTION_FACTORY)
     conn.row_factory = sqlite3.Row  # Enable column access by name
+    for name in ('busy_timeout', 'synchronous', 'cache_size', 'mmap_size'):
+        if PRAGMA_PROFILE.get(name) is not None:
+            conn.execute(f'PRAGMA {name} = {PRAGMA_PROFILE[name]}')
     return conn
 
-def init_database():
-    """Initialize the database with required tables"""
-    conn = get_connection()
-    cursor = conn.cursor()
+# ============================================================================
+# WRITE-BEHIND QUEUE
+# ============================================================================
+
+class WriteBehindQueue:
+    """Group-commit writer for one database file.
+
+    Callers enqueue single-row INSERT statements and get a Future back. One
+    background thread drains the queue and commits everything that arrived
+    within max_latency seconds (up to max_batch writes) in one transaction,
+    so concurrent writers share a single fsync. A Future resolves to the new
+    row id once its transaction has committed.
+    """
+
+    # Upper bounds of the commit batch size histogram buckets
+    BATCH_BUCKETS = (1, 2, 5, 10, 50, 100, 500)
+
+    def __init__(self, db_file: str, max_latency: Optional[float] = None, max_batch: Optional[int] = None):
+        self.db_file = db_file
+        self.max_latency = WRITE_BEHIND_MAX_LATENCY if max_latency is None else max_latency
+        self.max_batch = WRITE_BEHIND_MAX_BATCH if max_batch is None else max_batch
+        self.submitted = 0
+        self.committed = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+        self.batch_histogram = {bucket: 0 for bucket in self.BATCH_BUCKETS + (float('inf'),)}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f'write-behind:{db_file}', daemon=True)
+        self._thread.start()
+
+    def submit(self, sql: str, params: Tuple) -> Future:
+        """Queue one statement; the Future resolves to its lastrowid after commit"""
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f"Write-behind queue for {self.db_file} is closed")
+            self.submitted += 1
+            self._queue.put((sql, params, future))
+        return future
+
+    def _next_batch(self) -> Tuple[List[Tuple], bool]:
+        """Block for the first write, then gather more until the latency budget runs out"""
+        item = self._queue.get()
+        if item is None:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + self.max_latency
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _commit(self, batch: List[Tuple]):
+        results = []
+        try:
+            with get_manager(self.db_file).writer() as conn:
+                for sql, params, future in batch:
+                    # A failing statement only rolls back itself, not the batch
+                    try:
+                        results.append((future, conn.execute(sql, params).lastrowid, None))
+                    except sqlite3.Error as e:
+                        results.append((future, None, e))
+        except BaseException as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            with self._lock:
+                self.failed += len(batch)
+            return
+        
+        for future, row_id, error in results:
+            if error is None:
+                future.set_result(row_id)
+            else:
+                future.set_exception(error)
+        size = len(batch)
+        with self._lock:
+            self.committed += sum(1 for _, _, error in results if error is None)
+            self.failed += sum(1 for _, _, error in results if error is not None)
+            self.batches += 1
+            self.last_batch_size = size
+            self.max_batch_size = max(self.max_batch_size, size)
+            bucket = next(bound for bound in self.batch_histogram if size <= bound)
+            self.batch_histogram[bucket] += 1
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._next_batch()
+            if batch:
+                self._commit(batch)
+            for _ in range(len(batch) + stopping):
+                self._queue.task_done()
+
+    def flush(self):
+        """Block until every write queued so far has been committed"""
+        self._queue.join()
+
+    def close(self):
+        """Commit the remaining writes and stop the writer thread"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+
+    def stats(self) -> Dict:
+        """Get queue depth and commit batch size metrics"""
+        with self._lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'submitted': self.submitted,
+                'committed': self.committed,
+                'failed': self.failed,
+                'batches': self.batches,
+                'last_batch_size': self.last_batch_size,
+                'max_batch_size': self.max_batch_size,
+                'avg_batch_size': (self.committed + self.failed) / self.batches if self.batches else 0.0,
+                'batch_size_histogram': {
+                    ('+Inf' if bound == float('inf') else f'<={bound}'): count
+                    for bound, count in self.batch_histogram.items()
+                },
+            }
+
+
+_write_queues: Dict[str, WriteBehindQueue] = {}
+_write_queues_lock = threading.Lock()
+
+def get_write_queue(db_file: Optional[str] = None) -> Optional[WriteBehindQueue]:
+    """Get the write-behind queue for a database file, or None if write-behind is off"""
+    if not WRITE_BEHIND:
+        return None
+    db_file = db_file or get_db_file()
+    with _write_queues_lock:
+        write_queue = _write_queues.get(db_file)
+        if write_queue is None:
+            write_queue = _write_queues[db_file] = WriteBehindQueue(db_file)
+    return write_queue
+
+def enable_write_behind(max_latency: Optional[float] = None, max_batch: Optional[int] = None):
+    """Turn on group-commit writes for add_expense/add_credit"""
+    global WRITE_BEHIND, WRITE_BEHIND_MAX_LATENCY, WRITE_BEHIND_MAX_BATCH
+    close_write_queues()
+    if max_latency is not None:
+        WRITE_BEHIND_MAX_LATENCY = max_latency
+    if max_batch is not None:
+        WRITE_BEHIND_MAX_BATCH = max_batch
+    WRITE_BEHIND = True
+
+def disable_write_behind():
+    """Flush pending writes and go back to one commit per write"""
+    global WRITE_BEHIND
+    WRITE_BEHIND = False
+    close_write_queues()
+
+def flush_writes():
+    """Block until every queued write has been committed"""
+    with _write_queues_lock:
+        write_queues = list(_write_queues.values())
+    for write_queue in write_queues:
+        write_queue.flush()
+
+def close_write_queues():
+    """Commit pending writes and stop every write-behind thread"""
+    with _write_queues_lock:
+        write_queues = list(_write_queues.values())
+        _write_queues.clear()
+    for write_queue in write_queues:
+        write_queue.close()
+
+def write_queue_stats() -> Dict[str, Dict]:
+    """Get queue depth and batch size metrics per database file"""
+    with _write_queues_lock:
+        return {db_file: write_queue.stats() for db_file, write_queue in _write_queues.items()}
+
+# ============================================================================
+# ROLLUP TABLES
+# ============================================================================
+
+# Rollup tables maintained by triggers on expenses/credits
+ROLLUP_TABLES = ('rollup_expense_daily', 'rollup_expense_monthly', 'rollup_credit_monthly')
+
+def _rollup_triggers(table: str, rollup: str, key_columns: Tuple[str, ...], key_values: Tuple[str, ...],
+                     source_columns: str) -> List[str]:
+    """Build the insert/delete/update triggers keeping one rollup table current"""
+    columns = ', '.join(key_columns)
+    match = ' AND '.join(f'{column} = {value}' for column, value in zip(key_columns, key_values))
+
+    def add(row: str) -> str:
+        values = ', '.join(value.format(row=row) for value in key_values)
+        return (
+            f'INSERT INTO {rollup} ({columns}, total, count) VALUES ({values}, {row}.amount, 1) '
+            f'ON CONFLICT ({columns}) DO UPDATE SET total = total + excluded.total, count = count + 1;'
+        )
+
+    def remove(row: str) -> str:
+        where = match.format(row=row)
+        return (
+            f'UPDATE {rollup} SET total = total - {row}.amount, count = count - 1 WHERE {where}; '
+            f'DELETE FROM {rollup} WHERE {where} AND count <= 0;'
+        )
+
+    return [
+        f'CREATE TRIGGER IF NOT EXISTS trg_{rollup}_insert AFTER INSERT ON {table} BEGIN {add("NEW")} END',
+        f'CREATE TRIGGER IF NOT EXISTS trg_{rollup}_delete AFTER DELETE ON {table} BEGIN {remove("OLD")} END',
+        f'CREATE TRIGGER IF NOT EXISTS trg_{rollup}_update AFTER UPDATE OF {source_columns} ON {table} '
+        f'BEGIN {remove("OLD")} {add("NEW")} END',
+    ]
+
+ROLLUP_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS rollup_expense_daily (
+        day TEXT NOT NULL,
+        category TEXT NOT NULL,
+        subcategory TEXT NOT NULL,
+        total INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (day, category, subcategory)
+    ) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS rollup_expense_monthly (
+        month TEXT NOT NULL,
+        category TEXT NOT NULL,
+        subcategory TEXT NOT NULL,
+        total INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (month, category, subcategory)
+    ) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS rollup_credit_monthly (
+        month TEXT NOT NULL PRIMARY KEY,
+        total INTEGER NOT NULL,
+        count INTEGER NOT NULL
+    ) WITHOUT ROWID''',
+    *_rollup_triggers('expenses', 'rollup_expense_daily', ('day', 'category', 'subcategory'),
+                      ('{row}.date', '{row}.category', '{row}.subcategory'), 'date, category, subcategory, amount'),
+    *_rollup_triggers('expenses', 'rollup_expense_monthly', ('month', 'category', 'subcategory'),
+                      ('substr({row}.date, 1, 7)', '{row}.category', '{row}.subcategory'), 'date, category, subcategory, amount'),
+    *_rollup_triggers('credits', 'rollup_credit_monthly', ('month',), ('substr({row}.date, 1, 7)',), 'date, amount'),
+]
+
+# Queries recomputing each rollup table from its base table ({expenses} and
+# {credits} become the archive union views once months have been archived)
+ROLLUP_SOURCES = {
+    'rollup_expense_daily': '''SELECT date, category, subcategory, SUM(amount), COUNT(*)
+        FROM {expenses} GROUP BY date, category, subcategory''',
+    'rollup_expense_monthly': '''SELECT substr(date, 1, 7), category, subcategory, SUM(amount), COUNT(*)
+        FROM {expenses} GROUP BY substr(date, 1, 7), category, subcategory''',
+    'rollup_credit_monthly': '''SELECT substr(date, 1, 7), SUM(amount), COUNT(*)
+        FROM {credits} GROUP BY substr(date, 1, 7)''',
+}
+
+def _rollup_sources(conn: sqlite3.Connection) -> Dict[str, str]:
+    sources = {table: _archive_source(conn, table) for table in ('expenses', 'credits')}
+    return {rollup: source.format(**sources) for rollup, source in ROLLUP_SOURCES.items()}
+
+def _rebuild_rollups(cursor: sqlite3.Cursor):
+    """Recompute every rollup table from the base tables"""
+    for rollup, source in _rollup_sources(cursor.connection).items():
+        cursor.execute(f'DELETE FROM {rollup}')
+        cursor.execute(f'INSERT INTO {rollup} {source}')
+
+def rebuild_rollups():
+    """Recompute every rollup table, and the balance snapshots built on them (repair command)"""
+    _attach_writer_archive()
+    with write_connection() as conn:
+        cursor = conn.cursor()
+        _rebuild_rollups(cursor)
+        _refresh_balances(cursor, BALANCE_LEDGER_START)
+
+def verify_rollups() -> List[str]:
+    """Compare rollup tables with the base tables and describe any drift"""
+    problems = []
+    with read_connection() as conn:
+        for rollup, source in _rollup_sources(conn).items():
+            stored = {tuple(row[:-2]): tuple(row[-2:]) for row in conn.execute(f'SELECT * FROM {rollup}')}
+            expected = {tuple(row[:-2]): tuple(row[-2:]) for row in conn.execute(source)}
+            for key in stored.keys() | expected.keys():
+                have, want = stored.get(key), expected.get(key)
+                if have != want:
+                    problems.append(f"{rollup} {key}: stored {have}, expected {want}")
+    return problems
+
+# ============================================================================
+# BALANCE LEDGER
+# ============================================================================
+
+# Month key older than any real month; marks the whole ledger stale
+BALANCE_LEDGER_START = '0000-00'
+
+def _balance_triggers(table: str) -> List[str]:
+    """Build the triggers marking the balance ledger stale from a changed row's month"""
+
+    def stale(row: str) -> str:
+        month = f'substr({row}.date, 1, 7)'
+        return (
+            f'UPDATE balance_ledger_state SET stale_from = {month} '
+            f'WHERE id = 1 AND (stale_from IS NULL OR stale_from > {month});'
+        )
+
+    return [
+        f'CREATE TRIGGER IF NOT EXISTS trg_balance_{table}_insert AFTER INSERT ON {table} BEGIN {stale("NEW")} END',
+        f'CREATE TRIGGER IF NOT EXISTS trg_balance_{table}_delete AFTER DELETE ON {table} BEGIN {stale("OLD")} END',
+        f'CREATE TRIGGER IF NOT EXISTS trg_balance_{table}_update AFTER UPDATE OF date, amount ON {table} '
+        f'BEGIN {stale("OLD")} {stale("NEW")} END',
+    ]
+
+# One snapshot per month with activity, balances in paise. stale_from is the
+# first month whose snapshot (and every later one) no longer matches the data;
+# writes only ever move it back, so a back-dated entry invalidates just the
+# suffix of months from its own month onwards.
+BALANCE_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS balance_snapshots (
+        month TEXT NOT NULL PRIMARY KEY,
+        opening INTEGER NOT NULL,
+        credits INTEGER NOT NULL,
+        expenses INTEGER NOT NULL,
+        closing INTEGER NOT NULL
+    ) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS balance_ledger_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        stale_from TEXT
+    )''',
+    f"INSERT OR IGNORE INTO balance_ledger_state (id, stale_from) VALUES (1, '{BALANCE_LEDGER_START}')",
+    *_balance_triggers('expenses'),
+    *_balance_triggers('credits'),
+]
+
+# Recompute the snapshots from month ?1 onwards out of the monthly rollups,
+# carrying forward the closing balance ?2 of the last month before ?1
+REFRESH_BALANCES_SQL = '''
+    INSERT INTO balance_snapshots (month, opening, credits, expenses, closing)
+    SELECT month, ?2 + running - credits + expenses, credits, expenses, ?2 + running
+    FROM (
+        SELECT month, SUM(credits) AS credits, SUM(expenses) AS expenses,
+               SUM(SUM(credits) - SUM(expenses)) OVER (ORDER BY month) AS running
+        FROM (
+            SELECT month, 0 AS credits, total AS expenses FROM rollup_expense_monthly WHERE month >= ?1
+            UNION ALL
+            SELECT month, total, 0 FROM rollup_credit_monthly WHERE month >= ?1
+        )
+        GROUP BY month
+    )
+'''
+
+def _refresh_balances(cursor: sqlite3.Cursor, from_month: Optional[str] = None):
+    """Recompute the balance snapshots from from_month (default: the stale month) onwards"""
+    if from_month is None:
+        from_month = cursor.execute('SELECT stale_from FROM balance_ledger_state WHERE id = 1').fetchone()[0]
+        if from_month is None:
+            return
+    carried = cursor.execute(
+        'SELECT closing FROM balance_snapshots WHERE month < ? ORDER BY month DESC LIMIT 1',
+        (from_month,)
+    ).fetchone()
+    cursor.execute('DELETE FROM balance_snapshots WHERE month >= ?', (from_month,))
+    cursor.execute(REFRESH_BALANCES_SQL, (from_month, carried[0] if carried else 0))
+    cursor.execute('UPDATE balance_ledger_state SET stale_from = NULL WHERE id = 1')
+
+def _drop_balance_triggers(cursor: sqlite3.Cursor):
+    for (name,) in cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_balance_%'"
+    ).fetchall():
+        cursor.execute(f'DROP TRIGGER {name}')
+
+def _ensure_balances():
+    """Bring stale balance snapshots up to date (a no-op read when nothing changed)"""
+    with read_connection() as conn:
+        stale_from = conn.execute('SELECT stale_from FROM balance_ledger_state WHERE id = 1').fetchone()[0]
+    if stale_from is not None:
+        with write_connection() as conn:
+            _refresh_balances(conn.cursor())
+
+def rebuild_balances():
+    """Recompute every balance snapshot from the rollup tables (repair command)"""
+    with write_connection() as conn:
+        _refresh_balances(conn.cursor(), BALANCE_LEDGER_START)
+
+def verify_balances() -> List[str]:
+    """Compare the balance snapshots with balances recomputed from the base tables"""
+    _ensure_balances()
+    with read_connection() as conn:
+        stored = {row[0]: tuple(row[1:]) for row in conn.execute(
+            'SELECT month, opening, credits, expenses, closing FROM balance_snapshots ORDER BY month'
+        )}
+        flows: Dict[str, List[int]] = {}
+        for position, table in enumerate(('credits', 'expenses')):
+            source = _archive_source(conn, table)
+            for month, total in conn.execute(f'SELECT month, SUM(amount) FROM {source} GROUP BY month'):
+                flows.setdefault(month, [0, 0])[position] = total
+    
+    problems = []
+    balance = 0
+    expected = {}
+    for month in sorted(flows):
+        credits, expenses = flows[month]
+        expected[month] = (balance, credits, expenses, balance + credits - expenses)
+        balance += credits - expenses
+    for month in sorted(stored.keys() | expected.keys()):
+        have, want = stored.get(month), expected.get(month)
+        if have != want:
+            problems.append(f"balance_snapshots {month}: stored {have}, expected {want}")
+    return problems
+
+def _balance_dict(month: str, opening: int, credits: int, expenses: int, closing: int) -> Dict:
+    return {
+        'month': month,
+        'opening_balance': to_rupees(opening),
+        'total_credits': to_rupees(credits),
+        'total_expenses': to_rupees(expenses),
+        'closing_balance': to_rupees(closing),
+    }
+
+@cached_read
+def get_month_balance(month: str) -> Dict:
+    """Get the opening balance, credits, expenses and closing balance of one month.
+
+    Months without any activity carry the previous closing balance forward,
+    so this is a single lookup on the snapshot primary key either way.
+    """
+    _ensure_balances()
+    with read_connection() as conn:
+        row = conn.execute(
+            '''SELECT month, opening, credits, expenses, closing FROM balance_snapshots
+               WHERE month <= ? ORDER BY month DESC LIMIT 1''',
+            (month,)
+        ).fetchone()
+    
+    if row is None:
+        return _balance_dict(month, 0, 0, 0, 0)
+    if row['month'] != month:
+        return _balance_dict(month, row['closing'], 0, 0, row['closing'])
+    return _balance_dict(month, row['opening'], row['credits'], row['expenses'], row['closing'])
+
+@cached_read
+def get_carried_forward_balance(month: str) -> float:
+    """Get the balance brought forward into a month (the closing balance of the month before)"""
+    _ensure_balances()
+    with read_connection() as conn:
+        row = conn.execute(
+            'SELECT closing FROM balance_snapshots WHERE month < ? ORDER BY month DESC LIMIT 1',
+            (month,)
+        ).fetchone()
+    
+    return to_rupees(row['closing']) if row else 0.0
+
+@cached_read
+def get_balance_history(start_month: str = BALANCE_LEDGER_START, end_month: str = '9999-99') -> List[Dict]:
+    """Get the balances of every month with activity in start_month..end_month, oldest first"""
+    _ensure_balances()
+    with read_connection() as conn:
+        rows = conn.execute(
+            '''SELECT month, opening, credits, expenses, closing FROM balance_snapshots
+               WHERE month >= ? AND month <= ? ORDER BY month''',
+            (start_month, end_month)
+        ).fetchall()
+    
+    return [_balance_dict(*row) for row in rows]
+
+# ============================================================================
+# INDEXES AND QUERY PLANS
+# ============================================================================
+
+# Amounts are stored as integer paise. Inserts take rupees and convert them,
+# and fill the stored month/day keys from the date parameter. The keys are
+# plain columns rather than generated ones because SQLite does not treat an
+# index on a generated column as covering.
+#
+# Parameters are those of _expense_params()/_credit_params(). Entries typed
+# in by hand always go in (two identical receipts are two expenses) and only
+# claim the content hash while no other row holds it; ingestion skips rows
+# whose hash is already stored.
+INSERT_EXPENSE_SQL = (
+    'INSERT INTO expenses (date, category, subcategory, description, amount, month, day, external_ref, content_hash) '
+    'VALUES (?1, ?2, ?3, ?4, CAST(round(?5 * 100) AS INTEGER), substr(?1, 1, 7), substr(?1, 1, 10), ?6, '
+    'CASE WHEN EXISTS (SELECT 1 FROM expenses WHERE content_hash = ?7) THEN NULL ELSE ?7 END)'
+)
+INGEST_EXPENSE_SQL = (
+    'INSERT INTO expenses (date, category, subcategory, description, amount, month, day, external_ref, content_hash) '
+    'VALUES (?1, ?2, ?3, ?4, CAST(round(?5 * 100) AS INTEGER), substr(?1, 1, 7), substr(?1, 1, 10), ?6, ?7) '
+    'ON CONFLICT DO NOTHING'
+)
+INSERT_CREDIT_SQL = (
+    'INSERT INTO credits (date, description, amount, month, day, external_ref, content_hash) '
+    'VALUES (?1, ?2, CAST(round(?3 * 100) AS INTEGER), substr(?1, 1, 7), substr(?1, 1, 10), ?4, '
+    'CASE WHEN EXISTS (SELECT 1 FROM credits WHERE content_hash = ?5) THEN NULL ELSE ?5 END)'
+)
+INGEST_CREDIT_SQL = (
+    'INSERT INTO credits (date, description, amount, month, day, external_ref, content_hash) '
+    'VALUES (?1, ?2, CAST(round(?3 * 100) AS INTEGER), substr(?1, 1, 7), substr(?1, 1, 10), ?4, ?5) '
+    'ON CONFLICT DO NOTHING'
+)
+
+def to_paise(amount: float) -> int:
+    """Convert a rupee amount to integer paise (rounding half away from zero like SQLite)"""
+    paise = abs(amount) * 100
+    return int(paise + 0.5) * (1 if amount >= 0 else -1)
+
+def to_rupees(paise: Optional[int]) -> float:
+    """Convert stored integer paise back to rupees"""
+    return paise / 100 if paise else 0.0
+
+def content_hash(date: str, category: str, subcategory: str, description: str, amount_paise: int,
+                 external_ref: Optional[str] = None, occurrence: int = 0) -> bytes:
+    """Hash the normalized content of an entry (credits pass '' for both categories).
+
+    Dates are cut to YYYY-MM-DD and descriptions compared case-insensitively
+    with runs of whitespace collapsed, so a re-exported statement hashes the
+    same as the original. occurrence numbers repeats of the same entry within
+    one import (0 for the first), so a statement listing two identical
+    transactions keeps both and a re-import of it still matches row for row.
+    """
+    fields = (
+        str(date).strip()[:10],
+        category.strip(),
+        subcategory.strip(),
+        ' '.join(str(description).split()).casefold(),
+        str(int(amount_paise)),
+        str(external_ref).strip() if external_ref is not None else '',
+    ) + ((str(occurrence),) if occurrence else ())
+    return hashlib.blake2b('\x1f'.join(fields).encode('utf-8'), digest_size=16).digest()
+
+def _expense_params(date: str, category: str, subcategory: str, description: str, amount: float,
+                    external_ref: Optional[str] = None, occurrence: int = 0) -> Tuple:
+    return (date, category, subcategory, description, amount, external_ref,
+            content_hash(date, category, subcategory, description, to_paise(amount), external_ref, occurrence))
+
+def _credit_params(date: str, description: str, amount: float, external_ref: Optional[str] = None,
+                   occurrence: int = 0) -> Tuple:
+    return (date, description, amount, external_ref,
+            content_hash(date, '', '', description, to_paise(amount), external_ref, occurrence))
+
+def _rupee_columns(columns: Iterable[str]) -> str:
+    """Build a select list for columns that reads the stored paise amount back as rupees"""
+    return ', '.join('amount / 100.0 AS amount' if column == 'amount' else column for column in columns)
+
+# Keep the keys correct for rows written without them or whose date changes
+DATE_KEY_TRIGGERS = [
+    f'''CREATE TRIGGER IF NOT EXISTS trg_{table}_date_keys_{event}
+       AFTER {event.upper()} {'OF date ' if event == 'update' else ''}ON {table}
+       WHEN NEW.month IS NOT substr(NEW.date, 1, 7) OR NEW.day IS NOT substr(NEW.date, 1, 10)
+       BEGIN
+           UPDATE {table} SET month = substr(NEW.date, 1, 7), day = substr(NEW.date, 1, 10) WHERE id = NEW.id;
+       END'''
+    for table in ('expenses', 'credits')
+    for event in ('insert', 'update')
+]
+
+# Composite covering indexes for the month and detail-lookup access paths
+COVERING_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_expenses_month_subcategory ON expenses(month, subcategory, amount)',
+    'CREATE INDEX IF NOT EXISTS idx_expenses_month_category ON expenses(month, category, amount)',
+    'CREATE INDEX IF NOT EXISTS idx_expenses_details ON expenses(date, category, subcategory, description, amount)',
+    'CREATE INDEX IF NOT EXISTS idx_credits_month ON credits(month, amount)',
+]
+
+# Hot queries and the index EXPLAIN QUERY PLAN must report for each of them
+QUERY_PLAN_EXPECTATIONS = {
+    'month_subcategory_totals': (
+        'SELECT subcategory, SUM(amount) FROM expenses WHERE month = ? GROUP BY subcategory',
+        ('2025-01',), 'COVERING INDEX idx_expenses_month_subcategory'
+    ),
+    'month_category_stats': (
+        'SELECT category, SUM(amount), COUNT(*), AVG(amount) FROM expenses WHERE month = ? GROUP BY category',
+        ('2025-01',), 'COVERING INDEX idx_expenses_month_category'
+    ),
+    'month_extremes': (
+        'SELECT MAX(amount), MIN(amount) FROM expenses WHERE month = ?',
+        ('2025-01',), 'COVERING INDEX idx_expenses_month_'
+    ),
+    'count_by_subcategory': (
+        'SELECT COUNT(*) FROM expenses WHERE month = ? AND subcategory = ?',
+        ('2025-01', 'PUR-ELEC'), 'COVERING INDEX idx_expenses_month_subcategory'
+    ),
+    'count_by_category': (
+        'SELECT COUNT(*) FROM expenses WHERE month = ? AND category = ?',
+        ('2025-01', 'x'), 'COVERING INDEX idx_expenses_month_category'
+    ),
+    'detail_lookup': (
+        '''SELECT id FROM expenses WHERE date = ? AND category = ? AND subcategory = ?
+           AND description = ? AND amount = ? LIMIT 1''',
+        ('2025-01-01', 'x', 'y', 'z', 100), 'COVERING INDEX idx_expenses_details (date=? AND category=? AND subcategory=? AND description=? AND amount=?)'
+    ),
+    'month_page_by_date': (
+        '''SELECT id, date, category, subcategory, description, amount FROM expenses
+           WHERE date >= ? AND date < ? ORDER BY date DESC, id DESC LIMIT 50''',
+        ('2025-01-01', '2025-02-01'), 'INDEX idx_expenses_date'
+    ),
+    'keyset_range_page': (
+        '''SELECT date, amount FROM expenses
+           WHERE date >= ? AND date <= ? AND (date, id) > (?, ?) ORDER BY date, id LIMIT 101''',
+        ('2025-01-01', '2025-12-31', '2025-03-01', 1), 'INDEX idx_expenses_date'
+    ),
+    'month_credit_total': (
+        'SELECT SUM(amount) FROM credits WHERE month = ?',
+        ('2025-01',), 'COVERING INDEX idx_credits_month'
+    ),
+    'carried_forward_balance': (
+        'SELECT closing FROM balance_snapshots WHERE month < ? ORDER BY month DESC LIMIT 1',
+        ('2025-01',), 'SEARCH balance_snapshots USING PRIMARY KEY (month<?)'
+    ),
+}
+
+def explain_query_plan(sql: str, params: Tuple = ()) -> List[str]:
+    """Get the EXPLAIN QUERY PLAN detail lines for a statement"""
+    with read_connection() as conn:
+        # EXPLAIN alone never reads the file, so a pooled reader could plan against a stale schema
+        conn.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+        return [row['detail'] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+
+def check_query_plans() -> List[str]:
+    """Assert that every hot query still uses its expected index, returning failures"""
+    failures = []
+    for name, (sql, params, expected) in QUERY_PLAN_EXPECTATIONS.items():
+        plan = explain_query_plan(sql, params)
+        if not any(expected in detail for detail in plan):
+            failures.append(f"{name}: expected {expected!r}, got {plan}")
+    return failures
+
+# ============================================================================
+# SCHEMA MIGRATIONS
+# ============================================================================
+
+# Current expenses/credits table layouts ({table} is the table name)
+EXPENSES_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT NOT NULL,
+        category TEXT NOT NULL,
+        subcategory TEXT NOT NULL,
+        description TEXT NOT NULL,
+        amount INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        month TEXT,
+        day TEXT,
+        external_ref TEXT,
+        content_hash BLOB
+    )
+'''
+CREDITS_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT NOT NULL,
+        description TEXT NOT NULL,
+        amount INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        month TEXT,
+        day TEXT,
+        external_ref TEXT,
+        content_hash BLOB
+    )
+'''
+
+def _migrate_base_tables(cursor: sqlite3.Cursor):
+    """Create the credentials, expenses and credits tables"""
     
     # Create credentials table
     cursor.execute('''
@@ -33,121 +1163,304 @@ def init_database():
         )
     ''')
     
-    # Create expenses table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS expenses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date TEXT NOT NULL,
-            category TEXT NOT NULL,
-            subcategory TEXT NOT NULL,
-            description TEXT NOT NULL,
-            amount REAL NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Create credits table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS credits (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date TEXT NOT NULL,
-            description TEXT NOT NULL,
-            amount REAL NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
+    # Create expenses and credits tables
+    cursor.execute(EXPENSES_TABLE_SQL.format(table='expenses'))
+    cursor.execute(CREDITS_TABLE_SQL.format(table='credits'))
     
     # Create indexes for better query performance
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses(date)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_credits_date ON credits(date)')
-    
-    conn.commit()
-    conn.close()
-    
-    # Perform migration if JSON files exist
-    migrate_json_to_db()
 
-def migrate_json_to_db():
-    """Migrate data from JSON files to database (one-time operation)"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Check if migration has already been done
-    cursor.execute('SELECT COUNT(*) FROM credentials')
-    has_credentials = cursor.fetchone()[0] > 0
+def _migrate_date_keys(cursor: sqlite3.Cursor):
+    """Add the stored month/day keys and the covering indexes that use them"""
+    for table in ('expenses', 'credits'):
+        _add_date_key_columns(cursor, table)
+    for statement in COVERING_INDEXES:
+        cursor.execute(statement)
+    for statement in DATE_KEY_TRIGGERS:
+        cursor.execute(statement)
+
+def _drop_rollup_triggers(cursor: sqlite3.Cursor):
+    for (name,) in cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_rollup_%'"
+    ).fetchall():
+        cursor.execute(f'DROP TRIGGER {name}')
+
+def _migrate_rollups(cursor: sqlite3.Cursor):
+    """Create the rollup tables and triggers, then fill them from the base tables"""
+    # Recreate triggers so databases with older definitions pick up the current ones
+    _drop_rollup_triggers(cursor)
+    for statement in ROLLUP_SCHEMA:
+        cursor.execute(statement)
+    _rebuild_rollups(cursor)
+
+def _convert_amounts_to_paise(cursor: sqlite3.Cursor):
+    """Rebuild expenses/credits tables that still store REAL rupees with integer paise amounts.
+
+    SQLite cannot change a column's type in place, so each table is copied
+    into the current layout (keeping ids, which the search index refers to)
+    and the indexes and triggers dropped with the old table are recreated.
+    """
+    converted = False
+    for table, create_sql in (('expenses', EXPENSES_TABLE_SQL), ('credits', CREDITS_TABLE_SQL)):
+        column_types = {row[1]: row[2].upper() for row in cursor.execute(f'PRAGMA table_info({table})')}
+        if column_types['amount'] == 'INTEGER':
+            continue
+        _add_date_key_columns(cursor, table)
+        cursor.execute(create_sql.format(table=f'{table}_paise'))
+        columns = [row[1] for row in cursor.execute(f'PRAGMA table_info({table})')]
+        values = ['CAST(round(amount * 100) AS INTEGER)' if column == 'amount' else column for column in columns]
+        cursor.execute(f"INSERT INTO {table}_paise ({', '.join(columns)}) SELECT {', '.join(values)} FROM {table}")
+        cursor.execute(f'DROP TABLE {table}')
+        cursor.execute(f'ALTER TABLE {table}_paise RENAME TO {table}')
+        converted = True
+    if not converted:
+        return
     
-    cursor.execute('SELECT COUNT(*) FROM expenses')
-    has_expenses = cursor.fetchone()[0] > 0
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses(date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_credits_date ON credits(date)')
+    for statement in COVERING_INDEXES + DATE_KEY_TRIGGERS:
+        cursor.execute(statement)
+    existing = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if 'rollup_expense_daily' in existing:
+        _migrate_rollups(cursor)
+    if 'expenses_fts' in existing:
+        for statement in SEARCH_SCHEMA:
+            cursor.execute(statement)
+    if 'balance_snapshots' in existing:
+        for statement in BALANCE_SCHEMA:
+            cursor.execute(statement)
+        _refresh_balances(cursor, BALANCE_LEDGER_START)
+    if 'archive_state' in existing:
+        for statement in ARCHIVE_STATE_SCHEMA:
+            cursor.execute(statement)
+
+def _migrate_json_files(cursor: sqlite3.Cursor):
+    """Import the legacy JSON files into empty tables"""
+    # The import writes integer paise, so tables still storing rupees are converted first
+    _convert_amounts_to_paise(cursor)
+    # The JSON files predate tenants and belong to the default database only
+    if get_db_file() == DB_FILE:
+        migrate_json_to_db()
+
+def _migrate_search(cursor: sqlite3.Cursor):
+    """Create the description search index and its triggers, then index existing rows"""
+    for statement in SEARCH_SCHEMA:
+        cursor.execute(statement)
+    cursor.execute("INSERT INTO expenses_fts (expenses_fts) VALUES ('rebuild')")
+
+def _migrate_integer_amounts(cursor: sqlite3.Cursor):
+    """Store amounts and rollup totals as integer paise"""
+    # Rollup totals were REAL; recreate the tables so they sum integers
+    _drop_rollup_triggers(cursor)
+    for rollup in ROLLUP_TABLES:
+        cursor.execute(f'DROP TABLE IF EXISTS {rollup}')
+    _convert_amounts_to_paise(cursor)
+    _migrate_rollups(cursor)
+
+# One unique index per table on the content hash; rows without a hash (NULL) never conflict
+CONTENT_HASH_INDEXES = [
+    'CREATE UNIQUE INDEX IF NOT EXISTS idx_expenses_content_hash ON expenses(content_hash)',
+    'CREATE UNIQUE INDEX IF NOT EXISTS idx_credits_content_hash ON credits(content_hash)',
+]
+
+def _migrate_content_hashes(cursor: sqlite3.Cursor):
+    """Add external references and unique content hashes, hashing existing rows"""
+    for table in ('expenses', 'credits'):
+        columns = {row[1] for row in cursor.execute(f'PRAGMA table_info({table})')}
+        if 'external_ref' not in columns:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN external_ref TEXT')
+        if 'content_hash' not in columns:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN content_hash BLOB')
+    for statement in CONTENT_HASH_INDEXES:
+        cursor.execute(statement)
     
-    cursor.execute('SELECT COUNT(*) FROM credits')
-    has_credits = cursor.fetchone()[0] > 0
+    # Only the first (lowest id) of identical existing rows gets the hash;
+    # OR IGNORE leaves the later ones NULL instead of failing on the index
+    cursor.connection.create_function('content_hash', 6, content_hash, deterministic=True)
+    cursor.execute(
+        '''UPDATE OR IGNORE expenses
+           SET content_hash = content_hash(date, category, subcategory, description, amount, external_ref)
+           WHERE content_hash IS NULL'''
+    )
+    cursor.execute(
+        '''UPDATE OR IGNORE credits SET content_hash = content_hash(date, '', '', description, amount, external_ref)
+           WHERE content_hash IS NULL'''
+    )
+
+def _migrate_balance_ledger(cursor: sqlite3.Cursor):
+    """Create the month balance snapshots and their invalidation triggers, then fill them"""
+    _drop_balance_triggers(cursor)
+    for statement in BALANCE_SCHEMA:
+        cursor.execute(statement)
+    _refresh_balances(cursor, BALANCE_LEDGER_START)
+
+def _migrate_archive_state(cursor: sqlite3.Cursor):
+    """Create the closed-month state and the triggers keeping closed months read-only"""
+    for statement in ARCHIVE_STATE_SCHEMA:
+        cursor.execute(statement)
+
+# Ordered schema migrations; entry N brings a database to PRAGMA user_version N+1.
+# Every step is idempotent so databases created before versioning can replay them.
+MIGRATIONS = [
+    ('base tables', _migrate_base_tables),
+    ('month/day keys and covering indexes', _migrate_date_keys),
+    ('rollup tables', _migrate_rollups),
+    ('legacy JSON import', _migrate_json_files),
+    ('description search index', _migrate_search),
+    ('integer paise amounts', _migrate_integer_amounts),
+    ('content hashes', _migrate_content_hashes),
+    ('balance ledger', _migrate_balance_ledger),
+    ('archive state', _migrate_archive_state),
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# Database files already brought up to SCHEMA_VERSION by this process
+_initialized_files = set()
+_init_lock = threading.Lock()
+# One lock per file, so migrating one tenant's shard never holds up another
+_init_locks: Dict[str, threading.Lock] = {}
+
+# Timing of the most recent init_database() call
+last_init_stats: Dict = {}
+
+def get_schema_version() -> int:
+    """Get the PRAGMA user_version of the current database"""
+    with read_connection() as conn:
+        return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def init_database() -> Dict:
+    """Bring the database schema up to date, once per process.
+
+    Steady-state calls (e.g. on every Streamlit rerun) return without
+    touching the database. Each pending migration runs in its own
+    transaction together with its user_version bump.
+    """
+    global last_init_stats
+    db_file = get_db_file()
+    started = time.perf_counter()
+    if db_file in _initialized_files:
+        last_init_stats = {'db_file': db_file, 'elapsed_ms': (time.perf_counter() - started) * 1000, 'applied': []}
+        return last_init_stats
     
-    # Migrate credentials
-    if not has_credentials and os.path.exists(PASSWORD_FILE):
-        try:
-            with open(PASSWORD_FILE, 'r') as f:
-                creds = json.load(f)
-                cursor.execute(
-                    'INSERT INTO credentials (userid, password) VALUES (?, ?)',
-                    (creds.get('userid', 'admin'), creds.get('password', 'password'))
-                )
-                print(f"✅ Migrated credentials from {PASSWORD_FILE}")
-        except Exception as e:
-            print(f"⚠️ Could not migrate credentials: {e}")
+    with _init_lock:
+        file_lock = _init_locks.setdefault(db_file, threading.Lock())
+    with file_lock:
+        applied = []
+        with write_connection() as conn:
+            from_version = conn.execute('PRAGMA user_version').fetchone()[0]
+        for version, (name, migrate) in enumerate(MIGRATIONS[from_version:], start=from_version + 1):
+            with write_connection() as conn:
+                migrate(conn.cursor())
+                conn.execute(f'PRAGMA user_version = {version}')
+            applied.append(name)
+        _initialized_files.add(db_file)
     
-    # Migrate expenses
-    if not has_expenses and os.path.exists(EXPENSE_FILE):
-        try:
-            with open(EXPENSE_FILE, 'r') as f:
-                expenses = json.load(f)
-                for expense in expenses:
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    last_init_stats = {
+        'db_file': db_file,
+        'elapsed_ms': elapsed_ms,
+        'from_version': from_version,
+        'to_version': SCHEMA_VERSION,
+        'applied': applied
+    }
+    print(f"⏱️ Database ready in {elapsed_ms:.1f} ms (schema v{from_version} -> v{SCHEMA_VERSION}"
+          f"{', applied: ' + ', '.join(applied) if applied else ''})")
+    return last_init_stats
+
+def _add_date_key_columns(cursor: sqlite3.Cursor, table: str):
+    """Add and backfill the stored month/day key columns on an existing table"""
+    columns = {row[1] for row in cursor.execute(f'PRAGMA table_info({table})')}
+    if 'month' in columns and 'day' in columns:
+        return
+    if 'month' not in columns:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN month TEXT')
+    if 'day' not in columns:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN day TEXT')
+    cursor.execute(f'UPDATE {table} SET month = substr(date, 1, 7), day = substr(date, 1, 10)')
+
+def migrate_json_to_db() -> Dict[str, Tuple[int, int]]:
+    """Import the JSON files into the database, skipping entries already stored.
+
+    Safe to re-run: expenses and credits are ingested by content hash, so
+    only entries missing from the database are added. Until the unique
+    content hash indexes exist (databases older than the 'content hashes'
+    migration) stored rows cannot be recognised, so only empty tables are
+    filled. Returns {table: (inserted, duplicates skipped)}.
+    """
+    report = {}
+    with write_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Credentials are only seeded into an empty table
+        cursor.execute('SELECT COUNT(*) FROM credentials')
+        has_credentials = cursor.fetchone()[0] > 0
+        
+        def can_ingest(table: str) -> bool:
+            has_hash_index = cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (f'idx_{table}_content_hash',)
+            ).fetchone()
+            return bool(has_hash_index) or not cursor.execute(f'SELECT 1 FROM {table} LIMIT 1').fetchone()
+        
+        # Migrate credentials
+        if not has_credentials and os.path.exists(PASSWORD_FILE):
+            try:
+                with open(PASSWORD_FILE, 'r') as f:
+                    creds = json.load(f)
                     cursor.execute(
-                        'INSERT INTO expenses (date, category, subcategory, description, amount) VALUES (?, ?, ?, ?, ?)',
-                        (
-                            expense.get('date'),
-                            expense.get('category', 'Uncategorized'),
-                            expense.get('subcategory', expense.get('category', 'Uncategorized')),
-                            expense.get('description', ''),
-                            expense.get('amount', 0.0)
-                        )
+                        'INSERT INTO credentials (userid, password) VALUES (?, ?)',
+                        (creds.get('userid', 'admin'), creds.get('password', 'password'))
                     )
-                print(f"✅ Migrated {len(expenses)} expenses from {EXPENSE_FILE}")
-        except Exception as e:
-            print(f"⚠️ Could not migrate expenses: {e}")
-    
-    # Migrate credits
-    if not has_credits and os.path.exists(CREDITS_FILE):
-        try:
-            with open(CREDITS_FILE, 'r') as f:
-                credits = json.load(f)
-                for credit in credits:
-                    cursor.execute(
-                        'INSERT INTO credits (date, description, amount) VALUES (?, ?, ?)',
-                        (
-                            credit.get('date'),
-                            credit.get('description', ''),
-                            credit.get('amount', 0.0)
-                        )
+                    print(f"✅ Migrated credentials from {PASSWORD_FILE}")
+            except Exception as e:
+                print(f"⚠️ Could not migrate credentials: {e}")
+        
+        # Migrate expenses
+        if os.path.exists(EXPENSE_FILE) and can_ingest('expenses'):
+            try:
+                with open(EXPENSE_FILE, 'r') as f:
+                    expenses = json.load(f)
+                inserted, skipped, _ = ingest_expenses(
+                    (
+                        expense.get('date'),
+                        expense.get('category', 'Uncategorized'),
+                        expense.get('subcategory', expense.get('category', 'Uncategorized')),
+                        expense.get('description', ''),
+                        expense.get('amount', 0.0)
                     )
-                print(f"✅ Migrated {len(credits)} credits from {CREDITS_FILE}")
-        except Exception as e:
-            print(f"⚠️ Could not migrate credits: {e}")
+                    for expense in expenses
+                )
+                report['expenses'] = (inserted, len(skipped))
+                print(f"✅ Migrated {inserted} expenses from {EXPENSE_FILE} ({len(skipped)} already present)")
+            except Exception as e:
+                print(f"⚠️ Could not migrate expenses: {e}")
+        
+        # Migrate credits
+        if os.path.exists(CREDITS_FILE) and can_ingest('credits'):
+            try:
+                with open(CREDITS_FILE, 'r') as f:
+                    credits = json.load(f)
+                inserted, skipped, _ = ingest_credits(
+                    (credit.get('date'), credit.get('description', ''), credit.get('amount', 0.0))
+                    for credit in credits
+                )
+                report['credits'] = (inserted, len(skipped))
+                print(f"✅ Migrated {inserted} credits from {CREDITS_FILE} ({len(skipped)} already present)")
+            except Exception as e:
+                print(f"⚠️ Could not migrate credits: {e}")
     
-    conn.commit()
-    conn.close()
+    return report
 
 # ============================================================================
 # CREDENTIAL OPERATIONS
 # ============================================================================
 
+@cached_read
 def get_credentials() -> Tuple[str, str]:
     """Get stored credentials"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT userid, password FROM credentials LIMIT 1')
-    row = cursor.fetchone()
-    conn.close()
+    with read_connection() as conn:
+        row = conn.execute('SELECT userid, password FROM credentials LIMIT 1').fetchone()
     
     if row:
         return row['userid'], row['password']
@@ -155,43 +1468,49 @@ def get_credentials() -> Tuple[str, str]:
         # Return default credentials if none exist
         return 'admin', 'password'
 
+def verify_credentials(userid: str, password: str) -> bool:
+    """Check a user id and password against the credentials table"""
+    with read_connection() as conn:
+        row = conn.execute('SELECT password FROM credentials WHERE userid = ?', (userid,)).fetchone()
+        if row is None and conn.execute('SELECT 1 FROM credentials LIMIT 1').fetchone() is None:
+            # Nothing stored yet, so the default credentials apply
+            return (userid, password) == get_credentials()
+    return row is not None and row['password'] == password
+
 def update_credentials(userid: str, password: str):
-    """Update or insert credentials"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Check if credentials exist
-    cursor.execute('SELECT id FROM credentials LIMIT 1')
-    row = cursor.fetchone()
-    
-    if row:
-        # Update existing
-        cursor.execute(
-            'UPDATE credentials SET userid = ?, password = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
-            (userid, password, row['id'])
-        )
-    else:
-        # Insert new
-        cursor.execute(
-            'INSERT INTO credentials (userid, password) VALUES (?, ?)',
-            (userid, password)
-        )
-    
-    conn.commit()
-    conn.close()
+    """Update a user's password, adding the user if it has no credentials yet"""
+    with write_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Check if credentials exist
+        cursor.execute('SELECT id FROM credentials WHERE userid = ?', (userid,))
+        row = cursor.fetchone()
+        
+        if row:
+            # Update existing
+            cursor.execute(
+                'UPDATE credentials SET userid = ?, password = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                (userid, password, row['id'])
+            )
+        else:
+            # Insert new
+            cursor.execute(
+                'INSERT INTO credentials (userid, password) VALUES (?, ?)',
+                (userid, password)
+            )
 
 # ============================================================================
 # EXPENSE OPERATIONS
 # ============================================================================
 
+@cached_read
 def get_all_expenses() -> List[Dict]:
     """Get all expenses from database"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT id, date, category, subcategory, description, amount FROM expenses ORDER BY date DESC')
-    rows = cursor.fetchall()
-    conn.close()
+    with read_connection() as conn:
+        source = _archive_source(conn, 'expenses')
+        rows = conn.execute(
+            f'SELECT id, date, category, subcategory, description, amount / 100.0 AS amount FROM {source} ORDER BY date DESC'
+        ).fetchall()
     
     expenses = []
     for row in rows:
@@ -206,70 +1525,189 @@ def get_all_expenses() -> List[Dict]:
     
     return expenses
 
+def add_expense_async(date: str, category: str, subcategory: str, description: str, amount: float) -> Future:
+    """Queue a new expense; the Future resolves to its id once committed.
+
+    Falls back to a synchronous insert (returning a finished Future) when
+    write-behind is off. Raises ValueError for a closed month, like add_expense().
+    """
+    check_month_open(date)
+    write_queue = get_write_queue()
+    if write_queue is not None:
+        return write_queue.submit(INSERT_EXPENSE_SQL, _expense_params(date, category, subcategory, description, amount))
+    future = Future()
+    future.set_result(add_expense(date, category, subcategory, description, amount))
+    return future
+
 def add_expense(date: str, category: str, subcategory: str, description: str, amount: float) -> int:
     """Add a new expense to database"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        'INSERT INTO expenses (date, category, subcategory, description, amount) VALUES (?, ?, ?, ?, ?)',
-        (date, category, subcategory, description, amount)
-    )
-    
-    expense_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    check_month_open(date)
+    write_queue = get_write_queue()
+    if write_queue is not None:
+        # Wait for the shared group commit instead of committing alone
+        params = _expense_params(date, category, subcategory, description, amount)
+        return write_queue.submit(INSERT_EXPENSE_SQL, params).result()
+    with write_connection() as conn:
+        cursor = conn.execute(
+            INSERT_EXPENSE_SQL,
+            _expense_params(date, category, subcategory, description, amount)
+        )
+        expense_id = cursor.lastrowid
     
     return expense_id
 
+def add_expenses_bulk(rows: List[Tuple[str, str, str, str, float]]) -> int:
+    """Insert many (date, category, subcategory, description, amount) rows in one transaction"""
+    with write_connection() as conn:
+        conn.executemany(
+            INSERT_EXPENSE_SQL,
+            [_expense_params(*row) for row in rows]
+        )
+    
+    return len(rows)
+
+_ingest_runs = itertools.count(1)
+
+@contextmanager
+def ingest_run() -> Iterator[str]:
+    """Count repeated rows across every ingest batch of one import.
+
+    Pass the yielded name as the run of each ingest_expenses() or
+    ingest_credits() call. Repeat counts are kept in a temporary table on
+    the writer connection, so memory use does not grow with the file.
+    """
+    name = f'ingest_run_{next(_ingest_runs)}'
+    with write_connection() as conn:
+        conn.execute(f'CREATE TEMP TABLE {name} (content_hash BLOB PRIMARY KEY, seen INTEGER NOT NULL) WITHOUT ROWID')
+    try:
+        yield name
+    finally:
+        with write_connection() as conn:
+            conn.execute(f'DROP TABLE IF EXISTS temp.{name}')
+
+def _ingest(cursor: sqlite3.Cursor, sql: str, make_params: Callable, rows: Iterable[Tuple],
+            run: Optional[str]) -> Tuple[int, List[int], List[int]]:
+    inserted, skipped, repeated = 0, [], []
+    seen: Dict[bytes, int] = {}
+    for position, row in enumerate(rows):
+        params = make_params(*row)
+        if run is None:
+            occurrence = seen[params[-1]] = seen.get(params[-1], -1) + 1
+        else:
+            occurrence = cursor.execute(
+                f'INSERT INTO temp.{run} VALUES (?, 0) '
+                'ON CONFLICT (content_hash) DO UPDATE SET seen = seen + 1 RETURNING seen',
+                (params[-1],)
+            ).fetchone()[0]
+        if occurrence:
+            params = make_params(*row, occurrence=occurrence)
+        if cursor.execute(sql, params).rowcount:
+            inserted += 1
+            if occurrence:
+                repeated.append(position)
+        else:
+            skipped.append(position)
+    return inserted, skipped, repeated
+
+def ingest_expenses(rows: Iterable[Tuple], run: Optional[str] = None) -> Tuple[int, List[int], List[int]]:
+    """Insert (date, category, subcategory, description, amount[, external_ref]) rows, skipping duplicates.
+
+    A row is a duplicate when an expense with the same content hash is
+    already stored; each check is one probe of the unique hash index. Rows
+    repeating an earlier row of the same import (these rows, or every batch
+    of an ingest_run()) are numbered into their hash, so they are kept.
+    Returns (rows inserted, positions of skipped duplicates, positions of
+    inserted repeats).
+    """
+    with write_connection() as conn:
+        return _ingest(conn.cursor(), INGEST_EXPENSE_SQL, _expense_params, rows, run)
+
 def delete_expense(expense_id: int) -> bool:
     """Delete an expense by ID"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('DELETE FROM expenses WHERE id = ?', (expense_id,))
-    deleted = cursor.rowcount > 0
-    
-    conn.commit()
-    conn.close()
+    with write_connection() as conn:
+        cursor = conn.execute('DELETE FROM expenses WHERE id = ?', (expense_id,))
+        deleted = cursor.rowcount > 0
     
     return deleted
 
 def delete_expense_by_details(date: str, category: str, subcategory: str, description: str, amount: float) -> bool:
     """Delete an expense by matching details (for backward compatibility)"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with write_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Find matching expense; an exact paise match is answered from idx_expenses_details
+        cursor.execute(
+            '''SELECT id FROM expenses 
+               WHERE date = ? AND category = ? AND subcategory = ? AND description = ? AND amount = ?
+               LIMIT 1''',
+            (date, category, subcategory, description, to_paise(amount))
+        )
+        
+        row = cursor.fetchone()
+        if row:
+            cursor.execute('DELETE FROM expenses WHERE id = ?', (row['id'],))
+            deleted = True
+        else:
+            deleted = False
     
-    # Find matching expense
-    cursor.execute(
-        '''SELECT id FROM expenses 
-           WHERE date = ? AND category = ? AND subcategory = ? AND description = ? AND ABS(amount - ?) < 0.01
-           LIMIT 1''',
-        (date, category, subcategory, description, amount)
-    )
+    return deleted
+
+def delete_expenses(expense_ids: Iterable[int]) -> int:
+    """Delete many expenses by ID in a single transaction"""
+    ids = list(expense_ids)
+    deleted = 0
+    with write_connection() as conn:
+        for start in range(0, len(ids), DELETE_CHUNK_SIZE):
+            chunk = ids[start:start + DELETE_CHUNK_SIZE]
+            placeholders = ', '.join('?' * len(chunk))
+            cursor = conn.execute(f'DELETE FROM expenses WHERE id IN ({placeholders})', chunk)
+            deleted += cursor.rowcount
     
-    row = cursor.fetchone()
-    if row:
-        cursor.execute('DELETE FROM expenses WHERE id = ?', (row['id'],))
-        deleted = True
-    else:
-        deleted = False
+    return deleted
+
+def delete_expenses_in_range(start_date: str, end_date: str, category: Optional[str] = None,
+                             subcategory: Optional[str] = None) -> int:
+    """Delete expenses dated start_date..end_date (inclusive), optionally only one (sub)category"""
+    clauses = ['date >= ?', 'date <= ?']
+    params = [start_date, end_date]
+    if category:
+        clauses.append('category = ?')
+        params.append(category)
+    if subcategory:
+        clauses.append('subcategory = ?')
+        params.append(subcategory)
     
-    conn.commit()
-    conn.close()
+    with write_connection() as conn:
+        cursor = conn.execute(f"DELETE FROM expenses WHERE {' AND '.join(clauses)}", params)
+        deleted = cursor.rowcount
     
     return deleted
 
+def delete_expenses_by_subcategory(subcategory: str, start_date: str = '0000-01-01',
+                                   end_date: str = '9999-12-31') -> int:
+    """Delete every expense of a sub category, optionally within a date range"""
+    return delete_expenses_in_range(start_date, end_date, subcategory=subcategory)
+
 def clear_all_expenses() -> int:
-    """Delete all expenses"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('DELETE FROM expenses')
-    count = cursor.rowcount
-    
-    conn.commit()
-    conn.close()
+    """Delete all expenses, archived ones included"""
+    closed_through = get_closed_through()
+    _attach_writer_archive()
+    with write_connection() as conn:
+        cursor = conn.execute('DELETE FROM expenses')
+        count = cursor.rowcount
+        if closed_through is not None:
+            # Archived rows never pass through the rollup and balance triggers
+            count += conn.execute('DELETE FROM archive.expenses').rowcount
+            count += conn.execute(
+                "SELECT COALESCE(SUM(row_count), 0) FROM archive.blocks WHERE source = 'expenses'"
+            ).fetchone()[0]
+            conn.execute("DELETE FROM archive.blocks WHERE source = 'expenses'")
+            conn.execute(ARCHIVE_SEARCH_SQL)
+            conn.execute('DELETE FROM archive.expenses_fts')
+            conn.execute('DELETE FROM rollup_expense_daily')
+            conn.execute('DELETE FROM rollup_expense_monthly')
+            conn.execute('UPDATE balance_ledger_state SET stale_from = ? WHERE id = 1', (BALANCE_LEDGER_START,))
+            conn.execute('UPDATE archive_state SET version = version + 1 WHERE id = 1')
     
     return count
 
@@ -277,14 +1715,14 @@ def clear_all_expenses() -> int:
 # CREDIT OPERATIONS
 # ============================================================================
 
+@cached_read
 def get_all_credits() -> List[Dict]:
     """Get all credits from database"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT id, date, description, amount FROM credits ORDER BY date DESC')
-    rows = cursor.fetchall()
-    conn.close()
+    with read_connection() as conn:
+        source = _archive_source(conn, 'credits')
+        rows = conn.execute(
+            f'SELECT id, date, description, amount / 100.0 AS amount FROM {source} ORDER BY date DESC'
+        ).fetchall()
     
     credits = []
     for row in rows:
@@ -297,21 +1735,892 @@ def get_all_credits() -> List[Dict]:
     
     return credits
 
+def add_credit_async(date: str, description: str, amount: float) -> Future:
+    """Queue a new credit; the Future resolves to its id once committed"""
+    check_month_open(date)
+    write_queue = get_write_queue()
+    if write_queue is not None:
+        return write_queue.submit(INSERT_CREDIT_SQL, _credit_params(date, description, amount))
+    future = Future()
+    future.set_result(add_credit(date, description, amount))
+    return future
+
 def add_credit(date: str, description: str, amount: float) -> int:
     """Add a new credit to database"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    check_month_open(date)
+    write_queue = get_write_queue()
+    if write_queue is not None:
+        return write_queue.submit(INSERT_CREDIT_SQL, _credit_params(date, description, amount)).result()
+    with write_connection() as conn:
+        cursor = conn.execute(
+            INSERT_CREDIT_SQL,
+            _credit_params(date, description, amount)
+        )
+        credit_id = cursor.lastrowid
     
-    cursor.execute(
-        'INSERT INTO credits (date, description, amount) VALUES (?, ?, ?)',
-        (date, description, amount)
-    )
+    return credit_id
+
+def add_credits_bulk(rows: List[Tuple[str, str, float]]) -> int:
+    """Insert many (date, description, amount) rows in one transaction"""
+    with write_connection() as conn:
+        conn.executemany(
+            INSERT_CREDIT_SQL,
+            [_credit_params(*row) for row in rows]
+        )
+    
+    return len(rows)
+
+def ingest_credits(rows: Iterable[Tuple], run: Optional[str] = None) -> Tuple[int, List[int], List[int]]:
+    """Insert (date, description, amount[, external_ref]) rows, skipping duplicates (see ingest_expenses)"""
+    with write_connection() as conn:
+        return _ingest(conn.cursor(), INGEST_CREDIT_SQL, _credit_params, rows, run)
+
+# ============================================================================
+# DASHBOARD AGGREGATIONS
+# ============================================================================
+
+def _month_bounds(month: str) -> Tuple[str, str]:
+    """Return the [start, end) ISO date range for a 'YYYY-MM' month key"""
+    year, mon = (int(part) for part in month.split('-'))
+    if mon == 12:
+        year, mon = year + 1, 0
+    return f"{month}-01", f"{year:04d}-{mon + 1:02d}-01"
+
+@cached_read
+def get_expense_months() -> List[str]:
+    """Get distinct 'YYYY-MM' months that have expenses, newest first"""
+    with read_connection() as conn:
+        rows = conn.execute(
+            'SELECT DISTINCT month FROM rollup_expense_monthly ORDER BY month DESC'
+        ).fetchall()
     
-    credit_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    return [row['month'] for row in rows]
+
+@cached_read
+def get_month_summary(month: str) -> Dict:
+    """Get headline metrics for one month (totals, averages, top subcategory, credits)"""
+    start, end = _month_bounds(month)
+    with read_connection() as conn:
+        totals = conn.execute(
+            '''SELECT COALESCE(SUM(total), 0) AS total, COALESCE(SUM(count), 0) AS count
+               FROM rollup_expense_monthly WHERE month = ?''',
+            (month,)
+        ).fetchone()
+        days = conn.execute(
+            'SELECT COUNT(DISTINCT day) FROM rollup_expense_daily WHERE day >= ? AND day < ?',
+            (start, end)
+        ).fetchone()[0]
+        top = conn.execute(
+            '''SELECT subcategory, SUM(total) AS total FROM rollup_expense_monthly
+               WHERE month = ?
+               GROUP BY subcategory ORDER BY total DESC, subcategory LIMIT 1''',
+            (month,)
+        ).fetchone()
+        # Largest/smallest cannot be maintained incrementally under deletes
+        source = _archive_source(conn, 'expenses', start, month)
+        extremes = conn.execute(
+            f'''SELECT COALESCE(MAX(amount), 0) AS largest, COALESCE(MIN(amount), 0) AS smallest
+                FROM {source} WHERE month = ?''',
+            (month,)
+        ).fetchone()
+        credits = conn.execute(
+            'SELECT COALESCE(SUM(total), 0) FROM rollup_credit_monthly WHERE month = ?',
+            (month,)
+        ).fetchone()[0]
     
-    return credit_id
+    # Totals are summed as integer paise and converted once at the end
+    total = to_rupees(totals['total'])
+    return {
+        'month': month,
+        'total_expenses': total,
+        'num_transactions': totals['count'],
+        'avg_transaction': total / totals['count'] if totals['count'] else 0.0,
+        'largest_expense': to_rupees(extremes['largest']),
+        'smallest_expense': to_rupees(extremes['smallest']),
+        'avg_daily': total / days if days else 0.0,
+        'top_subcategory': top['subcategory'] if top else None,
+        'top_subcategory_amount': to_rupees(top['total']) if top else 0.0,
+        'total_credits': to_rupees(credits)
+    }
+
+@cached_read
+def get_daily_totals(month: str) -> List[Tuple[int, float]]:
+    """Get (day of month, total) pairs for one month"""
+    start, end = _month_bounds(month)
+    with read_connection() as conn:
+        rows = conn.execute(
+            '''SELECT CAST(substr(day, 9, 2) AS INTEGER) AS day_of_month, SUM(total) AS total
+               FROM rollup_expense_daily WHERE day >= ? AND day < ?
+               GROUP BY day ORDER BY day''',
+            (start, end)
+        ).fetchall()
+    
+    return [(row['day_of_month'], to_rupees(row['total'])) for row in rows]
+
+@cached_read
+def get_subcategory_totals(month: str) -> List[Tuple[str, float]]:
+    """Get (subcategory, total) pairs for one month, largest first"""
+    with read_connection() as conn:
+        rows = conn.execute(
+            '''SELECT subcategory, SUM(total) AS total
+               FROM rollup_expense_monthly WHERE month = ?
+               GROUP BY subcategory ORDER BY total DESC, subcategory''',
+            (month,)
+        ).fetchall()
+    
+    return [(row['subcategory'], to_rupees(row['total'])) for row in rows]
+
+@cached_read
+def get_category_stats(month: str) -> List[Dict]:
+    """Get total, count and average per account category for one month"""
+    with read_connection() as conn:
+        rows = conn.execute(
+            '''SELECT category, SUM(total) AS total, SUM(count) AS count
+               FROM rollup_expense_monthly WHERE month = ?
+               GROUP BY category ORDER BY category''',
+            (month,)
+        ).fetchall()
+    
+    return [
+        {'category': row['category'], 'total': to_rupees(row['total']), 'count': row['count'],
+         'average': to_rupees(row['total']) / row['count']}
+        for row in rows
+    ]
+
+@cached_read
+def get_monthly_totals() -> List[Tuple[str, float]]:
+    """Get (month, total expenses) pairs across the whole history, oldest first"""
+    with read_connection() as conn:
+        rows = conn.execute(
+            '''SELECT month, SUM(total) AS total
+               FROM rollup_expense_monthly GROUP BY month ORDER BY month'''
+        ).fetchall()
+    
+    return [(row['month'], to_rupees(row['total'])) for row in rows]
+
+@cached_read
+def get_month_fingerprints() -> Dict[str, str]:
+    """Get a fingerprint per month with activity that changes whenever its rows or opening balance do.
+
+    Rows are inserted and deleted but never edited, and AUTOINCREMENT ids
+    are never reused, so the row count, id sum, highest id and amount sum of
+    each table pin a month's rows down. The opening balance covers changes
+    to earlier months.
+    """
+    stats: Dict[str, Dict[str, Tuple]] = {}
+    with read_connection() as conn:
+        for table in ('expenses', 'credits'):
+            source = _archive_source(conn, table)
+            for row in conn.execute(
+                f'SELECT month, COUNT(*), SUM(id), MAX(id), SUM(amount) FROM {source} GROUP BY month'
+            ):
+                stats.setdefault(row[0], {})[table] = tuple(row[1:])
+    openings = {row['month']: row['opening_balance'] for row in get_balance_history()}
+    return {
+        month: hashlib.blake2b(
+            repr((tables.get('expenses'), tables.get('credits'), openings.get(month))).encode('utf-8'),
+            digest_size=8
+        ).hexdigest()
+        for month, tables in sorted(stats.items())
+    }
+
+# Aggregation levels of the expense trend, finest first
+TREND_RESOLUTIONS = ('day', 'week', 'month')
+
+@cached_read
+def get_expense_date_range() -> Tuple[Optional[str], Optional[str]]:
+    """Get the first and last dates that have expenses"""
+    with read_connection() as conn:
+        row = conn.execute('SELECT MIN(day), MAX(day) FROM rollup_expense_daily').fetchone()
+    
+    return row[0], row[1]
+
+@cached_read
+def get_expense_trend(start_date: str, end_date: str, resolution: str = 'day') -> List[Tuple[str, float]]:
+    """Get (period start date, total) pairs for start_date..end_date (inclusive), oldest first.
+
+    Weeks start on Monday. Monthly periods are the whole months overlapping
+    the range, read straight from the monthly rollup.
+    """
+    if resolution == 'day':
+        sql = '''SELECT day AS period, SUM(total) AS total FROM rollup_expense_daily
+                 WHERE day >= ? AND day <= ? GROUP BY day ORDER BY day'''
+        params = (start_date, end_date)
+    elif resolution == 'week':
+        sql = '''SELECT date(day, '-' || ((CAST(strftime('%w', day) AS INTEGER) + 6) % 7) || ' days') AS period,
+                        SUM(total) AS total
+                 FROM rollup_expense_daily WHERE day >= ? AND day <= ?
+                 GROUP BY period ORDER BY period'''
+        params = (start_date, end_date)
+    elif resolution == 'month':
+        sql = '''SELECT month || '-01' AS period, SUM(total) AS total FROM rollup_expense_monthly
+                 WHERE month >= ? AND month <= ? GROUP BY month ORDER BY month'''
+        params = (start_date[:7], end_date[:7])
+    else:
+        raise ValueError(f"Unknown trend resolution {resolution!r}, expected one of {TREND_RESOLUTIONS}")
+    
+    with read_connection() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    
+    return [(row['period'], to_rupees(row['total'])) for row in rows]
+
+@cached_read
+def get_month_expenses(month: str) -> List[Dict]:
+    """Get the expenses of one month, newest first"""
+    start, end = _month_bounds(month)
+    with read_connection() as conn:
+        source = _archive_source(conn, 'expenses', start, month)
+        rows = conn.execute(
+            f'''SELECT id, date, category, subcategory, description, amount / 100.0 AS amount FROM {source}
+                WHERE date >= ? AND date < ? ORDER BY date DESC, id DESC''',
+            (start, end)
+        ).fetchall()
+    
+    return [dict(row) for row in rows]
+
+# ============================================================================
+# EXPENSE DETAILS PAGINATION
+# ============================================================================
+
+# Columns the expense details table may be sorted by
+EXPENSE_SORT_COLUMNS = ('date', 'amount', 'category', 'subcategory', 'description')
+
+def _month_filter(month: str, category: Optional[str], subcategory: Optional[str]) -> Tuple[str, List]:
+    """Build the WHERE clause and parameters for a month plus optional filters"""
+    start, end = _month_bounds(month)
+    clauses = ['date >= ?', 'date < ?']
+    params = [start, end]
+    if category:
+        clauses.append('category = ?')
+        params.append(category)
+    if subcategory:
+        clauses.append('subcategory = ?')
+        params.append(subcategory)
+    return ' AND '.join(clauses), params
+
+@cached_read
+def get_expense_page(month: str, sort_by: str = 'date', descending: bool = True,
+                     after: Optional[Tuple] = None, page_size: int = 50,
+                     category: Optional[str] = None, subcategory: Optional[str] = None) -> List[Dict]:
+    """Get one page of a month's expenses using keyset pagination.
+
+    `after` is the (sort value, id) pair of the last row of the previous page;
+    pass the cursor returned by page_cursor() to fetch the next page.
+    """
+    if sort_by not in EXPENSE_SORT_COLUMNS:
+        raise ValueError(f"Cannot sort expenses by {sort_by!r}")
+    
+    where, params = _month_filter(month, category, subcategory)
+    direction = 'DESC' if descending else 'ASC'
+    if after is not None:
+        where += f" AND ({sort_by}, id) {'<' if descending else '>'} (?, ?)"
+        value, after_id = after
+        params.extend((to_paise(value) if sort_by == 'amount' else value, after_id))
+    
+    with read_connection() as conn:
+        source = _archive_source(conn, 'expenses', month, month)
+        rows = conn.execute(
+            f'''SELECT id, date, category, subcategory, description, amount / 100.0 AS amount FROM {source}
+                WHERE {where} ORDER BY {sort_by} {direction}, id {direction} LIMIT ?''',
+            params + [page_size]
+        ).fetchall()
+    
+    return [dict(row) for row in rows]
+
+def page_cursor(page: List[Dict], sort_by: str = 'date') -> Optional[Tuple]:
+    """Get the keyset cursor pointing after the last row of a page"""
+    if not page:
+        return None
+    return page[-1][sort_by], page[-1]['id']
+
+@cached_read
+def count_expenses(month: str, category: Optional[str] = None, subcategory: Optional[str] = None) -> int:
+    """Count a month's expenses matching the optional filters"""
+    clauses, params = ['month = ?'], [month]
+    if category:
+        clauses.append('category = ?')
+        params.append(category)
+    if subcategory:
+        clauses.append('subcategory = ?')
+        params.append(subcategory)
+    with read_connection() as conn:
+        source = _archive_source(conn, 'expenses', month, month)
+        return conn.execute(f"SELECT COUNT(*) FROM {source} WHERE {' AND '.join(clauses)}", params).fetchone()[0]
+
+# ============================================================================
+# EXPENSE QUERY API
+# ============================================================================
+
+# Columns query_expenses()/iter_expenses() can return
+EXPENSE_COLUMNS = ('id', 'date', 'category', 'subcategory', 'description', 'amount')
+
+def _expense_filter(start_date: Optional[str] = None, end_date: Optional[str] = None,
+                    category: Optional[str] = None, subcategory: Optional[str] = None,
+                    min_amount: Optional[float] = None, max_amount: Optional[float] = None) -> Tuple[List[str], List]:
+    """Build WHERE clauses for an inclusive date range, (sub)category and inclusive rupee amount range"""
+    min_amount = None if min_amount in (None, '') else to_paise(min_amount)
+    max_amount = None if max_amount in (None, '') else to_paise(max_amount)
+    clauses, params = [], []
+    for clause, value in (('date >= ?', start_date), ('date <= ?', end_date),
+                          ('category = ?', category), ('subcategory = ?', subcategory),
+                          ('amount >= ?', min_amount), ('amount <= ?', max_amount)):
+        if value is not None and value != '':
+            clauses.append(clause)
+            params.append(value)
+    return clauses, params
+
+def query_expenses(start_date: Optional[str] = None, end_date: Optional[str] = None,
+                   category: Optional[str] = None, subcategory: Optional[str] = None,
+                   min_amount: Optional[float] = None, max_amount: Optional[float] = None,
+                   columns: Iterable[str] = EXPENSE_COLUMNS, after: Optional[Tuple[str, int]] = None,
+                   limit: int = 100, descending: bool = False) -> Tuple[List[Tuple], Optional[Tuple[str, int]]]:
+    """Get one page of matching expenses as plain tuples of the requested columns.
+
+    Rows are ordered by (date, id) and paged with a keyset: pass the returned
+    cursor as `after` to get the next page. The cursor is None on the last page.
+    """
+    columns = tuple(columns)
+    unknown = [column for column in columns if column not in EXPENSE_COLUMNS]
+    if unknown or not columns:
+        raise ValueError(f"Cannot select expense columns {unknown or columns!r}, expected some of {EXPENSE_COLUMNS}")
+    
+    clauses, params = _expense_filter(start_date, end_date, category, subcategory, min_amount, max_amount)
+    direction = 'DESC' if descending else 'ASC'
+    if after is not None:
+        clauses.append(f"(date, id) {'<' if descending else '>'} (?, ?)")
+        params.extend(after)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    
+    with read_connection() as conn:
+        source = _archive_source(conn, 'expenses', start_date, end_date)
+        cursor = conn.cursor()
+        cursor.row_factory = None  # Plain tuples are cheaper than sqlite3.Row
+        # date and id ride along at the end to build the next cursor
+        rows = cursor.execute(
+            f"SELECT {_rupee_columns(columns)}, date, id FROM {source} {where} "
+            f"ORDER BY date {direction}, id {direction} LIMIT ?",
+            params + [limit + 1]
+        ).fetchall()
+    
+    next_after = rows[limit - 1][-2:] if len(rows) > limit else None
+    return [row[:-2] for row in rows[:limit]], next_after
+
+def iter_expenses(start_date: Optional[str] = None, end_date: Optional[str] = None,
+                  category: Optional[str] = None, subcategory: Optional[str] = None,
+                  min_amount: Optional[float] = None, max_amount: Optional[float] = None,
+                  columns: Iterable[str] = EXPENSE_COLUMNS, descending: bool = False,
+                  chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[Tuple]:
+    """Yield every matching expense as a tuple, reading chunk_size rows per keyset page.
+
+    No connection is held between chunks, so a slow consumer never pins a
+    read transaction and memory stays constant however many rows match.
+    """
+    columns = tuple(columns)
+    after = None
+    while True:
+        rows, after = query_expenses(start_date, end_date, category, subcategory, min_amount, max_amount,
+                                     columns, after, chunk_size, descending)
+        yield from rows
+        if after is None:
+            return
+
+# ============================================================================
+# FULL-TEXT SEARCH
+# ============================================================================
+
+# External-content FTS5 index over expense descriptions. Prefix indexes on
+# 2 and 3 characters keep short prefix queries ('mc*') off a full term scan.
+SEARCH_SCHEMA = [
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS expenses_fts USING fts5(
+        description,
+        content = 'expenses',
+        content_rowid = 'id',
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_expenses_fts_insert AFTER INSERT ON expenses BEGIN
+        INSERT INTO expenses_fts (rowid, description) VALUES (NEW.id, NEW.description);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_expenses_fts_delete AFTER DELETE ON expenses BEGIN
+        INSERT INTO expenses_fts (expenses_fts, rowid, description) VALUES ('delete', OLD.id, OLD.description);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_expenses_fts_update AFTER UPDATE OF description ON expenses BEGIN
+        INSERT INTO expenses_fts (expenses_fts, rowid, description) VALUES ('delete', OLD.id, OLD.description);
+        INSERT INTO expenses_fts (rowid, description) VALUES (NEW.id, NEW.description);
+    END''',
+]
+
+# Archived descriptions have their own index in the archive database (rowid
+# = expense id). It keeps its own copy of the text: compressed blocks cannot
+# back an external-content index.
+ARCHIVE_SEARCH_SQL = '''CREATE VIRTUAL TABLE IF NOT EXISTS archive.expenses_fts USING fts5(
+    description,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)'''
+
+# Most matches (newest first) ranked per search
+SEARCH_CANDIDATES = 2000
+
+def _index_archived_descriptions(conn: sqlite3.Connection):
+    """Rebuild archive.expenses_fts from the archived rows and compressed blocks"""
+    conn.execute(ARCHIVE_SEARCH_SQL)
+    conn.execute('DELETE FROM archive.expenses_fts')
+    conn.execute('INSERT INTO archive.expenses_fts (rowid, description) SELECT id, description FROM archive.expenses')
+    columns = ARCHIVE_COLUMNS['expenses']
+    id_at, description_at = columns.index('id'), columns.index('description')
+    for (data,) in conn.execute("SELECT data FROM archive.blocks WHERE source = 'expenses'").fetchall():
+        conn.executemany(
+            'INSERT INTO archive.expenses_fts (rowid, description) VALUES (?, ?)',
+            [(row[id_at], row[description_at]) for row in _unpack_block(data)]
+        )
+    conn.execute("INSERT INTO archive.expenses_fts (expenses_fts) VALUES ('optimize')")
+
+def rebuild_search_index():
+    """Re-index every expense description, archived ones included (repair command)"""
+    _attach_writer_archive()
+    with write_connection() as conn:
+        conn.execute("INSERT INTO expenses_fts (expenses_fts) VALUES ('rebuild')")
+        conn.execute("INSERT INTO expenses_fts (expenses_fts) VALUES ('optimize')")
+        if get_closed_through() is not None:
+            _index_archived_descriptions(conn)
+
+def _search_query(text: str) -> str:
+    """Turn free text into an FTS5 query matching every word as a prefix"""
+    words = ''.join(char if char.isalnum() else ' ' for char in text).split()
+    return ' '.join(f'"{word}"*' for word in words)
+
+@cached_read
+def search_expenses(query: str, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                    category: Optional[str] = None, subcategory: Optional[str] = None,
+                    min_amount: Optional[float] = None, max_amount: Optional[float] = None,
+                    limit: int = 50) -> List[Dict]:
+    """Find expenses whose description contains every word of query (as a prefix), best match first.
+
+    The newest SEARCH_CANDIDATES matches passing the filters are ranked by
+    BM25, so a word found in every other row still answers in milliseconds.
+    Ranges reaching a closed month also match archived descriptions.
+    """
+    match = _search_query(query)
+    if not match:
+        return []
+    
+    clauses, params = _expense_filter(start_date, end_date, category, subcategory, min_amount, max_amount)
+    filters = [f'e.{clause}' for clause in clauses]
+    with read_connection() as conn:
+        source = _archive_source(conn, 'expenses', start_date, end_date)
+        candidates = f'''SELECT e.id, e.date, e.category, e.subcategory, e.description, e.amount, f.rank AS rank
+                          FROM expenses_fts(?) AS f JOIN expenses AS e ON e.id = f.rowid
+                          {'WHERE ' + ' AND '.join(filters) if filters else ''}'''
+        candidate_params = [match] + params
+        if source != 'expenses':
+            # The range reaches closed months: match archived descriptions too
+            if not conn.execute("SELECT 1 FROM archive.sqlite_master WHERE name = 'expenses_fts'").fetchone():
+                # Archives made before they had a search index are indexed once
+                with write_connection() as writer:
+                    _index_archived_descriptions(writer)
+            candidates += f'''
+                          UNION ALL
+                          SELECT e.id, e.date, e.category, e.subcategory, e.description, e.amount, f.rank AS rank
+                          FROM archive.expenses_fts(?) AS f JOIN {source} AS e ON e.id = f.rowid
+                          WHERE {' AND '.join(['e.month <= ?'] + filters)}'''
+            candidate_params += [match, get_closed_through()] + params
+        rows = conn.execute(
+            f'''SELECT id, date, category, subcategory, description, amount / 100.0 AS amount FROM (
+                    {candidates}
+                    ORDER BY id DESC LIMIT ?
+                ) ORDER BY rank, date DESC, id DESC LIMIT ?''',
+            candidate_params + [SEARCH_CANDIDATES, limit]
+        ).fetchall()
+    
+    return [dict(row) for row in rows]
+
+# ============================================================================
+# ARCHIVE (HOT/COLD PARTITIONING)
+# ============================================================================
+
+# Closed months move out of the hot expenses/credits tables into
+# <database>.archive.db, attached to connections as schema 'archive'
+ARCHIVE_SUFFIX = '.archive.db'
+
+# zlib level of compressed archive blocks (one block per table and month)
+ARCHIVE_COMPRESSION_LEVEL = 9
+
+# Columns moved into the archive, in table order
+ARCHIVE_COLUMNS = {
+    'expenses': ('id', 'date', 'category', 'subcategory', 'description', 'amount', 'created_at',
+                 'month', 'day', 'external_ref', 'content_hash'),
+    'credits': ('id', 'date', 'description', 'amount', 'created_at', 'month', 'day', 'external_ref', 'content_hash'),
+}
+
+# Rollup rows are kept for archived months; key expression giving each row's month
+ROLLUP_MONTH_KEYS = {
+    'rollup_expense_daily': 'substr(day, 1, 7)',
+    'rollup_expense_monthly': 'month',
+    'rollup_credit_monthly': 'month',
+}
+
+# closed_through is the last archived month (NULL while nothing is archived);
+# version changes whenever archived rows do, so connections drop blocks
+# they unpacked earlier. Closed months are read-only.
+ARCHIVE_STATE_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS archive_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        closed_through TEXT,
+        version INTEGER NOT NULL DEFAULT 0
+    )''',
+    'INSERT OR IGNORE INTO archive_state (id) VALUES (1)',
+    *(
+        f'''CREATE TRIGGER IF NOT EXISTS trg_{table}_closed_month_{event}
+           BEFORE {event.upper()} {'OF date ' if event == 'update' else ''}ON {table}
+           WHEN substr(NEW.date, 1, 7) <= (SELECT closed_through FROM archive_state WHERE id = 1)
+           BEGIN
+               SELECT RAISE(ABORT, 'month is closed and archived');
+           END'''
+        for table in ('expenses', 'credits')
+        for event in ('insert', 'update')
+    ),
+]
+
+ARCHIVE_SCHEMA = [
+    EXPENSES_TABLE_SQL.format(table='archive.expenses'),
+    CREDITS_TABLE_SQL.format(table='archive.credits'),
+    'CREATE INDEX IF NOT EXISTS archive.idx_expenses_date ON expenses(date)',
+    'CREATE INDEX IF NOT EXISTS archive.idx_expenses_month ON expenses(month, category, subcategory)',
+    'CREATE INDEX IF NOT EXISTS archive.idx_credits_date ON credits(date)',
+    ARCHIVE_SEARCH_SQL,
+    '''CREATE TABLE IF NOT EXISTS archive.blocks (
+        source TEXT NOT NULL,
+        month TEXT NOT NULL,
+        row_count INTEGER NOT NULL,
+        data BLOB NOT NULL,
+        PRIMARY KEY (source, month)
+    ) WITHOUT ROWID''',
+]
+
+def archive_file(db_file: Optional[str] = None) -> str:
+    """Get the archive database file of a database file (default: the current one)"""
+    return os.path.splitext(db_file or get_db_file())[0] + ARCHIVE_SUFFIX
+
+def _archive_attached(conn: sqlite3.Connection) -> bool:
+    return conn.execute("SELECT 1 FROM pragma_database_list WHERE name = 'archive'").fetchone() is not None
+
+def _attach_archive(conn: sqlite3.Connection, db_file: str, read_only: bool):
+    path = archive_file(db_file)
+    if read_only:
+        path = f'file:{os.path.abspath(path)}?mode=ro'
+    conn.execute('ATTACH DATABASE ? AS archive', (path,))
+
+@cached_read
+def _get_archive_state() -> Tuple[Optional[str], int]:
+    with read_connection() as conn:
+        try:
+            row = conn.execute('SELECT closed_through, version FROM archive_state WHERE id = 1').fetchone()
+        except sqlite3.OperationalError:
+            # Rollups are rebuilt by migrations that run before archive_state exists
+            return None, 0
+    return (row[0], row[1]) if row else (None, 0)
+
+def get_closed_through() -> Optional[str]:
+    """Get the last closed (archived) month, or None if nothing is archived"""
+    return _get_archive_state()[0]
+
+def read_archive_state() -> Tuple[Optional[str], int]:
+    """Get (closed-through month, archive version) from the database itself, bypassing the read cache"""
+    return _get_archive_state.uncached()
+
+def is_month_closed(month: str) -> bool:
+    """Whether a month ('YYYY-MM', or any date in it) is closed and archived"""
+    closed_through = get_closed_through()
+    return closed_through is not None and month[:7] <= closed_through
+
+def check_month_open(date: str):
+    """Raise ValueError if date falls in a closed month, which no longer takes entries"""
+    if is_month_closed(date):
+        raise ValueError(f"{date[:7]} is closed and archived, entries can no longer be added to it")
+
+def _pack_block(rows: List[Tuple]) -> bytes:
+    """Compress one month of archived rows (content hashes as hex, JSON has no bytes)"""
+    rows = [row[:-1] + (row[-1].hex() if row[-1] is not None else None,) for row in rows]
+    return zlib.compress(json.dumps(rows, ensure_ascii=False).encode('utf-8'), ARCHIVE_COMPRESSION_LEVEL)
+
+def _unpack_block(data: bytes) -> List[Tuple]:
+    return [
+        tuple(row[:-1]) + (bytes.fromhex(row[-1]) if row[-1] is not None else None,)
+        for row in json.loads(zlib.decompress(data))
+    ]
+
+def _unpack_blocks(conn: sqlite3.Connection, table: str, version: int, start_month: str, end_month: str):
+    """Unpack the compressed blocks of start_month..end_month into this connection's temp table"""
+    if conn.execute(
+        'SELECT 1 FROM temp.unpacked_blocks WHERE source = ? AND version != ? LIMIT 1', (table, version)
+    ).fetchone():
+        conn.execute(f'DELETE FROM temp.{table}_unpacked')
+        conn.execute('DELETE FROM temp.unpacked_blocks WHERE source = ?', (table,))
+    blocks = conn.execute(
+        '''SELECT month, data FROM archive.blocks
+           WHERE source = ? AND month >= ? AND month <= ?
+             AND month <= (SELECT closed_through FROM main.archive_state WHERE id = 1)
+             AND month NOT IN (SELECT month FROM temp.unpacked_blocks WHERE source = ?)''',
+        (table, start_month, end_month, table)
+    ).fetchall()
+    columns = ARCHIVE_COLUMNS[table]
+    for month, data in blocks:
+        conn.executemany(
+            f"INSERT INTO temp.{table}_unpacked ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            _unpack_block(data)
+        )
+        conn.execute('INSERT INTO temp.unpacked_blocks (source, month, version) VALUES (?, ?, ?)', (table, month, version))
+
+def _archive_source(conn: sqlite3.Connection, table: str, start_date: Optional[str] = None,
+                    end_date: Optional[str] = None) -> str:
+    """Get the table or view a read of start_date..end_date should select from.
+
+    That is the hot table itself unless the range reaches a closed month.
+    Only then is the archive attached to conn and a temp {table}_all view
+    set up: hot rows, archived rows and the compressed blocks of the range,
+    unpacked once per connection.
+    """
+    closed_through, version = _get_archive_state()
+    if closed_through is None or (start_date and start_date[:7] > closed_through):
+        return table
+    
+    read_only = conn.execute('PRAGMA query_only').fetchone()[0]
+    if not _archive_attached(conn):
+        _attach_archive(conn, get_db_file(), read_only)
+    # Readers are opened read-only; query_only is lifted only to create temp objects
+    if read_only:
+        conn.execute('PRAGMA query_only = OFF')
+    try:
+        columns = ', '.join(ARCHIVE_COLUMNS[table])
+        conn.execute(f'CREATE TEMP TABLE IF NOT EXISTS {table}_unpacked AS SELECT {columns} FROM main.{table} WHERE 0')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS temp.idx_{table}_unpacked_date ON {table}_unpacked (date)')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS temp.idx_{table}_unpacked_id ON {table}_unpacked (id)')
+        conn.execute(
+            '''CREATE TEMP TABLE IF NOT EXISTS unpacked_blocks (
+                source TEXT NOT NULL, month TEXT NOT NULL, version INTEGER NOT NULL, PRIMARY KEY (source, month)
+            )'''
+        )
+        # Archived rows only show once closed_through covers them, so a copy
+        # left behind by an interrupted archive_months() is never read twice
+        conn.execute(
+            f'''CREATE TEMP VIEW IF NOT EXISTS {table}_all AS
+                SELECT {columns} FROM main.{table}
+                UNION ALL
+                SELECT {columns} FROM archive.{table}
+                WHERE month <= (SELECT closed_through FROM main.archive_state WHERE id = 1)
+                UNION ALL
+                SELECT {columns} FROM temp.{table}_unpacked'''
+        )
+        _unpack_blocks(conn, table, version, (start_date or BALANCE_LEDGER_START)[:7], (end_date or '9999-99')[:7])
+    finally:
+        if read_only:
+            conn.execute('PRAGMA query_only = ON')
+    return f'{table}_all'
+
+def _attach_writer_archive():
+    """Attach the archive to the writer ahead of a transaction that reads archived rows"""
+    if get_closed_through() is not None:
+        get_manager().attach_archive()
+
+def archive_months(through_month: str, compress: bool = False) -> Dict[str, int]:
+    """Close every month up to through_month and move its rows into the archive database.
+
+    Rows are copied in a transaction on the archive file, then deleted from
+    the hot tables in a transaction on the main file that also moves
+    closed_through, so a crash in between leaves an invisible copy that the
+    next run replaces. Rollup rows and balance snapshots of the closed
+    months are kept as they were. With compress=True each month is stored
+    as one zlib block instead of rows. Returns the rows moved per table.
+    """
+    datetime.strptime(through_month, '%Y-%m')  # Raises ValueError on anything but YYYY-MM
+    if through_month >= datetime.now().strftime('%Y-%m'):
+        raise ValueError("Only months before the current one can be closed")
+    closed_through, _ = _get_archive_state.uncached()
+    if closed_through is not None and through_month <= closed_through:
+        return {table: 0 for table in ARCHIVE_COLUMNS}
+    
+    flush_writes()
+    get_manager().attach_archive()
+    with write_connection() as conn:
+        for statement in ARCHIVE_SCHEMA:
+            conn.execute(statement)
+        # Archived descriptions stay searchable; ids left by an interrupted run are replaced
+        conn.execute(
+            'DELETE FROM archive.expenses_fts WHERE rowid IN (SELECT id FROM main.expenses WHERE month <= ?)',
+            (through_month,)
+        )
+        conn.execute(
+            'INSERT INTO archive.expenses_fts (rowid, description) '
+            'SELECT id, description FROM main.expenses WHERE month <= ?',
+            (through_month,)
+        )
+        for table, columns in ARCHIVE_COLUMNS.items():
+            column_list = ', '.join(columns)
+            if not compress:
+                conn.execute(
+                    f'INSERT OR REPLACE INTO archive.{table} ({column_list}) '
+                    f'SELECT {column_list} FROM main.{table} WHERE month <= ?',
+                    (through_month,)
+                )
+                continue
+            months = [row[0] for row in conn.execute(
+                f'SELECT DISTINCT month FROM main.{table} WHERE month <= ? ORDER BY month', (through_month,)
+            ).fetchall()]
+            for month in months:
+                rows = [tuple(row) for row in conn.execute(
+                    f'SELECT {column_list} FROM main.{table} WHERE month = ? ORDER BY date, id', (month,)
+                )]
+                conn.execute(
+                    'INSERT OR REPLACE INTO archive.blocks (source, month, row_count, data) VALUES (?, ?, ?, ?)',
+                    (table, month, len(rows), _pack_block(rows))
+                )
+    
+    moved = {}
+    with write_connection() as conn:
+        # Deleting fires the rollup and balance triggers; put back what the
+        # closed months had, since their totals have not changed
+        saved = {
+            rollup: conn.execute(f'SELECT * FROM {rollup} WHERE {key} <= ?', (through_month,)).fetchall()
+            for rollup, key in ROLLUP_MONTH_KEYS.items()
+        }
+        stale_from = conn.execute('SELECT stale_from FROM balance_ledger_state WHERE id = 1').fetchone()[0]
+        for table in ARCHIVE_COLUMNS:
+            moved[table] = conn.execute(f'DELETE FROM main.{table} WHERE month <= ?', (through_month,)).rowcount
+        for rollup, rows in saved.items():
+            if rows:
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO {rollup} VALUES ({', '.join('?' * len(rows[0]))})",
+                    [tuple(row) for row in rows]
+                )
+        conn.execute('UPDATE balance_ledger_state SET stale_from = ? WHERE id = 1', (stale_from,))
+        conn.execute(
+            'UPDATE archive_state SET closed_through = ?, version = version + 1 WHERE id = 1', (through_month,)
+        )
+    return moved
+
+def get_archive_stats() -> Dict:
+    """Get the closed-through month, hot and archived row counts and the size of both files"""
+    closed_through = get_closed_through()
+    path = archive_file()
+    stats = {
+        'closed_through': closed_through,
+        'db_bytes': os.path.getsize(get_db_file()),
+        'archive_file': path,
+        'archive_bytes': os.path.getsize(path) if os.path.exists(path) else 0,
+    }
+    with read_connection() as conn:
+        archived = closed_through is not None and os.path.exists(path)
+        if archived and not _archive_attached(conn):
+            _attach_archive(conn, get_db_file(), read_only=True)
+        for table in ARCHIVE_COLUMNS:
+            stats[f'hot_{table}'] = conn.execute(f'SELECT COUNT(*) FROM main.{table}').fetchone()[0]
+            stats[f'archived_{table}'] = 0
+            if archived:
+                stats[f'archived_{table}'] = conn.execute(f'SELECT COUNT(*) FROM archive.{table}').fetchone()[0]
+                blocks = conn.execute(
+                    'SELECT COUNT(*), COALESCE(SUM(row_count), 0), COALESCE(SUM(length(data)), 0) '
+                    'FROM archive.blocks WHERE source = ?', (table,)
+                ).fetchone()
+                stats[f'archived_{table}'] += blocks[1]
+                stats[f'{table}_blocks'] = blocks[0]
+                stats[f'{table}_block_bytes'] = blocks[2]
+    return stats
+
+# ============================================================================
+# EXPORT
+# ============================================================================
+
+EXPORT_COLUMNS = ('date', 'category', 'subcategory', 'description', 'amount')
+EXPORT_FORMATS = ('csv', 'ndjson', 'parquet')
+
+def iter_expenses_for_export(start_date: Optional[str] = None, end_date: Optional[str] = None,
+                             category: Optional[str] = None, subcategory: Optional[str] = None,
+                             chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[List[Tuple]]:
+    """Yield chunks of export rows (oldest first) for an inclusive date range and optional filters"""
+    clauses, params = _expense_filter(start_date, end_date, category, subcategory)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    
+    with read_connection() as conn:
+        source = _archive_source(conn, 'expenses', start_date, end_date)
+        cursor = conn.execute(
+            f"SELECT {_rupee_columns(EXPORT_COLUMNS)} FROM {source} {where} ORDER BY date, id",
+            params
+        )
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield [tuple(row) for row in rows]
+
+def _write_csv(out: BinaryIO, chunks: Iterator[List[Tuple]]) -> int:
+    text = io.TextIOWrapper(out, encoding='utf-8', newline='')
+    writer = csv.writer(text)
+    writer.writerow(EXPORT_COLUMNS)
+    count = 0
+    for rows in chunks:
+        writer.writerows(rows)
+        count += len(rows)
+    text.flush()
+    text.detach()
+    return count
+
+def _write_ndjson(out: BinaryIO, chunks: Iterator[List[Tuple]]) -> int:
+    count = 0
+    for rows in chunks:
+        out.write(''.join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + '\n' for row in rows
+        ).encode('utf-8'))
+        count += len(rows)
+    return count
+
+def _write_parquet(out: BinaryIO, chunks: Iterator[List[Tuple]]) -> int:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Parquet export needs pyarrow (pip install pyarrow)")
+    
+    schema = pa.schema([
+        ('date', pa.string()),
+        ('category', pa.dictionary(pa.int8(), pa.string())),
+        ('subcategory', pa.dictionary(pa.int8(), pa.string())),
+        ('description', pa.string()),
+        ('amount', pa.float64()),
+    ])
+    count = 0
+    with pq.ParquetWriter(out, schema, compression='zstd') as writer:
+        for rows in chunks:
+            columns = list(zip(*rows))
+            writer.write_table(pa.table(
+                [pa.array(values).cast(field.type) for values, field in zip(columns, schema)],
+                schema=schema
+            ))
+            count += len(rows)
+    return count
+
+EXPORT_WRITERS = {
+    'csv': _write_csv,
+    'ndjson': _write_ndjson,
+    'parquet': _write_parquet,
+}
+
+def export_expenses(out: BinaryIO, fmt: str = 'csv', **filters) -> int:
+    """Stream matching expenses into a binary file object, returning the row count.
+
+    Filters are those of iter_expenses_for_export (start_date, end_date,
+    category, subcategory). Rows are read with fetchmany() so memory use is
+    bounded by the chunk size, not the size of the ledger.
+    """
+    if fmt not in EXPORT_WRITERS:
+        raise ValueError(f"Unknown export format {fmt!r}, expected one of {', '.join(EXPORT_FORMATS)}")
+    return EXPORT_WRITERS[fmt](out, iter_expenses_for_export(**filters))
+
+def export_expenses_to_file(path: str, fmt: Optional[str] = None, **filters) -> int:
+    """Export matching expenses to a file, taking the format from its extension by default"""
+    fmt = fmt or os.path.splitext(path)[1].lstrip('.').lower().replace('jsonl', 'ndjson')
+    with open(path, 'wb') as out:
+        return export_expenses(out, fmt, **filters)
 
 # ============================================================================
 # UTILITY FUNCTIONS
@@ -329,7 +2638,72 @@ def backup_json_files():
 
 # Initialize database on module import
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Initialize and maintain the expense tracker database")
+    parser.add_argument('--db', default=DB_FILE, help="database file (e.g. a tenant shard)")
+    parser.add_argument('--rebuild-rollups', action='store_true', help="recompute the rollup tables from scratch")
+    parser.add_argument('--verify-rollups', action='store_true',
+                        help="check the rollup tables and balance snapshots against the base tables")
+    parser.add_argument('--check-query-plans', action='store_true', help="assert hot queries use their indexes")
+    parser.add_argument('--rebuild-search', action='store_true', help="re-index expense descriptions for search")
+    parser.add_argument('--archive-through', metavar='YYYY-MM',
+                        help="close every month up to this one and move its rows into the archive database")
+    parser.add_argument('--compress', action='store_true', help="store newly archived months as compressed blocks")
+    parser.add_argument('--archive-stats', action='store_true', help="show hot and archived row counts")
+    parser.add_argument('--export', metavar='PATH', help="export expenses to a .csv, .ndjson or .parquet file")
+    parser.add_argument('--format', choices=EXPORT_FORMATS, help="export format (default: from the file extension)")
+    parser.add_argument('--from', dest='start_date', help="first date to export (YYYY-MM-DD)")
+    parser.add_argument('--to', dest='end_date', help="last date to export (YYYY-MM-DD)")
+    parser.add_argument('--category', help="only export this account category")
+    parser.add_argument('--subcategory', help="only export this sub category")
+    args = parser.parse_args()
+    DB_FILE = args.db
+    
     print("Initializing database...")
     backup_json_files()
     init_database()
     print("✅ Database initialized successfully!")
+    
+    if args.rebuild_rollups:
+        rebuild_rollups()
+        print("✅ Rollup tables and balance snapshots rebuilt")
+    if args.rebuild_search:
+        rebuild_search_index()
+        print("✅ Search index rebuilt")
+    if args.verify_rollups:
+        problems = verify_rollups()
+        for problem in problems:
+            print(f"⚠️ {problem}")
+        print("✅ Rollup tables match the base tables" if not problems else f"❌ {len(problems)} rollup rows differ")
+        problems = verify_balances()
+        for problem in problems:
+            print(f"⚠️ {problem}")
+        print("✅ Balance snapshots match the base tables" if not problems else f"❌ {len(problems)} balance months differ")
+    if args.check_query_plans:
+        failures = check_query_plans()
+        for failure in failures:
+            print(f"❌ {failure}")
+        if failures:
+            raise SystemExit(1)
+        print(f"✅ All {len(QUERY_PLAN_EXPECTATIONS)} hot queries use their expected indexes")
+    if args.archive_through:
+        moved = archive_months(args.archive_through, compress=args.compress)
+        print(f"✅ Closed months through {args.archive_through}, archived {moved['expenses']:,} expenses "
+              f"and {moved['credits']:,} credits into {archive_file()}")
+    if args.archive_stats:
+        stats = get_archive_stats()
+        print(f"📦 Closed through: {stats['closed_through'] or 'nothing archived'}")
+        for table in ARCHIVE_COLUMNS:
+            blocks = stats.get(f'{table}_blocks')
+            print(f"   {table}: {stats[f'hot_{table}']:,} hot, {stats[f'archived_{table}']:,} archived"
+                  + (f" ({blocks:,} compressed blocks)" if blocks else ''))
+        print(f"   {get_db_file()}: {stats['db_bytes'] / 1e6:,.1f} MB, "
+              f"{stats['archive_file']}: {stats['archive_bytes'] / 1e6:,.1f} MB")
+    if args.export:
+        count = export_expenses_to_file(
+            args.export, args.format,
+            start_date=args.start_date, end_date=args.end_date,
+            category=args.category, subcategory=args.subcategory
+        )
+        print(f"✅ Exported {count:,} expenses to {args.export}")
@@ -1,10 +1,14 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
+import calendar
 from datetime import date
+from functools import partial
+import io
 import json
-import os
+import time
 import database
+import importer
+import instrumentation
+import tenants
 
 # Set the page title and configuration
 st.set_page_config(
@@ -13,9 +17,6 @@ st.set_page_config(
     layout='wide'
 )
 
-# Initialize database on startup
-database.init_database()
-
 # Initialize authentication in session state
 if 'authenticated' not in st.session_state:
     st.session_state.authenticated = False
@@ -24,10 +25,13 @@ if 'userid' not in st.session_state:
 if 'show_change_password' not in st.session_state:
     st.session_state.show_change_password = False
 
+# Point this session at its tenant's database (DB_FILE without tenants) and initialize it
+tenants.activate(st.session_state.userid if st.session_state.authenticated else None)
+
 def check_credentials(userid, password):
-    """Check if credentials are valid"""
-    stored_userid, stored_password = database.get_credentials()
-    return userid == stored_userid and password == stored_password
+    """Check if credentials are valid (against the user's own tenant database)"""
+    tenants.activate(userid)
+    return database.verify_credentials(userid, password)
 
 def login_page():
     """Display login page"""
@@ -125,7 +129,8 @@ def login_page():
     with st.expander("🔑 Change Password"):
         with st.form("change_password_form"):
             st.markdown("### 🔄 Update Your Credentials")
-            stored_userid, stored_password = database.get_credentials()
+            # With tenants, the default database's user id is not everyone's
+            stored_userid = "" if tenants.enabled() else database.get_credentials()[0]
 
             change_userid = st.text_input("👤 User ID", value=stored_userid, key="change_userid")
             old_password = st.text_input("🔒 Current Password", type="password", placeholder="Enter current password", key="old_password")
@@ -151,6 +156,37 @@ def login_page():
                     st.session_state.show_change_password = False
 
 
+def load_category_stats(month):
+    """Build the category breakdown DataFrame for a month (cached until the next write)"""
+    import charts
+    return database.cached(('category_stats', month), lambda: charts.category_stats_frame(month))
+
+
+def update_selection(table_key, page_rows):
+    """Apply a table selection change to the cross-page selection (id -> row)"""
+    selected = st.session_state.selected_expenses
+    for row in page_rows:
+        selected.pop(row['id'], None)
+    for position in st.session_state[table_key].selection.rows:
+        selected[page_rows[position]['id']] = page_rows[position]
+
+
+# Trend chart resolution -> label
+TREND_LABELS = {
+    'day': 'Daily',
+    'week': 'Weekly',
+    'month': 'Monthly',
+}
+
+
+# Download MIME type per export format
+EXPORT_MIME_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
 # Check authentication
 if not st.session_state.authenticated:
     login_page()
@@ -210,60 +246,24 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
-# Initialize session state for expenses and credits
-if 'expenses' not in st.session_state:
-    st.session_state.expenses = []
-
-if 'credits' not in st.session_state:
-    st.session_state.credits = []
-
-# Load expenses and credits from database on startup
-if not st.session_state.expenses:
-    st.session_state.expenses = database.get_all_expenses()
-
-if not st.session_state.credits:
-    st.session_state.credits = database.get_all_credits()
-
 # Title
 st.title("💰 CGT Monthly Expense Tracker")
 st.markdown("Track and visualize your monthly expenses")
 
 # Category definitions
-CATEGORY_OPTIONS = {
-    "🏗️ Maintenance Expenses": [
-        "MAINT-CIV",
-        "MAINT-ELE",
-        "MAINT-STP",
-        "MAINT-GEN",
-        "MAINT-HK",
-        "MAINT-CLB",
-    ],
-    "👨‍🌾 Staff Payments": [
-        "SAL-INT",
-        "SAL-EXT",
-        "SAL-BONUS",
-        "SAL-CONV",
-    ],
-    "🛒 Purchases": [
-        "PUR-MTRL",
-        "PUR-ELEC",
-        "PUR-GARD",
-        "PUR-OFF",
-        "PUR-HK",
-        "PUR-WATER",
-        "PUR-PRINT",
-    ],
-    "💳 Cash Flow / Credit Transactions": [
-        "CASH-WD",
-        "CASH-CR",
-        "CREDIT",
-    ],
-}
+CATEGORY_OPTIONS = database.CATEGORY_OPTIONS
+
+# Per-section render timings (a no-op unless instrumentation is enabled)
+page_timer = instrumentation.section_timer()
+page_timer.mark('sidebar')
 
 # Sidebar for adding expenses
 with st.sidebar:
     # User info and logout
     st.markdown(f"**Logged in as:** {st.session_state.userid}")
+    current_tenant = tenants.get_tenant(st.session_state.userid)
+    if current_tenant:
+        st.caption(f"🏢 {current_tenant['name']}")
     if st.button("🚪 Logout", type="secondary", use_container_width=True):
         st.session_state.authenticated = False
         st.session_state.userid = None
@@ -287,25 +287,19 @@ with st.sidebar:
     if st.button("Add Expense", type="primary"):
         if expense_amount > 0 and expense_description:
             # Add to database
-            expense_id = database.add_expense(
-                expense_date.isoformat(),
-                expense_category,
-                expense_subcategory,
-                expense_description,
-                float(expense_amount)
-            )
-            # Add to session state
-            new_expense = {
-                "id": expense_id,
-                "date": expense_date.isoformat(),
-                "category": expense_category,
-                "subcategory": expense_subcategory,
-                "description": expense_description,
-                "amount": float(expense_amount)
-            }
-            st.session_state.expenses.append(new_expense)
-            st.success(f"Added ₹{expense_amount:.2f} for {expense_description}!")
-            st.rerun()
+            try:
+                database.add_expense(
+                    expense_date.isoformat(),
+                    expense_category,
+                    expense_subcategory,
+                    expense_description,
+                    float(expense_amount)
+                )
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                st.success(f"Added ₹{expense_amount:.2f} for {expense_description}!")
+                st.rerun()
         else:
             st.error("Please enter a valid amount and description")
     
@@ -320,73 +314,78 @@ with st.sidebar:
     if st.button("Add Credit", type="primary", key="add_credit"):
         if credit_amount > 0 and credit_description:
             # Add to database
-            credit_id = database.add_credit(
-                credit_date.isoformat(),
-                credit_description,
-                float(credit_amount)
-            )
-            # Add to session state
-            new_credit = {
-                "id": credit_id,
-                "date": credit_date.isoformat(),
-                "description": credit_description,
-                "amount": float(credit_amount)
-            }
-            st.session_state.credits.append(new_credit)
-            st.success(f"Added credit ₹{credit_amount:.2f} for {credit_description}!")
-            st.rerun()
+            try:
+                database.add_credit(
+                    credit_date.isoformat(),
+                    credit_description,
+                    float(credit_amount)
+                )
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                st.success(f"Added credit ₹{credit_amount:.2f} for {credit_description}!")
+                st.rerun()
         else:
             st.error("Please enter a valid amount and description")
     
     st.markdown("---")
     
+    # Bulk import from bank exports
+    with st.expander("📥 Bulk Import"):
+        import_table = st.selectbox("Import Into", ["expenses", "credits"], key="import_table")
+        import_upload = st.file_uploader("CSV, JSON or NDJSON file", type=["csv", "json", "ndjson", "jsonl"], key="import_file")
+        if st.button("Import File", disabled=import_upload is None, key="import_button"):
+            progress_text = st.empty()
+            def show_progress(stats):
+                progress_text.write(f"{stats.inserted:,} rows imported ({stats.rows_per_second:,.0f} rows/s)")
+            try:
+                stats = importer.import_upload(import_upload, import_upload.name, import_table, progress=show_progress)
+            except ValueError as e:
+                st.error(f"Import failed: {e}")
+            else:
+                st.success(f"Imported {stats.inserted:,} of {stats.rows_read:,} rows in {stats.elapsed:.2f}s")
+                if stats.duplicates:
+                    st.info(f"{stats.duplicates:,} rows were already in the database and skipped "
+                            f"(rows {', '.join(str(line) for line in stats.duplicate_rows)}"
+                            f"{', ...' if stats.duplicates > len(stats.duplicate_rows) else ''})")
+                if stats.repeats:
+                    st.info(f"{stats.repeats:,} rows repeat an earlier row of the file and were kept as separate entries "
+                            f"(rows {', '.join(str(line) for line in stats.repeat_rows)}"
+                            f"{', ...' if stats.repeats > len(stats.repeat_rows) else ''})")
+                if stats.rejected:
+                    st.warning(f"{stats.rejected:,} rows rejected:\n\n" + "\n\n".join(stats.errors))
+    
+    st.markdown("---")
+    
     # Clear all expenses button
     if st.button("🗑️ Clear All Expenses", type="secondary"):
-        if st.session_state.expenses:
-            database.clear_all_expenses()
-            st.session_state.expenses = []
+        if database.clear_all_expenses():
             st.success("All expenses cleared!")
             st.rerun()
 
 # Main content area
-if st.session_state.expenses:
-    # Convert to DataFrame
-    df = pd.DataFrame(st.session_state.expenses)
-    df['date'] = pd.to_datetime(df['date'])
-    if 'category' not in df.columns:
-        df['category'] = "Uncategorized"
-    if 'subcategory' not in df.columns:
-        df['subcategory'] = df['category']
-    df['month'] = df['date'].dt.to_period('M')
-    df['month_str'] = df['month'].astype(str)
+page_timer.mark('metrics')
+months = database.get_expense_months()
+if months:
+    # Charting and DataFrame libraries load on the first dashboard render only,
+    # so the login page and sidebar forms never pay for importing them
+    import pandas as pd
+    import plotly.express as px
+    import charts
+    import trends
     
     # Month selector
-    months = sorted(df['month_str'].unique(), reverse=True)
     selected_month = st.selectbox("Select Month", months, index=0)
     
-    # Filter data for selected month
-    month_df = df[df['month_str'] == selected_month].copy()
-    
-    # Process credits data
-    if st.session_state.credits:
-        credits_df = pd.DataFrame(st.session_state.credits)
-        credits_df['date'] = pd.to_datetime(credits_df['date'])
-        credits_df['month'] = credits_df['date'].dt.to_period('M')
-        credits_df['month_str'] = credits_df['month'].astype(str)
-        month_credits_df = credits_df[credits_df['month_str'] == selected_month].copy()
-        total_credits = month_credits_df['amount'].sum()
-    else:
-        total_credits = 0.0
-    
-    # Calculate metrics
-    total_expenses = month_df['amount'].sum()
-    avg_daily = month_df.groupby(month_df['date'].dt.day)['amount'].sum().mean()
-    num_transactions = len(month_df)
-    top_subcategory = month_df.groupby('subcategory')['amount'].sum().idxmax()
-    top_subcategory_amount = month_df.groupby('subcategory')['amount'].sum().max()
-    
-    # Calculate balance
-    balance = total_credits - total_expenses
+    # Aggregates for the selected month are computed in SQL
+    summary = database.get_month_summary(selected_month)
+    total_expenses = summary['total_expenses']
+    total_credits = summary['total_credits']
+    avg_daily = summary['avg_daily']
+    num_transactions = summary['num_transactions']
+    top_subcategory = summary['top_subcategory']
+    top_subcategory_amount = summary['top_subcategory_amount']
+    subcategory_totals = database.get_subcategory_totals(selected_month)
     
     # Display metrics
     col1, col2, col3, col4 = st.columns(4)
@@ -399,159 +398,308 @@ if st.session_state.expenses:
     with col4:
         st.metric("Top Sub Category", f"{top_subcategory}\n₹{top_subcategory_amount:.2f}")
     
-    # Display balance after expenses
+    # Display balances carried forward from the month snapshots
+    page_timer.mark('balance')
     st.markdown("---")
     st.subheader("💰 Balance Summary")
-    col1, col2, col3 = st.columns([1, 1, 1])
+    month_balance = database.get_month_balance(selected_month)
+    col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Total Credits", f"₹{total_credits:,.2f}")
+        st.metric("Opening Balance", f"₹{month_balance['opening_balance']:,.2f}")
     with col2:
-        st.metric("Total Expenses", f"₹{total_expenses:,.2f}")
+        st.metric("Total Credits", f"₹{total_credits:,.2f}")
     with col3:
-        # Display balance
-        st.metric("Balance", f"₹{balance:,.2f}")
+        st.metric("Total Expenses", f"₹{total_expenses:,.2f}")
+    with col4:
+        st.metric("Closing Balance", f"₹{month_balance['closing_balance']:,.2f}",
+                  delta=f"₹{total_credits - total_expenses:,.2f}")
+    
+    balance_history = database.get_balance_history()
+    if len(balance_history) > 1:
+        with st.expander("📈 Cash Position Over Time"):
+            fig_balance = charts.balance_line(balance_history)
+            st.plotly_chart(fig_balance, use_container_width=True)
     
     st.markdown("---")
     
     # Charts
+    page_timer.mark('charts')
     col1, col2 = st.columns(2)
     
     with col1:
         st.subheader("Expenses by Category")
-        category_sum = month_df.groupby('subcategory')['amount'].sum().sort_values(ascending=False)
-        fig_pie = px.pie(
-            values=category_sum.values,
-            names=category_sum.index,
-            title=f"Expense Distribution - {selected_month}",
-            color_discrete_sequence=px.colors.qualitative.Set3
-        )
-        fig_pie.update_traces(textposition='inside', textinfo='percent+label')
+        fig_pie = charts.subcategory_pie(subcategory_totals, selected_month)
         st.plotly_chart(fig_pie, use_container_width=True)
     
     with col2:
         st.subheader("Daily Expenses Trend")
-        daily_expenses = month_df.groupby(month_df['date'].dt.day)['amount'].sum()
-        fig_line = px.line(
-            x=daily_expenses.index,
-            y=daily_expenses.values,
-            title=f"Daily Spending - {selected_month}",
-            labels={'x': 'Day of Month', 'y': 'Amount (₹)'},
-            markers=True
-        )
-        fig_line.update_layout(
-            xaxis_title="Day of Month",
-            yaxis_title="Amount (₹)"
-        )
+        daily_expenses = database.get_daily_totals(selected_month)
+        fig_line = charts.daily_line(daily_expenses, selected_month)
         st.plotly_chart(fig_line, use_container_width=True)
     
     # Category breakdown bar chart
     st.subheader("Category Breakdown")
-    category_sum = month_df.groupby('subcategory')['amount'].sum().sort_values(ascending=True)
-    fig_bar = px.bar(
-        x=category_sum.values,
-        y=category_sum.index,
-        orientation='h',
-        title=f"Expenses by Category - {selected_month}",
-        labels={'x': 'Amount (₹)', 'y': 'Category'},
-        color=category_sum.values,
-        color_continuous_scale='Blues'
-    )
+    fig_bar = charts.category_bar(subcategory_totals, selected_month)
     st.plotly_chart(fig_bar, use_container_width=True)
     
     # Monthly comparison (if multiple months available)
     if len(months) > 1:
         st.subheader("Monthly Comparison")
-        monthly_totals = df.groupby('month_str')['amount'].sum().sort_index()
-        fig_comparison = px.bar(
-            x=monthly_totals.index,
-            y=monthly_totals.values,
-            title="Total Expenses by Month",
-            labels={'x': 'Month', 'y': 'Total Amount (₹)'},
-            color=monthly_totals.values,
-            color_continuous_scale='Viridis'
-        )
+        monthly_totals = database.get_monthly_totals()
+        fig_comparison = charts.monthly_comparison(monthly_totals)
         st.plotly_chart(fig_comparison, use_container_width=True)
     
+    # Full-history trend; only the chosen window is read and at most
+    # trends.MAX_TREND_POINTS points are sent to the browser
+    page_timer.mark('trend')
+    first_day, last_day = database.get_expense_date_range()
+    first_day, last_day = date.fromisoformat(first_day), date.fromisoformat(last_day)
+    if first_day < last_day:
+        st.subheader("Expense Trend")
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            trend_window = st.slider("Date Range", min_value=first_day, max_value=last_day,
+                                     value=(first_day, last_day), key="trend_window")
+        with col2:
+            trend_choice = st.selectbox("Resolution", ["Auto"] + list(TREND_LABELS.values()), key="trend_resolution")
+        trend_resolution = {label: key for key, label in TREND_LABELS.items()}.get(trend_choice)
+        resolution, period_count, periods, totals = trends.get_trend(*trend_window, resolution=trend_resolution)
+        fig_trend = px.line(
+            x=periods,
+            y=totals,
+            title=f"{TREND_LABELS[resolution]} Expenses",
+            labels={'x': 'Date', 'y': 'Amount (₹)'}
+        )
+        st.plotly_chart(fig_trend, use_container_width=True)
+        st.caption(f"Showing {len(periods):,} of {period_count:,} {TREND_LABELS[resolution].lower()} totals")
+    
+    st.markdown("---")
+    
+    # Description search across all months, served by the FTS5 index
+    page_timer.mark('search')
+    st.subheader("🔍 Search Expenses")
+    search_text = st.text_input("Search descriptions", placeholder="e.g. MCB, salary, diesel gen", key="search_text")
+    if search_text.strip():
+        search_started = time.perf_counter()
+        search_results = database.search_expenses(search_text, limit=100)
+        search_ms = (time.perf_counter() - search_started) * 1000
+        if search_results:
+            st.dataframe(
+                pd.DataFrame(search_results, columns=['id', 'date', 'category', 'subcategory', 'description', 'amount']),
+                column_order=['date', 'category', 'subcategory', 'description', 'amount'],
+                column_config={
+                    'date': st.column_config.TextColumn("Date"),
+                    'category': st.column_config.TextColumn("Category"),
+                    'subcategory': st.column_config.TextColumn("Sub Category"),
+                    'description': st.column_config.TextColumn("Description"),
+                    'amount': st.column_config.NumberColumn("Amount (₹)", format="₹%.2f")
+                },
+                hide_index=True,
+                use_container_width=True
+            )
+        st.caption(f"{len(search_results):,} best matches in {search_ms:.1f} ms")
+    
     st.markdown("---")
     
     # Expense table
     st.subheader(f"Expense Details - {selected_month}")
     
-    # Sort by date descending
-    month_df_sorted = month_df.sort_values('date', ascending=False).reset_index(drop=True)
-
-    # Download CSV for current month
-    export_cols = ['date', 'category', 'subcategory', 'description', 'amount']
-    export_df = month_df_sorted.copy()
-    export_df['date'] = export_df['date'].dt.strftime('%Y-%m-%d')
-    csv_bytes = export_df[export_cols].to_csv(index=False).encode('utf-8')
-    st.download_button(
-        "⬇️ Export CSV",
-        data=csv_bytes,
-        file_name=f"expenses_{selected_month}.csv",
-        mime="text/csv"
-    )
-    
-    # Create a table with delete buttons
-    for display_idx, (df_idx, row) in enumerate(month_df_sorted.iterrows()):
-        col1, col2, col3, col4, col5, col6 = st.columns([2, 2.5, 2.5, 3, 2, 1])
+    # Export any date range; the file is only generated when requested
+    page_timer.mark('export')
+    with st.expander("⬇️ Export"):
+        export_start = date.fromisoformat(f"{selected_month}-01")
+        export_end = export_start.replace(day=calendar.monthrange(export_start.year, export_start.month)[1])
+        col1, col2, col3, col4 = st.columns(4)
         with col1:
-            st.write(row['date'].strftime('%Y-%m-%d'))
+            export_from = st.date_input("From", value=export_start, key="export_from")
         with col2:
-            st.write(row['category'])
+            export_to = st.date_input("To", value=export_end, key="export_to")
         with col3:
-            st.write(row['subcategory'])
+            export_subcategory = st.selectbox("Sub Category", ["All"] + [sub for subs in CATEGORY_OPTIONS.values() for sub in subs], key="export_subcategory")
         with col4:
-            st.write(row['description'])
-        with col5:
-            st.write(f"₹{row['amount']:.2f}")
-        with col6:
-            # Find the expense in the original list by matching all fields
-            expense_to_delete = {
-                "date": row['date'].date().isoformat(),
-                "category": row['category'],
-                "subcategory": row['subcategory'],
-                "description": row['description'],
-                "amount": row['amount']
-            }
-            if st.button("🗑️", key=f"delete_{df_idx}_{display_idx}"):
-                # Delete from database
-                if 'id' in row and row['id']:
-                    database.delete_expense(row['id'])
-                else:
-                    # Fallback for expenses without ID
-                    database.delete_expense_by_details(
-                        expense_to_delete['date'],
-                        expense_to_delete['category'],
-                        expense_to_delete['subcategory'],
-                        expense_to_delete['description'],
-                        expense_to_delete['amount']
-                    )
-                # Remove from session state
-                for i, exp in enumerate(st.session_state.expenses):
-                    if (exp.get('date') == expense_to_delete['date'] and
-                        exp.get('category') == expense_to_delete['category'] and
-                        exp.get('subcategory', exp.get('category')) == expense_to_delete['subcategory'] and
-                        exp.get('description') == expense_to_delete['description'] and
-                        abs(exp.get('amount', 0) - expense_to_delete['amount']) < 0.01):
-                        st.session_state.expenses.pop(i)
-                        break
+            export_format = st.selectbox("Format", database.EXPORT_FORMATS, key="export_format")
+        
+        if st.button("📦 Prepare Export", key="export_prepare"):
+            # Built in memory: st.download_button needs the whole file anyway, and
+            # nothing is left behind on disk when the session ends
+            export_buffer = io.BytesIO()
+            try:
+                exported = database.export_expenses(
+                    export_buffer,
+                    export_format,
+                    start_date=export_from.isoformat(),
+                    end_date=export_to.isoformat(),
+                    subcategory=None if export_subcategory == "All" else export_subcategory
+                )
+            except ValueError as e:
+                st.error(f"Export failed: {e}")
+            else:
+                st.session_state.export_ready = {
+                    'data': export_buffer.getvalue(),
+                    'file_name': f"expenses_{export_from.isoformat()}_{export_to.isoformat()}.{export_format}",
+                    'rows': exported,
+                    'mime': EXPORT_MIME_TYPES[export_format]
+                }
+        
+        export_ready = st.session_state.get('export_ready')
+        if export_ready:
+            st.download_button(
+                f"⬇️ Download {export_ready['file_name']} ({export_ready['rows']:,} rows)",
+                data=export_ready['data'],
+                file_name=export_ready['file_name'],
+                mime=export_ready['mime']
+            )
+    
+    # Filters, sorting and paging are applied in SQL so only one page is rendered
+    page_timer.mark('expense table')
+    col1, col2, col3, col4, col5 = st.columns([2.5, 2, 2, 1.5, 1])
+    with col1:
+        filter_category = st.selectbox("Filter Category", ["All"] + list(CATEGORY_OPTIONS.keys()), key="table_category")
+    with col2:
+        subcategory_choices = CATEGORY_OPTIONS.get(filter_category, [sub for subs in CATEGORY_OPTIONS.values() for sub in subs])
+        filter_subcategory = st.selectbox("Filter Sub Category", ["All"] + subcategory_choices, key="table_subcategory")
+    with col3:
+        sort_by = st.selectbox("Sort By", database.EXPENSE_SORT_COLUMNS, key="table_sort_by")
+    with col4:
+        sort_order = st.selectbox("Order", ["Descending", "Ascending"], key="table_sort_order")
+    with col5:
+        page_size = st.selectbox("Rows", [25, 50, 100, 250], index=1, key="table_page_size")
+    
+    table_filters = {
+        'category': None if filter_category == "All" else filter_category,
+        'subcategory': None if filter_subcategory == "All" else filter_subcategory
+    }
+    descending = sort_order == "Descending"
+    
+    # Keyset cursors of the pages visited so far; reset whenever the view changes,
+    # together with the selection so a delete never reaches rows of another view
+    table_view = (selected_month, filter_category, filter_subcategory, sort_by, sort_order, page_size)
+    if st.session_state.get('table_view') != table_view:
+        st.session_state.table_view = table_view
+        st.session_state.table_cursors = [None]
+        st.session_state.selected_expenses = {}
+        st.session_state.confirm_delete_selected = False
+    
+    page_rows = database.get_expense_page(
+        selected_month,
+        sort_by=sort_by,
+        descending=descending,
+        after=st.session_state.table_cursors[-1],
+        page_size=page_size,
+        **table_filters
+    )
+    if not page_rows and len(st.session_state.table_cursors) > 1:
+        # The current page was emptied by a delete, step back one page
+        st.session_state.table_cursors.pop()
+        st.rerun()
+    
+    total_rows = database.count_expenses(selected_month, **table_filters)
+    page_number = len(st.session_state.table_cursors)
+    page_count = max(1, -(-total_rows // page_size))
+    # Closed months are served from the archive and can no longer be edited
+    month_closed = database.is_month_closed(selected_month)
+    if month_closed:
+        st.caption(f"📦 {selected_month} is closed and archived, its expenses are read-only")
+    
+    # Selected expenses across pages, keyed by id so deletes never scan
+    if 'selected_expenses' not in st.session_state:
+        st.session_state.selected_expenses = {}
+    table_key = f"expense_table_{hash(table_view)}_{page_number}_{database.get_data_generation()}"
+    
+    page_df = pd.DataFrame(page_rows, columns=['id', 'date', 'category', 'subcategory', 'description', 'amount'])
+    st.dataframe(
+        page_df,
+        column_order=['date', 'category', 'subcategory', 'description', 'amount'],
+        column_config={
+            'date': st.column_config.TextColumn("Date"),
+            'category': st.column_config.TextColumn("Category"),
+            'subcategory': st.column_config.TextColumn("Sub Category"),
+            'description': st.column_config.TextColumn("Description"),
+            'amount': st.column_config.NumberColumn("Amount (₹)", format="₹%.2f")
+        },
+        hide_index=True,
+        use_container_width=True,
+        on_select=partial(update_selection, table_key, page_rows),
+        selection_mode="multi-row",
+        key=table_key
+    )
+    selected_ids = list(st.session_state.selected_expenses)
+    
+    col1, col2, col3, col4, col5 = st.columns([1, 1, 2, 2, 1.5])
+    with col1:
+        if st.button("◀️ Previous", disabled=page_number == 1):
+            st.session_state.table_cursors.pop()
+            st.rerun()
+    with col2:
+        if st.button("Next ▶️", disabled=page_number >= page_count):
+            st.session_state.table_cursors.append(database.page_cursor(page_rows, sort_by))
+            st.rerun()
+    with col3:
+        st.write(f"Page {page_number} of {page_count} ({total_rows} expenses)")
+    with col4:
+        if st.button(f"🗑️ Delete Selected ({len(selected_ids)})", disabled=not selected_ids or month_closed):
+            st.session_state.confirm_delete_selected = True
+    with col5:
+        if st.button("Clear Selection", disabled=not selected_ids):
+            st.session_state.selected_expenses = {}
+            st.session_state.confirm_delete_selected = False
+            st.rerun()
+    
+    if st.session_state.get('confirm_delete_selected') and selected_ids:
+        page_ids = {row['id'] for row in page_rows}
+        off_page = sum(1 for expense_id in selected_ids if expense_id not in page_ids)
+        st.warning(
+            f"Permanently delete {len(selected_ids)} selected expenses?"
+            + (f" {off_page} of them are on other pages of this table." if off_page else "")
+        )
+        col1, col2 = st.columns([1, 5])
+        with col1:
+            if st.button("Yes, delete", type="primary", key="confirm_delete_selected_button"):
+                # One transaction for the whole selection
+                database.delete_expenses(selected_ids)
+                st.session_state.selected_expenses = {}
+                st.session_state.confirm_delete_selected = False
+                st.rerun()
+        with col2:
+            if st.button("Cancel", key="cancel_delete_selected_button"):
+                st.session_state.confirm_delete_selected = False
                 st.rerun()
     
+    # Bulk delete by date range and sub category, e.g. to undo a bad import
+    page_timer.mark('bulk delete')
+    with st.expander("🧹 Bulk Delete"):
+        month_start = date.fromisoformat(f"{selected_month}-01")
+        month_end = month_start.replace(day=calendar.monthrange(month_start.year, month_start.month)[1])
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            bulk_start = st.date_input("From", value=month_start, key="bulk_delete_start")
+        with col2:
+            bulk_end = st.date_input("To", value=month_end, key="bulk_delete_end")
+        with col3:
+            bulk_subcategory = st.selectbox("Sub Category", ["All"] + [sub for subs in CATEGORY_OPTIONS.values() for sub in subs], key="bulk_delete_subcategory")
+        bulk_confirm = st.checkbox("I understand matching expenses will be permanently deleted", key="bulk_delete_confirm")
+        if st.button("🗑️ Delete Matching Expenses", disabled=not bulk_confirm, key="bulk_delete_button"):
+            deleted = database.delete_expenses_in_range(
+                bulk_start.isoformat(),
+                bulk_end.isoformat(),
+                subcategory=None if bulk_subcategory == "All" else bulk_subcategory
+            )
+            st.session_state.selected_expenses = {}
+            st.success(f"Deleted {deleted:,} expenses")
+            st.rerun()
+    
     # Summary statistics
+    page_timer.mark('summary statistics')
     with st.expander("📊 Summary Statistics"):
         st.write(f"**Total Expenses in {selected_month}:** ₹{total_expenses:,.2f}")
         st.write(f"**Number of Transactions:** {num_transactions}")
-        st.write(f"**Average Transaction Amount:** ₹{month_df['amount'].mean():.2f}")
-        st.write(f"**Largest Expense:** ₹{month_df['amount'].max():.2f}")
-        st.write(f"**Smallest Expense:** ₹{month_df['amount'].min():.2f}")
+        st.write(f"**Average Transaction Amount:** ₹{summary['avg_transaction']:.2f}")
+        st.write(f"**Largest Expense:** ₹{summary['largest_expense']:.2f}")
+        st.write(f"**Smallest Expense:** ₹{summary['smallest_expense']:.2f}")
         
         st.write("\n**Category Breakdown:**")
-        # Category breakdown (by Account Category)
-        category_stats = month_df.groupby('category').agg({
-            'amount': ['sum', 'count', 'mean']
-        }).round(2)
-        category_stats.columns = ['Total', 'Count', 'Average']
+        # Category breakdown (by Account Category), aggregated in SQL
+        category_stats = load_category_stats(selected_month)
         # Format currency columns
         category_stats_display = category_stats.copy()
         category_stats_display['Total'] = category_stats_display['Total'].apply(lambda x: f"₹{x:,.2f}")
@@ -569,3 +717,70 @@ else:
     - 💾 Automatic data persistence
     """)
 
+# Consolidated figures across every tenant for head-office users
+if current_tenant and current_tenant['head_office']:
+    page_timer.mark('head office')
+    with st.expander("🏢 Head Office: All Sites"):
+        import pandas as pd
+        consolidated_month = selected_month if months else date.today().strftime('%Y-%m')
+        consolidated_started = time.perf_counter()
+        site_rows, site_totals = tenants.consolidated_month_summary(consolidated_month)
+        st.caption(f"{len(site_rows)} sites for {consolidated_month}, queried in parallel in "
+                   f"{(time.perf_counter() - consolidated_started) * 1000:.0f} ms")
+        site_frame = pd.DataFrame(site_rows + [dict(site_totals, tenant_id='', name='All sites')])
+        st.dataframe(
+            site_frame,
+            column_order=['name', 'total_expenses', 'total_credits', 'balance', 'num_transactions'],
+            column_config={
+                'name': "Site",
+                'total_expenses': st.column_config.NumberColumn("Expenses (₹)", format="₹%.2f"),
+                'total_credits': st.column_config.NumberColumn("Credits (₹)", format="₹%.2f"),
+                'balance': st.column_config.NumberColumn("Balance (₹)", format="₹%.2f"),
+                'num_transactions': "Transactions",
+            },
+            hide_index=True,
+            use_container_width=True
+        )
+
+page_timer.finish()
+
+# Timings and slow queries for admins
+if instrumentation.is_admin(st.session_state.userid):
+    with st.expander("🩺 Diagnostics"):
+        record_timings = st.toggle("Record timings", value=instrumentation.ENABLED)
+        if record_timings != instrumentation.ENABLED:
+            if record_timings:
+                instrumentation.enable()
+            else:
+                instrumentation.disable()
+            st.rerun()
+        
+        import pandas as pd
+        # Slow queries of other tenants' shards stay out of this admin's view
+        diagnostics = instrumentation.snapshot(database.get_db_file())
+        for title, key in (("Database functions", 'functions'), ("SQL statements", 'statements'), ("Page sections", 'sections')):
+            st.write(f"**{title}**")
+            if diagnostics[key]:
+                timings = pd.DataFrame([
+                    {'name': name, 'count': stats['count'], 'total_ms': stats['total_ms'], 'mean_ms': stats['mean_ms'], 'max_ms': stats['max_ms']}
+                    for name, stats in diagnostics[key].items()
+                ]).sort_values('total_ms', ascending=False)
+                st.dataframe(timings, hide_index=True, use_container_width=True)
+            else:
+                st.caption("Nothing recorded yet")
+        
+        st.write(f"**Slow Queries (over {instrumentation.SLOW_QUERY_MS:g} ms)**")
+        if not diagnostics['slow_queries']:
+            st.caption("No slow queries recorded")
+        for entry in reversed(diagnostics['slow_queries'][-10:]):
+            st.code(f"-- {entry['at']}  {entry['elapsed_ms']:.1f} ms\n{entry['sql']}\n-- " + "\n-- ".join(entry['plan']), language='sql')
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.download_button("⬇️ JSON Snapshot", instrumentation.to_json(diagnostics), file_name="diagnostics.json", mime="application/json")
+        with col2:
+            st.download_button("⬇️ Prometheus Metrics", instrumentation.to_prometheus(diagnostics), file_name="metrics.prom", mime="text/plain")
+        with col3:
+            if st.button("Reset Timings"):
+                instrumentation.reset()
+                st.rerun()
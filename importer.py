@@ -0,0 +1,351 @@
+import csv
+import io
+import json
+import os
+import sys
+import time
+import argparse
+from datetime import date
+from typing import Dict, Iterator, List, Optional, Callable, IO
+
+import database
+
+# Rows inserted per transaction
+DEFAULT_BATCH_SIZE = 5000
+
+# Bytes read from the file per chunk when parsing JSON arrays
+JSON_CHUNK_SIZE = 64 * 1024
+
+# Largest single JSON array element (in characters) buffered before giving up on it
+MAX_JSON_ELEMENT_SIZE = 1024 * 1024
+
+# Number of rejected rows whose errors are kept in the report
+MAX_REPORTED_ERRORS = 20
+
+# Normalized column names that carry the bank's own transaction reference
+REFERENCE_KEYS = ('reference', 'ref', 'externalref', 'transactionid', 'txnid', 'referenceno', 'refno')
+
+# Sub category -> account category, used when a row only names the sub category
+SUBCATEGORY_TO_CATEGORY = {
+    subcategory: category
+    for category, subcategories in database.CATEGORY_OPTIONS.items()
+    for subcategory in subcategories
+}
+
+class ImportStats:
+    """Progress and throughput of a running import"""
+
+    def __init__(self):
+        self.rows_read = 0
+        self.inserted = 0
+        self.rejected = 0
+        self.duplicates = 0
+        self.repeats = 0
+        self.batches = 0
+        self.errors = []
+        self.duplicate_rows = []
+        self.repeat_rows = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_read / self.elapsed if self.elapsed else 0.0
+
+    def reject(self, line: int, message: str):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"row {line}: {message}")
+
+    def skip_duplicate(self, line: int):
+        self.duplicates += 1
+        if len(self.duplicate_rows) < MAX_REPORTED_ERRORS:
+            self.duplicate_rows.append(line)
+
+    def keep_repeat(self, line: int):
+        self.repeats += 1
+        if len(self.repeat_rows) < MAX_REPORTED_ERRORS:
+            self.repeat_rows.append(line)
+
+    def as_dict(self) -> Dict:
+        return {
+            'rows_read': self.rows_read,
+            'inserted': self.inserted,
+            'rejected': self.rejected,
+            'duplicates': self.duplicates,
+            'repeats': self.repeats,
+            'batches': self.batches,
+            'elapsed_seconds': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+            'errors': list(self.errors),
+            'duplicate_rows': list(self.duplicate_rows),
+            'repeat_rows': list(self.repeat_rows)
+        }
+
+# ============================================================================
+# STREAMING PARSERS
+# ============================================================================
+
+def _normalize_keys(record: Dict) -> Dict:
+    """Lower-case keys and drop spaces/underscores ('Sub Category' -> 'subcategory')
+
+    Anything but an object is passed through for import_stream() to reject.
+    """
+    if not isinstance(record, dict):
+        return record
+    return {
+        str(key).strip().lower().replace(' ', '').replace('_', ''): value
+        for key, value in record.items()
+    }
+
+def iter_csv(f: IO[str]) -> Iterator[Dict]:
+    """Yield records from a CSV file with a header row"""
+    for record in csv.DictReader(f):
+        yield _normalize_keys(record)
+
+class MalformedRecord:
+    """Stands in for a record that could not be parsed, so it is rejected as one row"""
+
+    def __init__(self, message: str):
+        self.message = message
+
+
+def iter_ndjson(f: IO[str]) -> Iterator[Dict]:
+    """Yield records from a newline-delimited JSON file, one MalformedRecord per unparsable line"""
+    for line in f:
+        line = line.strip()
+        if line:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield MalformedRecord(f"invalid JSON: {e}")
+            else:
+                yield _normalize_keys(record)
+
+def iter_json_array(f: IO[str], chunk_size: int = JSON_CHUNK_SIZE,
+                    max_element_size: int = MAX_JSON_ELEMENT_SIZE) -> Iterator[Dict]:
+    """Yield the objects of a top-level JSON array without loading the whole file.
+
+    An element that still does not parse once max_element_size characters
+    of it are buffered is malformed (or absurdly large) and stops the import.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    started = False
+    eof = False
+
+    while True:
+        # Skip whitespace, the opening bracket and separators between elements
+        while pos < len(buffer) and (buffer[pos] in ' \t\r\n,' or (not started and buffer[pos] == '[')):
+            if buffer[pos] == '[':
+                started = True
+            elif buffer[pos] == ',' and not started:
+                break
+            pos += 1
+        if pos < len(buffer):
+            if not started:
+                raise ValueError("JSON import file must contain a top-level array")
+            if buffer[pos] == ']':
+                return
+            try:
+                record, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                if len(buffer) - pos > max_element_size:
+                    raise ValueError(f"JSON array element is malformed or larger than {max_element_size:,} characters")
+            else:
+                yield _normalize_keys(record)
+                continue
+
+        if eof:
+            raise ValueError("JSON import file ended before the closing ']'")
+        # Keep only the unparsed tail and read the next chunk
+        buffer = buffer[pos:]
+        pos = 0
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+        buffer += chunk
+
+def detect_format(filename: str) -> str:
+    """Guess the import format from a file name"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.ndjson', '.jsonl'):
+        return 'ndjson'
+    if extension == '.json':
+        return 'json'
+    raise ValueError(f"Cannot detect import format of {filename!r}, expected .csv, .json or .ndjson")
+
+PARSERS = {
+    'csv': iter_csv,
+    'json': iter_json_array,
+    'ndjson': iter_ndjson,
+}
+
+# ============================================================================
+# VALIDATION
+# ============================================================================
+
+def _parse_amount(value) -> float:
+    amount = float(str(value).replace(',', '').replace('₹', '').strip())
+    if amount < 0:
+        raise ValueError(f"negative amount {value!r}")
+    return amount
+
+def _parse_date(value) -> str:
+    parsed = date.fromisoformat(str(value).strip()[:10]).isoformat()
+    database.check_month_open(parsed)
+    return parsed
+
+def _reference(record: Dict) -> Optional[str]:
+    for key in REFERENCE_KEYS:
+        value = record.get(key)
+        if value is not None and str(value).strip():
+            return str(value).strip()
+    return None
+
+def validate_expense(record: Dict) -> tuple:
+    """Turn a raw record into an expense row, raising ValueError if it is invalid"""
+    subcategory = (record.get('subcategory') or '').strip()
+    category = (record.get('category') or '').strip() or SUBCATEGORY_TO_CATEGORY.get(subcategory, '')
+    if category not in database.CATEGORY_OPTIONS:
+        raise ValueError(f"unknown category {category!r}")
+    if subcategory not in database.CATEGORY_OPTIONS[category]:
+        raise ValueError(f"unknown sub category {subcategory!r} for {category!r}")
+    return (
+        _parse_date(record.get('date')),
+        category,
+        subcategory,
+        (record.get('description') or '').strip(),
+        _parse_amount(record.get('amount')),
+        _reference(record)
+    )
+
+def validate_credit(record: Dict) -> tuple:
+    """Turn a raw record into a credit row, raising ValueError if it is invalid"""
+    return (
+        _parse_date(record.get('date')),
+        (record.get('description') or '').strip(),
+        _parse_amount(record.get('amount')),
+        _reference(record)
+    )
+
+# ============================================================================
+# IMPORT PIPELINE
+# ============================================================================
+
+def import_stream(f: IO[str], fmt: str, table: str = 'expenses', batch_size: int = DEFAULT_BATCH_SIZE,
+                  progress: Optional[Callable[[ImportStats], None]] = None) -> ImportStats:
+    """Import records from a text stream, one transaction per batch.
+
+    Rows already in the database (same content hash) are skipped and
+    counted as duplicates, so re-importing a file adds nothing. Rows that
+    repeat an earlier row of the same file are kept and counted as repeats.
+    """
+    if table == 'expenses':
+        validate, insert = validate_expense, database.ingest_expenses
+    elif table == 'credits':
+        validate, insert = validate_credit, database.ingest_credits
+    else:
+        raise ValueError(f"Cannot import into {table!r}")
+
+    stats = ImportStats()
+    batch: List[tuple] = []
+    batch_lines: List[int] = []
+
+    def flush():
+        inserted, skipped, repeated = insert(batch, run)
+        stats.inserted += inserted
+        for position in skipped:
+            stats.skip_duplicate(batch_lines[position])
+        for position in repeated:
+            stats.keep_repeat(batch_lines[position])
+        stats.batches += 1
+        stats.elapsed = time.perf_counter() - stats.started
+        batch.clear()
+        batch_lines.clear()
+        if progress:
+            progress(stats)
+
+    with database.ingest_run() as run:
+        for record in PARSERS[fmt](f):
+            stats.rows_read += 1
+            if isinstance(record, MalformedRecord):
+                stats.reject(stats.rows_read, record.message)
+                continue
+            if not isinstance(record, dict):
+                stats.reject(stats.rows_read, f"expected an object, got {type(record).__name__}")
+                continue
+            try:
+                batch.append(validate(record))
+                batch_lines.append(stats.rows_read)
+            except (ValueError, TypeError, AttributeError) as e:
+                stats.reject(stats.rows_read, str(e))
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+
+    stats.elapsed = time.perf_counter() - stats.started
+    return stats
+
+def import_file(path: str, fmt: Optional[str] = None, table: str = 'expenses',
+                batch_size: int = DEFAULT_BATCH_SIZE,
+                progress: Optional[Callable[[ImportStats], None]] = None) -> ImportStats:
+    """Import a CSV, JSON array or NDJSON file from disk"""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        return import_stream(f, fmt or detect_format(path), table, batch_size, progress)
+
+def import_upload(upload: IO[bytes], filename: str, table: str = 'expenses',
+                  batch_size: int = DEFAULT_BATCH_SIZE,
+                  progress: Optional[Callable[[ImportStats], None]] = None) -> ImportStats:
+    """Import a binary file-like object (e.g. a Streamlit upload)"""
+    text = io.TextIOWrapper(upload, encoding='utf-8-sig', newline='')
+    try:
+        return import_stream(text, detect_format(filename), table, batch_size, progress)
+    finally:
+        text.detach()
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Bulk import expenses or credits from CSV, JSON or NDJSON")
+    parser.add_argument('path', help="file to import")
+    parser.add_argument('--format', choices=sorted(PARSERS), help="input format (default: from file extension)")
+    parser.add_argument('--table', choices=['expenses', 'credits'], default='expenses')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="rows per transaction")
+    parser.add_argument('--db', default=database.DB_FILE, help="database file")
+    args = parser.parse_args(argv)
+
+    database.DB_FILE = args.db
+    database.init_database()
+
+    def report(stats: ImportStats):
+        print(f"\r📥 {stats.inserted:,} rows imported, {stats.duplicates:,} duplicates, {stats.rejected:,} rejected "
+              f"({stats.rows_per_second:,.0f} rows/s)", end='', flush=True)
+
+    try:
+        stats = import_file(args.path, args.format, args.table, args.batch_size, report)
+    except ValueError as e:
+        # Batches committed before the bad element stay imported
+        print(f"\n❌ {e}")
+        return 1
+    print()
+    for error in stats.errors:
+        print(f"⚠️ {error}")
+    if stats.duplicates:
+        rows = ', '.join(str(line) for line in stats.duplicate_rows)
+        more = ', ...' if stats.duplicates > len(stats.duplicate_rows) else ''
+        print(f"⏭️ Skipped {stats.duplicates:,} rows already in the database (rows {rows}{more})")
+    if stats.repeats:
+        rows = ', '.join(str(line) for line in stats.repeat_rows)
+        more = ', ...' if stats.repeats > len(stats.repeat_rows) else ''
+        print(f"🔁 Kept {stats.repeats:,} rows that repeat an earlier row of the file (rows {rows}{more})")
+    print(f"✅ Imported {stats.inserted:,} of {stats.rows_read:,} rows into {args.table} "
+          f"in {stats.elapsed:.2f}s ({stats.rows_per_second:,.0f} rows/s)")
+    return 0 if stats.rejected == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,310 @@
+"""Timing instrumentation for the database layer and dashboard sections.
+
+Disabled by default. When disabled nothing is wrapped: database functions
+are the original objects, connections are plain sqlite3.Connection and
+section_timer() hands back a shared no-op timer. enable() wraps every
+public database function, opens new connections as timing connections and
+starts recording; set EXPENSE_TRACKER_INSTRUMENT=1 to enable it at import.
+Toggling never closes connections in use: pooled readers are swapped one
+at a time as they are next checked out, and the writer picks up the new
+factory the next time its database is closed.
+"""
+import functools
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import database
+
+# Statements slower than this (milliseconds) go to the slow-query log
+SLOW_QUERY_MS = float(os.environ.get('EXPENSE_TRACKER_SLOW_QUERY_MS', 50))
+
+# Entries kept in the slow-query log
+SLOW_QUERY_LOG_SIZE = 100
+
+# Histogram bucket upper bounds in milliseconds
+BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000, float('inf'))
+
+# Users who may open the diagnostics panel
+ADMIN_USERS = set(os.environ.get('EXPENSE_TRACKER_ADMINS', 'admin').split(','))
+
+# database functions left unwrapped: connection plumbing and cache helpers
+# called so often that timing them would only add noise
+UNTIMED_FUNCTIONS = {
+    'get_manager', 'read_connection', 'write_connection', 'get_connection', 'cached', 'cached_read',
+    'get_data_generation', 'get_write_queue', 'cache_stats', 'write_queue_stats', 'explain_query_plan',
+    'get_db_file', 'set_db_file', 'to_paise', 'to_rupees', 'content_hash',
+    'archive_file', 'get_closed_through', 'is_month_closed', 'check_month_open',
+}
+
+ENABLED = False
+
+class Histogram:
+    """Count, sum, max and cumulative bucket counts of durations in milliseconds"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * len(BUCKETS_MS)
+
+    def observe(self, elapsed_ms: float):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        for i, bound in enumerate(BUCKETS_MS):
+            if elapsed_ms <= bound:
+                self.buckets[i] += 1
+                break
+
+    def as_dict(self) -> Dict:
+        cumulative, running = {}, 0
+        for bound, count in zip(BUCKETS_MS, self.buckets):
+            running += count
+            cumulative['+Inf' if bound == float('inf') else str(bound)] = running
+        return {
+            'count': self.count,
+            'total_ms': round(self.total_ms, 3),
+            'mean_ms': round(self.total_ms / self.count, 3) if self.count else 0.0,
+            'max_ms': round(self.max_ms, 3),
+            'buckets': cumulative,
+        }
+
+
+_lock = threading.Lock()
+_functions: Dict[str, Histogram] = {}
+_statements: Dict[str, Histogram] = {}
+_sections: Dict[str, Histogram] = {}
+_slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+_originals: Dict[str, Callable] = {}
+
+def _observe(table: Dict[str, Histogram], name: str, elapsed_ms: float):
+    with _lock:
+        histogram = table.get(name)
+        if histogram is None:
+            histogram = table[name] = Histogram()
+        histogram.observe(elapsed_ms)
+
+def _normalize_sql(sql: str) -> str:
+    return ' '.join(sql.split())
+
+# ============================================================================
+# SQL STATEMENT TIMING
+# ============================================================================
+
+def _record_statement(conn: sqlite3.Connection, sql: str, params, elapsed_ms: float, many: bool = False):
+    # Timing connections opened before disable() stay pooled but stop recording
+    if not ENABLED:
+        return
+    statement = _normalize_sql(sql)
+    _observe(_statements, statement, elapsed_ms)
+    if elapsed_ms < SLOW_QUERY_MS:
+        return
+    plan = []
+    if not many and statement.split(' ', 1)[0].upper() in ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE'):
+        try:
+            plan = [row[3] for row in sqlite3.Connection.execute(conn, f'EXPLAIN QUERY PLAN {sql}', params)]
+        except sqlite3.Error as e:
+            plan = [f'EXPLAIN failed: {e}']
+    # Bound values are user data (descriptions, amounts), so only the shard is kept with the entry
+    with _lock:
+        _slow_queries.append({
+            'at': datetime.now().isoformat(timespec='seconds'),
+            'db': database.get_db_file(),
+            'elapsed_ms': round(elapsed_ms, 3),
+            'sql': statement,
+            'plan': plan,
+        })
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor recording how long each execute() takes"""
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record_statement(self.connection, sql, parameters, (time.perf_counter() - started) * 1000)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _record_statement(self.connection, sql, (), (time.perf_counter() - started) * 1000, many=True)
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose statements run through TimedCursor.
+
+    Timings cover executing a statement up to its first row (the whole cost
+    of aggregates and writes); fetching the rest is part of the enclosing
+    database function's timing.
+    """
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+# ============================================================================
+# FUNCTION AND SECTION TIMING
+# ============================================================================
+
+def _timed(name: str, func: Callable) -> Callable:
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _observe(_functions, name, (time.perf_counter() - started) * 1000)
+    return wrapper
+
+def _public_functions() -> List[Tuple[str, Callable]]:
+    return [
+        (name, value) for name, value in vars(database).items()
+        if inspect.isfunction(value) and value.__module__ == 'database' and not name.startswith('_')
+        and name not in UNTIMED_FUNCTIONS and not inspect.isgeneratorfunction(inspect.unwrap(value))
+    ]
+
+class SectionTimer:
+    """Times consecutive page sections; each mark() ends the previous section"""
+
+    def __init__(self):
+        self._name = None
+        self._started = 0.0
+
+    def mark(self, name: Optional[str]):
+        now = time.perf_counter()
+        if self._name is not None:
+            _observe(_sections, self._name, (now - self._started) * 1000)
+        self._name, self._started = name, now
+
+    def finish(self):
+        self.mark(None)
+
+
+class _NoSectionTimer:
+    def mark(self, name: Optional[str]):
+        pass
+
+    def finish(self):
+        pass
+
+
+_NO_SECTION_TIMER = _NoSectionTimer()
+
+def section_timer():
+    """Get a SectionTimer for one page run (a shared no-op when disabled)"""
+    return SectionTimer() if ENABLED else _NO_SECTION_TIMER
+
+# ============================================================================
+# ENABLE / DISABLE
+# ============================================================================
+
+def enable():
+    """Wrap database functions and open new connections as timing connections"""
+    global ENABLED
+    with _lock:
+        if ENABLED:
+            return
+        for name, func in _public_functions():
+            _originals[name] = func
+            setattr(database, name, _timed(name, func))
+        database.CONNECTION_FACTORY = TimedConnection
+        ENABLED = True
+
+def disable():
+    """Restore the original functions and open new connections as plain ones"""
+    global ENABLED
+    with _lock:
+        if not ENABLED:
+            return
+        for name, func in _originals.items():
+            setattr(database, name, func)
+        _originals.clear()
+        database.CONNECTION_FACTORY = sqlite3.Connection
+        ENABLED = False
+
+def reset():
+    """Drop every recorded timing and the slow-query log"""
+    with _lock:
+        _functions.clear()
+        _statements.clear()
+        _sections.clear()
+        _slow_queries.clear()
+
+def is_admin(userid: Optional[str]) -> bool:
+    return userid in ADMIN_USERS
+
+# ============================================================================
+# SNAPSHOTS
+# ============================================================================
+
+def snapshot(db_file: Optional[str] = None) -> Dict:
+    """Get every counter, histogram and the slow-query log as plain data.
+
+    With db_file, the slow-query log only holds that shard's entries.
+    """
+    with _lock:
+        data = {
+            'enabled': ENABLED,
+            'taken_at': datetime.now().isoformat(timespec='seconds'),
+            'slow_query_ms': SLOW_QUERY_MS,
+            'functions': {name: histogram.as_dict() for name, histogram in _functions.items()},
+            'statements': {sql: histogram.as_dict() for sql, histogram in _statements.items()},
+            'sections': {name: histogram.as_dict() for name, histogram in _sections.items()},
+            'slow_queries': [entry for entry in _slow_queries if db_file is None or entry['db'] == db_file],
+        }
+    data['read_cache'] = database.cache_stats()
+    data['write_queues'] = database.write_queue_stats()
+    return data
+
+def to_json(data: Optional[Dict] = None) -> str:
+    return json.dumps(data or snapshot(), indent=2, ensure_ascii=False)
+
+def _label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+def to_prometheus(data: Optional[Dict] = None) -> str:
+    """Render a snapshot in the Prometheus text exposition format"""
+    data = data or snapshot()
+    lines = []
+    for metric, label, key in (('function', 'function', 'functions'), ('sql', 'statement', 'statements'),
+                               ('section', 'section', 'sections')):
+        name = f'expense_tracker_{metric}_duration_seconds'
+        lines += [f'# HELP {name} Duration of {key} in seconds', f'# TYPE {name} histogram']
+        for value, histogram in data[key].items():
+            labels = f'{label}="{_label(value)}"'
+            for bound, count in histogram['buckets'].items():
+                le = bound if bound == '+Inf' else repr(float(bound) / 1000)
+                lines.append(f'{name}_bucket{{{labels},le="{le}"}} {count}')
+            lines.append(f'{name}_sum{{{labels}}} {histogram["total_ms"] / 1000}')
+            lines.append(f'{name}_count{{{labels}}} {histogram["count"]}')
+
+    cache = data['read_cache']
+    for key in ('hits', 'misses', 'evictions'):
+        lines += [f'# TYPE expense_tracker_read_cache_{key}_total counter',
+                  f'expense_tracker_read_cache_{key}_total {cache[key]}']
+    lines += ['# TYPE expense_tracker_read_cache_entries gauge', f'expense_tracker_read_cache_entries {cache["entries"]}']
+
+    lines.append('# TYPE expense_tracker_write_queue_depth gauge')
+    for db_file, stats in data['write_queues'].items():
+        lines.append(f'expense_tracker_write_queue_depth{{db="{_label(db_file)}"}} {stats["queue_depth"]}')
+    lines.append('# TYPE expense_tracker_slow_queries gauge')
+    lines.append(f'expense_tracker_slow_queries {len(data["slow_queries"])}')
+    return '\n'.join(lines) + '\n'
+
+if os.environ.get('EXPENSE_TRACKER_INSTRUMENT') == '1':
+    enable()
@@ -0,0 +1,271 @@
+"""Static report packs (HTML, PNG and CSV) for every month.
+
+Each month is rendered by a worker process with the same aggregations and
+figures as the dashboard (see charts.py) into <out>/<YYYY-MM>/. A manifest
+records a fingerprint of the data behind every month written, so later runs
+only render months whose rows or opening balance changed since.
+"""
+import argparse
+import csv
+import html
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import database
+
+# Directory report packs are written to
+REPORT_DIR = 'reports'
+
+# Worker processes rendering months in parallel
+REPORT_WORKERS = os.cpu_count() or 4
+
+REPORT_FORMATS = ('html', 'png', 'csv')
+DEFAULT_FORMATS = ('html', 'csv')
+
+# Bump when the report layout changes so every month is rendered again
+REPORT_VERSION = 1
+
+MANIFEST_FILE = 'manifest.json'
+
+# Shared by every month's report.html, written once per pack
+PLOTLY_JS_FILE = 'plotly.min.js'
+
+@contextmanager
+def _replacing(path: str) -> Iterator[str]:
+    """Yield a temporary path that replaces path once the block succeeds"""
+    tmp_path = f'{path}.tmp'
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _write_csv(path: str, header: Sequence[str], rows: Sequence[Sequence]):
+    with _replacing(path) as tmp_path, open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+def _write_text(path: str, text: str):
+    with _replacing(path) as tmp_path, open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+def _html_page(title: str, body: List[str], plotly_src: str) -> str:
+    return '\n'.join([
+        '<!DOCTYPE html>',
+        '<html><head><meta charset="utf-8">',
+        f'<title>{html.escape(title)}</title>',
+        f'<script src="{plotly_src}"></script>',
+        '<style>body{font-family:sans-serif;margin:2em}table{border-collapse:collapse}'
+        'td,th{border:1px solid #ccc;padding:4px 10px;text-align:right}th:first-child,td:first-child{text-align:left}</style>',
+        '</head><body>',
+        *body,
+        '</body></html>',
+    ])
+
+# ============================================================================
+# MONTH RENDERING (runs in worker processes)
+# ============================================================================
+
+def render_month(db_file: str, month: str, out_dir: str, formats: Sequence[str]) -> Tuple[str, float]:
+    """Write one month's report pack, returning (month, seconds taken)"""
+    import charts
+
+    started = time.perf_counter()
+    with database.use_db_file(db_file):
+        database.init_database()
+        summary = database.get_month_summary(month)
+        balance = database.get_month_balance(month)
+        subcategory_totals = database.get_subcategory_totals(month)
+        daily_totals = database.get_daily_totals(month)
+        category_stats = charts.category_stats_frame(month)
+        month_dir = os.path.join(out_dir, month)
+        os.makedirs(month_dir, exist_ok=True)
+
+        summary_rows = [
+            ('Opening Balance', balance['opening_balance']),
+            ('Total Credits', summary['total_credits']),
+            ('Total Expenses', summary['total_expenses']),
+            ('Closing Balance', balance['closing_balance']),
+            ('Number of Transactions', summary['num_transactions']),
+            ('Average Transaction Amount', round(summary['avg_transaction'], 2)),
+            ('Average Daily Expense', round(summary['avg_daily'], 2)),
+            ('Largest Expense', summary['largest_expense']),
+            ('Smallest Expense', summary['smallest_expense']),
+            ('Top Sub Category', summary['top_subcategory'] or ''),
+        ]
+        if 'csv' in formats:
+            _write_csv(os.path.join(month_dir, 'summary.csv'), ('metric', 'value'), summary_rows)
+            _write_csv(os.path.join(month_dir, 'categories.csv'), ('category', 'total', 'count', 'average'),
+                       list(category_stats.itertuples()))
+            _write_csv(os.path.join(month_dir, 'subcategories.csv'), ('subcategory', 'total'), subcategory_totals)
+            _write_csv(os.path.join(month_dir, 'daily.csv'), ('day', 'total'), daily_totals)
+            with _replacing(os.path.join(month_dir, 'expenses.csv')) as tmp_path:
+                database.export_expenses_to_file(tmp_path, 'csv', start_date=f'{month}-01', end_date=f'{month}-31')
+
+        figures = {}
+        if subcategory_totals:
+            figures = {
+                'subcategories': charts.subcategory_pie(subcategory_totals, month),
+                'daily': charts.daily_line(daily_totals, month),
+                'categories': charts.category_bar(subcategory_totals, month),
+            }
+        if 'png' in formats:
+            for name, fig in figures.items():
+                fig.write_image(os.path.join(month_dir, f'{name}.png'), width=1000, height=600)
+        if 'html' in formats:
+            body = [
+                f'<h1>💰 Expense Report - {html.escape(month)}</h1>',
+                '<h2>📊 Summary Statistics</h2>',
+                '<table>' + ''.join(
+                    f'<tr><th>{html.escape(label)}</th>'
+                    f'<td>{value if isinstance(value, (int, str)) else f"₹{value:,.2f}"}</td></tr>'
+                    for label, value in summary_rows
+                ) + '</table>',
+                '<h2>Category Breakdown</h2>',
+                category_stats.to_html(float_format=lambda value: f'{value:,.2f}'),
+                *(fig.to_html(full_html=False, include_plotlyjs=False) for fig in figures.values()),
+            ]
+            _write_text(os.path.join(month_dir, 'report.html'),
+                        _html_page(f'Expense Report - {month}', body, f'../{PLOTLY_JS_FILE}'))
+
+    return month, time.perf_counter() - started
+
+# ============================================================================
+# REPORT PACKS
+# ============================================================================
+
+def _load_manifest(out_dir: str) -> Dict:
+    try:
+        with open(os.path.join(out_dir, MANIFEST_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_manifest(out_dir: str, manifest: Dict):
+    _write_text(os.path.join(out_dir, MANIFEST_FILE), json.dumps(manifest, indent=2, sort_keys=True))
+
+def _write_index(out_dir: str, months: List[str], formats: Sequence[str]):
+    """Write the pack's index page and monthly totals, linking every month"""
+    import charts
+
+    balances = {row['month']: row for row in database.get_balance_history()}
+    rows = [
+        (month, balances[month]['opening_balance'], balances[month]['total_credits'],
+         balances[month]['total_expenses'], balances[month]['closing_balance'])
+        for month in months
+    ]
+    if 'csv' in formats:
+        _write_csv(os.path.join(out_dir, 'monthly_totals.csv'),
+                   ('month', 'opening_balance', 'credits', 'expenses', 'closing_balance'), rows)
+    if 'html' in formats:
+        history = [balances[month] for month in months]
+        body = [
+            '<h1>💰 Expense Reports</h1>',
+            '<table><tr><th>Month</th><th>Opening</th><th>Credits</th><th>Expenses</th><th>Closing</th></tr>' + ''.join(
+                f'<tr><td><a href="{month}/report.html">{month}</a></td>'
+                + ''.join(f'<td>₹{value:,.2f}</td>' for value in values) + '</tr>'
+                for month, *values in rows
+            ) + '</table>',
+            charts.monthly_comparison([(row['month'], row['total_expenses']) for row in history])
+            .to_html(full_html=False, include_plotlyjs=False),
+            charts.balance_line(history).to_html(full_html=False, include_plotlyjs=False),
+        ]
+        _write_text(os.path.join(out_dir, 'index.html'), _html_page('Expense Reports', body, PLOTLY_JS_FILE))
+
+def generate_reports(out_dir: str = REPORT_DIR, formats: Sequence[str] = DEFAULT_FORMATS,
+                     start_month: Optional[str] = None, end_month: Optional[str] = None,
+                     workers: int = REPORT_WORKERS, force: bool = False,
+                     progress=None) -> Dict:
+    """Write report packs for every month with activity, skipping unchanged months.
+
+    Months are rendered by a pool of worker processes; each finished month is
+    recorded in the manifest straight away, so an interrupted run keeps the
+    months it completed. progress(month, seconds) is called as months finish.
+    """
+    unknown = [fmt for fmt in formats if fmt not in REPORT_FORMATS]
+    formats = tuple(fmt for fmt in REPORT_FORMATS if fmt in formats)
+    if not formats or unknown:
+        raise ValueError(f"Unknown report formats, expected some of {', '.join(REPORT_FORMATS)}")
+    if 'png' in formats:
+        try:
+            import kaleido  # noqa: F401
+        except ImportError:
+            raise ValueError("PNG reports need kaleido (pip install kaleido)")
+
+    started = time.perf_counter()
+    database.init_database()
+    fingerprints = database.get_month_fingerprints()
+    months = [
+        month for month in fingerprints
+        if (start_month is None or month >= start_month) and (end_month is None or month <= end_month)
+    ]
+
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = _load_manifest(out_dir)
+    if force or manifest.get('version') != REPORT_VERSION or manifest.get('formats') != list(formats):
+        manifest = {'version': REPORT_VERSION, 'formats': list(formats), 'months': {}}
+    done = manifest['months']
+    pending = [month for month in months if done.get(month) != fingerprints[month]]
+
+    if 'html' in formats and not os.path.exists(os.path.join(out_dir, PLOTLY_JS_FILE)):
+        from plotly.offline import get_plotlyjs
+        _write_text(os.path.join(out_dir, PLOTLY_JS_FILE), get_plotlyjs())
+
+    if pending:
+        # Workers start fresh (spawn) instead of forking this process's open connections
+        context = multiprocessing.get_context('spawn')
+        db_file = database.get_db_file()
+        with ProcessPoolExecutor(max_workers=max(1, min(workers, len(pending))), mp_context=context) as executor:
+            futures = [executor.submit(render_month, db_file, month, out_dir, formats) for month in pending]
+            for future in as_completed(futures):
+                month, seconds = future.result()
+                done[month] = fingerprints[month]
+                _save_manifest(out_dir, manifest)
+                if progress:
+                    progress(month, seconds)
+
+    _write_index(out_dir, months, formats)
+    _save_manifest(out_dir, manifest)
+    return {
+        'months': len(months),
+        'rendered': len(pending),
+        'skipped': len(months) - len(pending),
+        'elapsed': time.perf_counter() - started,
+    }
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Write static HTML/PNG/CSV expense reports for every month")
+    parser.add_argument('--out', default=REPORT_DIR, help=f"output directory (default: {REPORT_DIR})")
+    parser.add_argument('--formats', default=','.join(DEFAULT_FORMATS),
+                        help=f"comma-separated formats out of {', '.join(REPORT_FORMATS)} (default: %(default)s)")
+    parser.add_argument('--from', dest='start_month', metavar='YYYY-MM', help="first month to report")
+    parser.add_argument('--to', dest='end_month', metavar='YYYY-MM', help="last month to report")
+    parser.add_argument('--workers', type=int, default=REPORT_WORKERS, help="worker processes (default: %(default)s)")
+    parser.add_argument('--force', action='store_true', help="render every month, changed or not")
+    parser.add_argument('--db', default=database.DB_FILE, help="database file (e.g. a tenant shard)")
+    args = parser.parse_args(argv)
+
+    database.set_db_file(args.db)
+    try:
+        stats = generate_reports(
+            args.out, [fmt.strip() for fmt in args.formats.split(',') if fmt.strip()],
+            args.start_month, args.end_month, args.workers, args.force,
+            progress=lambda month, seconds: print(f"✅ {month} ({seconds * 1000:.0f} ms)")
+        )
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    print(f"📄 {stats['rendered']} months written, {stats['skipped']} unchanged months skipped "
+          f"in {stats['elapsed']:.1f}s ({args.out})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+"""Per-tenant database shards.
+
+Every tenant (a site or organisation) keeps its data in its own SQLite file
+under TENANT_DIR, with its own connections, write lock, write-behind queue
+and read-cache entries, so a burst of writes at one site never waits on
+another. A small directory database maps user ids to tenants. Until the
+first tenant is added there is no directory and everyone uses
+database.DB_FILE, exactly as in a single-site install.
+"""
+import argparse
+import os
+import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import database
+
+# Directory holding the shard files and the tenant directory
+TENANT_DIR = os.environ.get('EXPENSE_TRACKER_TENANT_DIR', 'tenants')
+
+# Threads used to query shards in parallel for consolidated views
+CONSOLIDATION_WORKERS = 8
+
+# Tenant ids become file names, so keep them to a safe alphabet
+TENANT_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+DIRECTORY_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS tenants (
+        tenant_id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        db_file TEXT NOT NULL UNIQUE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''',
+    '''CREATE TABLE IF NOT EXISTS tenant_users (
+        userid TEXT PRIMARY KEY,
+        tenant_id TEXT NOT NULL REFERENCES tenants (tenant_id),
+        head_office INTEGER NOT NULL DEFAULT 0
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_tenant_users_tenant ON tenant_users (tenant_id)',
+]
+
+_directory_ready = set()
+_directory_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+
+def directory_file() -> str:
+    return os.path.join(TENANT_DIR, 'directory.db')
+
+def enabled() -> bool:
+    """Whether a tenant directory exists (otherwise everyone uses database.DB_FILE)"""
+    return os.path.exists(directory_file())
+
+def _directory() -> database.ConnectionManager:
+    """Get the directory's connection manager, creating the directory on first use"""
+    path = directory_file()
+    if path not in _directory_ready:
+        with _directory_lock:
+            if path not in _directory_ready:
+                os.makedirs(TENANT_DIR, exist_ok=True)
+                with database.get_manager(path).writer() as conn:
+                    for statement in DIRECTORY_SCHEMA:
+                        conn.execute(statement)
+                _directory_ready.add(path)
+    return database.get_manager(path)
+
+# ============================================================================
+# ROUTING
+# ============================================================================
+
+def get_tenant(userid: Optional[str]) -> Optional[Dict]:
+    """Get the tenant (tenant_id, name, db_file, head_office) a user belongs to"""
+    if not userid or not enabled():
+        return None
+    with _directory().reader() as conn:
+        row = conn.execute(
+            '''SELECT t.tenant_id, t.name, t.db_file, u.head_office
+               FROM tenant_users AS u JOIN tenants AS t ON t.tenant_id = u.tenant_id
+               WHERE u.userid = ?''',
+            (userid,)
+        ).fetchone()
+    return dict(row) if row else None
+
+def route(userid: Optional[str]) -> str:
+    """Get the database file for a user: their tenant's shard, or database.DB_FILE"""
+    tenant = get_tenant(userid)
+    return tenant['db_file'] if tenant else database.DB_FILE
+
+def activate(userid: Optional[str]) -> str:
+    """Point this thread's database calls at the user's shard and make sure it is migrated"""
+    db_file = route(userid)
+    database.set_db_file(db_file)
+    database.init_database()
+    return db_file
+
+def is_head_office(userid: Optional[str]) -> bool:
+    tenant = get_tenant(userid)
+    return bool(tenant and tenant['head_office'])
+
+# ============================================================================
+# TENANT ADMINISTRATION
+# ============================================================================
+
+def add_tenant(tenant_id: str, name: str, userid: str, password: str, head_office: bool = False) -> str:
+    """Create a tenant with its own shard and first user, returning the shard file"""
+    if not TENANT_ID_PATTERN.match(tenant_id):
+        raise ValueError(f"Invalid tenant id {tenant_id!r}, use letters, digits, '-' and '_'")
+    db_file = os.path.join(TENANT_DIR, f'{tenant_id}.db')
+    with _directory().writer() as conn:
+        if conn.execute('SELECT 1 FROM tenants WHERE tenant_id = ?', (tenant_id,)).fetchone():
+            raise ValueError(f"Tenant {tenant_id!r} already exists")
+        conn.execute('INSERT INTO tenants (tenant_id, name, db_file) VALUES (?, ?, ?)', (tenant_id, name, db_file))
+    add_user(userid, tenant_id, head_office, password)
+    return db_file
+
+def add_user(userid: str, tenant_id: str, head_office: bool = False, password: Optional[str] = None):
+    """Map a user id to a tenant (moving it if it already belongs to another).
+
+    With a password the user's credentials are stored in the tenant's shard.
+    """
+    with _directory().writer() as conn:
+        row = conn.execute('SELECT db_file FROM tenants WHERE tenant_id = ?', (tenant_id,)).fetchone()
+        if row is None:
+            raise ValueError(f"Unknown tenant {tenant_id!r}")
+        conn.execute(
+            '''INSERT INTO tenant_users (userid, tenant_id, head_office) VALUES (?, ?, ?)
+               ON CONFLICT (userid) DO UPDATE SET tenant_id = excluded.tenant_id, head_office = excluded.head_office''',
+            (userid, tenant_id, int(head_office))
+        )
+    if password is not None:
+        with database.use_db_file(row['db_file']):
+            database.init_database()
+            database.update_credentials(userid, password)
+
+def remove_user(userid: str) -> bool:
+    """Unmap a user id; it falls back to database.DB_FILE"""
+    with _directory().writer() as conn:
+        return conn.execute('DELETE FROM tenant_users WHERE userid = ?', (userid,)).rowcount > 0
+
+def list_tenants() -> List[Dict]:
+    """Get every tenant with its user count, by tenant id"""
+    if not enabled():
+        return []
+    with _directory().reader() as conn:
+        rows = conn.execute(
+            '''SELECT t.tenant_id, t.name, t.db_file, COUNT(u.userid) AS users
+               FROM tenants AS t LEFT JOIN tenant_users AS u ON u.tenant_id = t.tenant_id
+               GROUP BY t.tenant_id ORDER BY t.tenant_id'''
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+# ============================================================================
+# CONSOLIDATED (CROSS-SHARD) QUERIES
+# ============================================================================
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _directory_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=CONSOLIDATION_WORKERS, thread_name_prefix='tenant-query')
+    return _executor
+
+def _on_shard(db_file: str, func: Callable, args: Tuple, kwargs: Dict) -> Any:
+    with database.use_db_file(db_file):
+        database.init_database()
+        return func(*args, **kwargs)
+
+def fan_out(func: Callable, *args, **kwargs) -> Dict[str, Any]:
+    """Run a database read function on every shard in parallel, returning {tenant_id: result}.
+
+    Each call runs on a pool thread pointed at one shard, so it uses that
+    shard's connections and read cache and only ever takes read locks.
+    """
+    tenants = list_tenants()
+    executor = _get_executor()
+    futures = {
+        tenant['tenant_id']: executor.submit(_on_shard, tenant['db_file'], func, args, kwargs)
+        for tenant in tenants
+    }
+    return {tenant_id: future.result() for tenant_id, future in futures.items()}
+
+def consolidated_month_summary(month: str) -> Tuple[List[Dict], Dict]:
+    """Get per-tenant headline figures for one month plus their totals.
+
+    Totals are summed in integer paise so the consolidated figures match the
+    sum of the per-site figures exactly.
+    """
+    names = {tenant['tenant_id']: tenant['name'] for tenant in list_tenants()}
+    rows = []
+    paise = {'total_expenses': 0, 'total_credits': 0}
+    count = 0
+    for tenant_id, summary in fan_out(database.get_month_summary, month).items():
+        rows.append({
+            'tenant_id': tenant_id,
+            'name': names.get(tenant_id, tenant_id),
+            'total_expenses': summary['total_expenses'],
+            'total_credits': summary['total_credits'],
+            'balance': summary['total_credits'] - summary['total_expenses'],
+            'num_transactions': summary['num_transactions'],
+        })
+        for key in paise:
+            paise[key] += database.to_paise(summary[key])
+        count += summary['num_transactions']
+    totals = {
+        'total_expenses': database.to_rupees(paise['total_expenses']),
+        'total_credits': database.to_rupees(paise['total_credits']),
+        'balance': database.to_rupees(paise['total_credits'] - paise['total_expenses']),
+        'num_transactions': count,
+    }
+    return rows, totals
+
+def consolidated_monthly_totals() -> List[Tuple[str, float]]:
+    """Get (month, total expenses across every tenant) pairs, oldest first"""
+    paise: Dict[str, int] = {}
+    for months in fan_out(database.get_monthly_totals).values():
+        for month, total in months:
+            paise[month] = paise.get(month, 0) + database.to_paise(total)
+    return [(month, database.to_rupees(paise[month])) for month in sorted(paise)]
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Manage tenants and their database shards")
+    commands = parser.add_subparsers(dest='command', required=True)
+    add = commands.add_parser('add', help="create a tenant with its own shard and first user")
+    add.add_argument('tenant_id')
+    add.add_argument('name')
+    add.add_argument('--user', required=True, help="first user id of the tenant")
+    add.add_argument('--password', required=True)
+    add.add_argument('--head-office', action='store_true', help="let the user see the consolidated view")
+    assign = commands.add_parser('assign', help="map a user id to a tenant")
+    assign.add_argument('userid')
+    assign.add_argument('tenant_id')
+    assign.add_argument('--head-office', action='store_true')
+    assign.add_argument('--password', help="store the user's credentials in the tenant's shard")
+    commands.add_parser('list', help="list tenants")
+    summary = commands.add_parser('summary', help="print the consolidated summary of a month")
+    summary.add_argument('month', help="YYYY-MM")
+    args = parser.parse_args(argv)
+
+    if args.command == 'add':
+        db_file = add_tenant(args.tenant_id, args.name, args.user, args.password, args.head_office)
+        print(f"✅ Created tenant {args.tenant_id} ({db_file})")
+    elif args.command == 'assign':
+        add_user(args.userid, args.tenant_id, args.head_office, args.password)
+        print(f"✅ {args.userid} now uses tenant {args.tenant_id}")
+    elif args.command == 'list':
+        for tenant in list_tenants():
+            print(f"{tenant['tenant_id']:<20} {tenant['name']:<30} {tenant['users']:>3} users  {tenant['db_file']}")
+    elif args.command == 'summary':
+        rows, totals = consolidated_month_summary(args.month)
+        for row in rows + [dict(totals, name='All tenants')]:
+            print(f"{row['name']:<30} expenses ₹{row['total_expenses']:>14,.2f}  credits ₹{row['total_credits']:>14,.2f}  "
+                  f"balance ₹{row['balance']:>14,.2f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
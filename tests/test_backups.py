@@ -0,0 +1,28 @@
+"""Snapshots are listed newest first, even when several are taken in one second"""
+from datetime import datetime
+
+import pytest
+
+import backups
+import database
+
+@pytest.fixture
+def backup_db(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with database.use_db_file(str(tmp_path / 'backed.db')) as db_file:
+        database.init_database()
+        yield tmp_path / 'backups'
+        database.close_connections(db_file)
+
+def test_snapshots_of_one_second_keep_their_order(backup_db, monkeypatch):
+    frozen = datetime(2025, 1, 2, 3, 4, 5)
+
+    class FrozenClock(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return frozen
+
+    monkeypatch.setattr(backups, 'datetime', FrozenClock)
+    names = [backups.create_backup(str(backup_db), prune=False)['name'] for _ in range(3)]
+    assert names[1:] == [f'{names[0]}-2', f'{names[0]}-3']
+    assert [meta['name'] for meta in backups.list_backups(str(backup_db))] == names[::-1]
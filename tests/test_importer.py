@@ -0,0 +1,34 @@
+"""Bad rows in JSON and NDJSON imports are rejected one at a time, like CSV rows"""
+import io
+
+import pytest
+
+import database
+import importer
+
+ROW = '{"date": "2025-01-04", "subcategory": "PUR-ELEC", "description": "%s", "amount": 7}'
+
+@pytest.fixture
+def import_db(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with database.use_db_file(str(tmp_path / 'import.db')) as db_file:
+        database.init_database()
+        yield db_file
+        database.close_connections(db_file)
+
+def test_malformed_ndjson_line_is_rejected(import_db):
+    f = io.StringIO('\n'.join([ROW % 'a', '{oops', '', ROW % 'b']) + '\n')
+    stats = importer.import_stream(f, 'ndjson')
+    assert (stats.rows_read, stats.inserted, stats.rejected) == (3, 2, 1)
+    assert stats.errors[0].startswith('row 2: invalid JSON')
+
+def test_non_object_json_elements_are_rejected(import_db):
+    f = io.StringIO(f'[{ROW % "a"}, 3, "x", null, [1], {ROW % "b"}]')
+    stats = importer.import_stream(f, 'json')
+    assert (stats.inserted, stats.rejected) == (2, 4)
+    assert stats.errors[0] == 'row 2: expected an object, got int'
+
+def test_oversized_json_element_stops_the_import():
+    f = io.StringIO('[{"description": "' + 'x' * 5000)
+    with pytest.raises(ValueError, match='malformed or larger'):
+        list(importer.iter_json_array(f, chunk_size=100, max_element_size=1000))
@@ -0,0 +1,63 @@
+"""The legacy JSON files are imported into the default database by the migrations"""
+import json
+
+import pytest
+
+import database
+
+EXPENSES = [
+    {'date': '2025-01-02', 'category': 'Purchases', 'subcategory': 'PUR-ELEC', 'description': 'bulb', 'amount': 120.5},
+    {'date': '2025-01-03', 'category': 'Purchases', 'subcategory': 'PUR-ELEC', 'description': 'wire', 'amount': 80},
+]
+CREDITS = [{'date': '2025-01-01', 'description': 'salary', 'amount': 5000}]
+
+@pytest.fixture
+def legacy_dir(tmp_path, monkeypatch):
+    """A working directory holding the legacy JSON files and no database yet"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / database.EXPENSE_FILE).write_text(json.dumps(EXPENSES))
+    (tmp_path / database.CREDITS_FILE).write_text(json.dumps(CREDITS))
+    with database.use_db_file(None):
+        yield tmp_path
+        database.close_connections(database.DB_FILE)
+
+def _counts():
+    with database.read_connection() as conn:
+        return tuple(conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0] for table in ('expenses', 'credits'))
+
+def test_init_database_imports_json_files(legacy_dir, capsys):
+    database.init_database()
+    assert 'Could not migrate' not in capsys.readouterr().out
+    assert _counts() == (2, 1)
+    assert database.get_all_expenses()[0]['amount'] in (120.5, 80)
+
+def test_migrate_json_to_db_skips_stored_entries(legacy_dir):
+    database.init_database()
+    assert database.migrate_json_to_db() == {'expenses': (0, 2), 'credits': (0, 1)}
+    assert _counts() == (2, 1)
+
+def test_upgrading_baseline_database_keeps_legacy_rows_once(legacy_dir):
+    # Schema and contents left by the original JSON migration (user_version 0)
+    conn = database.get_connection()
+    conn.executescript('''
+        CREATE TABLE credentials (id INTEGER PRIMARY KEY AUTOINCREMENT, userid TEXT NOT NULL UNIQUE,
+                                  password TEXT NOT NULL, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+        CREATE TABLE expenses (id INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT NOT NULL, category TEXT NOT NULL,
+                               subcategory TEXT NOT NULL, description TEXT NOT NULL, amount REAL NOT NULL,
+                               created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+        CREATE TABLE credits (id INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT NOT NULL, description TEXT NOT NULL,
+                              amount REAL NOT NULL, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+    ''')
+    conn.executemany(
+        'INSERT INTO expenses (date, category, subcategory, description, amount) VALUES (?, ?, ?, ?, ?)',
+        [(e['date'], e['category'], e['subcategory'], e['description'], e['amount']) for e in EXPENSES]
+    )
+    conn.executemany('INSERT INTO credits (date, description, amount) VALUES (?, ?, ?)',
+                     [(c['date'], c['description'], c['amount']) for c in CREDITS])
+    conn.commit()
+    conn.close()
+
+    database.init_database()
+    assert _counts() == (2, 1)
+    assert database.migrate_json_to_db() == {'expenses': (0, 2), 'credits': (0, 1)}
+    assert _counts() == (2, 1)
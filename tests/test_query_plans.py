@@ -0,0 +1,44 @@
+"""Hot queries must keep using the indexes listed in database.QUERY_PLAN_EXPECTATIONS"""
+import pytest
+
+import database
+
+@pytest.fixture(scope='module')
+def plans_db(tmp_path_factory):
+    """A small database brought up to date by the migrations"""
+    tmp_path = tmp_path_factory.mktemp('plans')
+    with pytest.MonkeyPatch.context() as mp:
+        # Keep the legacy JSON import from picking up the repo's own files
+        mp.chdir(tmp_path)
+        with database.use_db_file(str(tmp_path / 'plans.db')) as db_file:
+            database.init_database()
+            database.add_expenses_bulk([
+                (f'2025-{month:02d}-{day:02d}', category, f'{category}-{day % 3}', f'item {day}', 10.0 * day)
+                for month in (1, 2, 3) for day in range(1, 29) for category in ('PUR', 'FOOD')
+            ])
+            database.add_credit('2025-01-01', 'salary', 5000.0)
+            yield db_file
+            database.close_connections(db_file)
+
+@pytest.mark.parametrize('name', sorted(database.QUERY_PLAN_EXPECTATIONS))
+def test_query_uses_expected_index(plans_db, name):
+    sql, params, expected = database.QUERY_PLAN_EXPECTATIONS[name]
+    with database.use_db_file(plans_db):
+        plan = database.explain_query_plan(sql, params)
+    assert any(expected in line for line in plan), f"{name}: expected {expected!r} in {plan}"
+
+def test_check_query_plans_passes(plans_db):
+    with database.use_db_file(plans_db):
+        assert database.check_query_plans() == []
+
+def test_dropped_index_is_reported(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with database.use_db_file(str(tmp_path / 'dropped.db')) as db_file:
+        database.init_database()
+        with database.write_connection() as conn:
+            conn.execute('DROP INDEX idx_credits_month')
+        try:
+            failures = database.check_query_plans()
+        finally:
+            database.close_connections(db_file)
+    assert any('month_credit_total' in failure for failure in failures)
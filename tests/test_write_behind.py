@@ -0,0 +1,31 @@
+"""Queued writes reject closed months the same way as direct writes"""
+import pytest
+
+import database
+
+@pytest.fixture(params=[True, False], ids=['write-behind', 'direct'])
+def archived_db(request, tmp_path, monkeypatch):
+    """A database whose months up to 2024-12 are closed"""
+    monkeypatch.chdir(tmp_path)
+    with database.use_db_file(str(tmp_path / 'queued.db')) as db_file:
+        database.init_database()
+        database.add_expense('2024-01-05', 'Purchases', 'PUR-ELEC', 'bulb', 5.0)
+        database.archive_months('2024-12')
+        if request.param:
+            database.enable_write_behind()
+        try:
+            yield db_file
+        finally:
+            database.disable_write_behind()
+            database.close_connections(db_file)
+
+def test_async_writes_into_closed_month_raise_value_error(archived_db):
+    with pytest.raises(ValueError, match='closed'):
+        database.add_expense_async('2024-06-01', 'Purchases', 'PUR-ELEC', 'late', 1.0)
+    with pytest.raises(ValueError, match='closed'):
+        database.add_credit_async('2024-06-01', 'late refund', 1.0)
+
+def test_async_writes_into_open_month_commit(archived_db):
+    expense_id = database.add_expense_async('2025-02-01', 'Purchases', 'PUR-ELEC', 'wire', 2.0).result()
+    credit_id = database.add_credit_async('2025-02-01', 'salary', 10.0).result()
+    assert expense_id and credit_id
@@ -0,0 +1,74 @@
+from datetime import date
+from typing import Optional, Tuple
+
+import numpy as np
+
+import database
+
+# Most points sent to the browser per trend chart
+MAX_TREND_POINTS = 500
+
+# A resolution is used while the window has at most this many times
+# MAX_TREND_POINTS periods at it; LTTB thins it down from there
+OVERSAMPLE_FACTOR = 2
+
+def choose_resolution(start: date, end: date, max_points: int = MAX_TREND_POINTS) -> str:
+    """Pick the finest aggregation level that keeps the window near max_points"""
+    days = (end - start).days + 1
+    if days <= max_points * OVERSAMPLE_FACTOR:
+        return 'day'
+    if days / 7 <= max_points * OVERSAMPLE_FACTOR:
+        return 'week'
+    return 'month'
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of n_out points that keep the shape of (x, y).
+
+    The first and last points are always kept. The interior is split into
+    n_out - 2 buckets; from each bucket the point forming the largest
+    triangle with the previously kept point and the next bucket's average
+    is kept. Bucket averages and triangle areas are NumPy array operations,
+    only the chain of per-bucket picks is a loop over output points.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # Bucket i covers positions edges[i]:edges[i + 1] of the interior points
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    avg_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+    # Each bucket looks ahead to the next bucket's average, the last one to the final point
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        areas = np.abs((x[a] - next_x[i]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y[i] - y[a]))
+        a = lo + int(np.argmax(areas))
+        keep[i + 1] = a
+    return keep
+
+def get_trend(start: date, end: date, resolution: Optional[str] = None,
+              max_points: int = MAX_TREND_POINTS) -> Tuple[str, int, np.ndarray, np.ndarray]:
+    """Get (resolution, periods in window, period dates, totals) downsampled to max_points.
+
+    Only the periods inside start..end are read from the rollups; the result
+    is cached until the next write.
+    """
+    resolution = resolution or choose_resolution(start, end, max_points)
+
+    def build():
+        rows = database.get_expense_trend(start.isoformat(), end.isoformat(), resolution)
+        periods = np.array([period for period, _ in rows], dtype='datetime64[D]')
+        totals = np.array([total for _, total in rows], dtype=np.float64)
+        keep = lttb(periods.astype(np.int64), totals, max_points)
+        return resolution, len(rows), periods[keep], totals[keep]
+
+    return database.cached(('trend', start, end, resolution, max_points), build)